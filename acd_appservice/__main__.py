@@ -1,18 +1,24 @@
-import asyncio
-
 from mautrix.types import UserID
 
 from .acd_program import ACD
-from .client import ProvisionBridge
+from .bridge_monitor import BridgeMonitor
+from .bulk_sender import BulkSender
 from .commands.handler import CommandProcessor
 from .commands.resolve import BulkResolve
 from .config import Config
 from .db import init as init_db
 from .db import upgrade_table
+from .events.event_stream import EventStream
 from .events.nats_publisher import NatsPublisher
+from .events.outbox_flusher import OutboxFlusher
+from .job_manager import JobManager
 from .matrix_handler import MatrixHandler
 from .matrix_room import MatrixRoom
+from .message import Message
+from .message_archiver import MessageArchiver
+from .portal_writer import PortalWriter
 from .puppet import Puppet
+from .signaling import Signaling
 from .user import User
 from .version import version, version_link
 from .web.provisioning_api import ProvisioningAPI
@@ -55,6 +61,17 @@ class ACDAppService(ACD):
         User.init_cls(self)
         MatrixRoom.init_cls(self)
         NatsPublisher.init_cls(self.config)
+        OutboxFlusher.init_cls(self.config)
+        PortalWriter.init_cls(self.config)
+        Message.init_cls(self.config)
+        MessageArchiver.init_cls(self.config)
+        BridgeMonitor.init_cls(self.config)
+        BulkSender.init_cls(self.config)
+        EventStream.init_cls(self.config)
+        JobManager.init_cls(self.config)
+        Signaling.init_cls(self.config)
+        self.add_startup_actions(Message.load_tracked_events())
+        self.add_startup_actions(JobManager.recover())
 
         # Sync all the rooms where the puppets are in matrix
         # creating the rooms in our database
@@ -76,9 +93,13 @@ class ACDAppService(ACD):
         await super().start()
 
         self.matrix.commands = commands
-        asyncio.create_task(self.checking_whatsapp_connection())
+        OutboxFlusher.start()
+        PortalWriter.start()
+        MessageArchiver.start()
+        BridgeMonitor.start()
 
     def prepare_stop(self) -> None:
+        BridgeMonitor.stop()
         # Stop all puppets that are syncing with Synapse
         for puppet in Puppet.by_custom_mxid.values():
             puppet.stop()
@@ -89,54 +110,6 @@ class ACDAppService(ACD):
     async def get_double_puppet(self, user_id: UserID):
         return await Puppet.get_by_custom_mxid(user_id)
 
-    async def checking_whatsapp_connection(self):
-        """This function checks if the puppet is connected to WhatsApp"""
-        bridge_connector = ProvisionBridge(config=self.config)
-        while True:
-            try:
-                all_puppets = await Puppet.get_puppets_from_mautrix()
-                for puppet_id in all_puppets:
-                    puppet: Puppet = await Puppet.get_by_custom_mxid(puppet_id)
-                    bridge_connector.session = puppet.intent.api.session
-                    status, response = await bridge_connector.ping(user_id=puppet_id)
-                    # Checking if the puppet is connected to WhatsApp.
-                    if (
-                        not response.get("error")
-                        and response.get("whatsapp").get("conn")
-                        and response.get("whatsapp").get("conn").get("is_connected")
-                    ):
-                        self.log.info(
-                            f"The user [{puppet_id}] :: [{puppet.email}]"
-                            f" is correctly connected to WhatsApp ✅"
-                        )
-                        await puppet.intent.send_notice(
-                            room_id=puppet.control_room_id,
-                            text="✅ I am connected to WhastApp ✅",
-                        )
-
-                        # Update the registered number for this puppet without the +
-                        puppet.phone = response.get("whatsapp").get("phone").replace("+", "")
-                        await puppet.save()
-
-                    else:
-                        self.log.warning(
-                            f"The user [{puppet_id}] :: [{puppet.email}]"
-                            f" is not correctly connected to WhatsApp 🚫"
-                        )
-                        await puppet.intent.send_notice(
-                            room_id=puppet.control_room_id,
-                            text=f"🚫 I am not connected to WhastApp 🚫 ::"
-                            f" Error {response.get('error')}",
-                        )
-                        # Update puppet phone number to None
-                        puppet.phone = None
-                        await puppet.save()
-
-            except Exception as e:
-                self.log.exception(e)
-
-            await asyncio.sleep(self.config["utils.wait_ping_time"])
-
 
 # Run the application
 ACDAppService().run()
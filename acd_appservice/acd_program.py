@@ -17,7 +17,11 @@ from mautrix.util.async_db import Database, UpgradeTable
 from mautrix.util.program import Program
 
 from .events.nats_publisher import NatsPublisher
+from .events.outbox_flusher import OutboxFlusher
+from .job_manager import JobManager
 from .matrix_handler import MatrixHandler
+from .message_archiver import MessageArchiver
+from .portal_writer import PortalWriter
 from .puppet import Puppet
 
 
@@ -184,6 +188,10 @@ class ACD(Program):
         self.az.ready = True
 
     async def stop(self) -> None:
+        MessageArchiver.stop()
+        await JobManager.stop()
+        await PortalWriter.stop()
+        await OutboxFlusher.stop()
         await NatsPublisher.close_connection()
         await self.az.stop()
         await super().stop()
@@ -89,17 +89,18 @@ class AgentManager:
         if await self.business_hours.is_not_business_hour():
             await self.business_hours.send_business_hours_message(portal=portal)
             if Util.is_room_id(destination):
-                if put_enqueued_portal:
-                    self.log.debug(f"Portal [{portal.room_id}] state has been changed to ENQUEUED")
-                    await portal.update_state(state=PortalState.ENQUEUED)
-                    await send_conversation_event(
-                        portal=portal,
-                        event_type=ACDConversationEvents.QueueEmpty,
-                        queue_room_id=destination,
-                        enqueued=put_enqueued_portal,
-                    )
-                portal.selected_option = destination
-                await portal.update()
+                async with portal.transition():
+                    if put_enqueued_portal:
+                        self.log.debug(
+                            f"Portal [{portal.room_id}] state has been changed to ENQUEUED"
+                        )
+                        await portal.update_state(
+                            PortalState.ENQUEUED,
+                            event_type=ACDConversationEvents.QueueEmpty,
+                            queue_room_id=destination,
+                            enqueued=put_enqueued_portal,
+                        )
+                    portal.selected_option = destination
 
             json_response = Util.create_response_data(
                 detail=f"Message out of business hours", room_id=portal.room_id, status=409
@@ -138,33 +139,37 @@ class AgentManager:
         cmd_sender: UserID,
         force_distribution: bool = False,
     ):
-        await portal.update_state(PortalState.ASSIGNED)
-        await send_conversation_event(
-            portal=portal,
-            event_type=ACDConversationEvents.Assigned,
-            sender=cmd_sender,
-            assigned_user=agent.mxid,
-        )
+        if not portal.can_change_state(PortalState.ASSIGNED):
+            portal.unlock()
+            return portal.invalid_state_response(PortalState.ASSIGNED)
 
         # Check that the agent is online and unpaused.
         is_agent_available = await agent.is_available()
 
         if not is_agent_available and not force_distribution:
             portal.unlock()
-            json_response = Util.create_response_data(
+            # The failed assignment is saved once, back in its previous state
+            async with portal.transition():
+                await portal.update_state(
+                    PortalState.ASSIGNED,
+                    event_type=ACDConversationEvents.Assigned,
+                    sender=cmd_sender,
+                    assigned_user=agent.mxid,
+                )
+                await portal.update_state(
+                    portal.prev_state,
+                    event_type=ACDConversationEvents.AssignFailed,
+                    user_mxid=agent.mxid,
+                    reason="Agent is not available",
+                )
+            return Util.create_response_data(
                 detail=f"Agent {agent.mxid} is not available to be assigned",
                 room_id=portal.room_id,
                 status=409,
             )
-            await portal.update_state(portal.prev_state)
-            await send_conversation_event(
-                portal=portal,
-                event_type=ACDConversationEvents.AssignFailed,
-                user_mxid=agent.mxid,
-                reason="Agent is not available",
-            )
-            return json_response
 
+        # The homeserver requests run before the state change, so the other handlers
+        # never see the intermediate ASSIGNED state of the cached portal
         await portal.join_user(agent.mxid)
         if joined_message:
             msg = joined_message.format(agentname=await agent.get_displayname())
@@ -176,9 +181,17 @@ class AgentManager:
         if msg:
             await portal.send_formatted_message(msg)
 
-        # set chat status to pending when the agent is asigned to the chat
-        await portal.update_state(PortalState.PENDING)
-        await send_conversation_event(portal=portal, event_type=ACDConversationEvents.Connect)
+        # The chat is saved once as PENDING, the agent is asigned to the chat
+        async with portal.transition():
+            await portal.update_state(
+                PortalState.ASSIGNED,
+                event_type=ACDConversationEvents.Assigned,
+                sender=cmd_sender,
+                assigned_user=agent.mxid,
+            )
+            await portal.update_state(
+                PortalState.PENDING, event_type=ACDConversationEvents.Connect
+            )
 
         portal.unlock()
 
@@ -224,14 +237,15 @@ class AgentManager:
             # if campaign is None, the loop is done over the control room
 
             # Changing room state to ON_DISTRIBUTION by acd command
-            await portal.update_state(PortalState.ON_DISTRIBUTION)
-            await send_conversation_event(
-                portal=portal,
+            if not await portal.update_state(
+                PortalState.ON_DISTRIBUTION,
                 event_type=ACDConversationEvents.EnterQueue,
                 queue_room_id=queue.room_id,
                 queue_name=queue.name,
                 sender=cmd_sender,
-            )
+            ):
+                portal.unlock()
+                return portal.invalid_state_response(PortalState.ON_DISTRIBUTION)
 
             target_room_id = queue.room_id if queue else self.config["acd.available_agents_room"]
             queue: Queue = await Queue.get_by_room_id(room_id=target_room_id, create=False)
@@ -261,6 +275,7 @@ class AgentManager:
         joined_message: str | None = None,
         transfer_author: Optional[User] = None,
         put_enqueued_portal: bool = True,
+        total_agents: int | None = None,
     ) -> Dict:
         """It loops through all the agents in a queue, and if it finds one that is online,
         it invites them to the room
@@ -279,10 +294,13 @@ class AgentManager:
             The user who initiated the transfer.
         put_enqueued_portal : bool
             If the chat was not distributed, should the portal be enqueued?
+        total_agents : int | None
+            Number of agents in the queue, if it is not given it is requested to the queue.
 
         """
 
-        total_agents = await queue.get_agent_count()
+        if total_agents is None:
+            total_agents = await queue.get_agent_count()
         online_agents = 0
 
         # Number of agents iterated
@@ -301,9 +319,8 @@ class AgentManager:
                 self.log.info(f"NO AGENTS IN ROOM [{queue.room_id}]")
 
                 if transfer_author:
-                    await portal.update_state(portal.prev_state)
-                    await send_conversation_event(
-                        portal=portal,
+                    await portal.update_state(
+                        portal.prev_state,
                         event_type=ACDConversationEvents.TransferFailed,
                         destination=queue.room_id,
                         reason="No agents in queue",
@@ -327,9 +344,8 @@ class AgentManager:
 
             joined_members = await portal.get_joined_users()
             if not joined_members:
-                await portal.update_state(portal.prev_state)
-                await send_conversation_event(
-                    portal=portal,
+                await portal.update_state(
+                    portal.prev_state,
                     event_type=ACDConversationEvents.TransferFailed,
                     reason="No joined members in the room",
                     destination=queue.room_id,
@@ -339,9 +355,8 @@ class AgentManager:
                 break
 
             if len(joined_members) == 1 and joined_members[0].mxid == self.intent.mxid:
-                await portal.update_state(portal.prev_state)
-                await send_conversation_event(
-                    portal=portal,
+                await portal.update_state(
+                    portal.prev_state,
                     event_type=ACDConversationEvents.TransferFailed,
                     reason="Room has only one member and it's the bot",
                     destination=queue.room_id,
@@ -374,13 +389,16 @@ class AgentManager:
                     )
 
                 if is_agent_available_for_assignment:
-                    await portal.update_state(PortalState.ASSIGNED)
-                    await send_conversation_event(
-                        portal=portal,
+                    if not await portal.update_state(
+                        PortalState.ASSIGNED,
                         event_type=ACDConversationEvents.Assigned,
                         sender=portal.main_intent.mxid,
                         assigned_user=agent.mxid,
-                    )
+                    ):
+                        # Another handler changed the chat, the agent is not invited
+                        json_response = portal.invalid_state_response(PortalState.ASSIGNED)
+                        portal.unlock(transfer)
+                        break
 
                     online_agents += 1
 
@@ -422,9 +440,8 @@ class AgentManager:
                     msg = self.config["acd.no_agents_for_transfer"]
                     status = 404
                     await portal.send_notice(text=msg)
-                    await portal.update_state(state=portal.prev_state)
-                    await send_conversation_event(
-                        portal=portal,
+                    await portal.update_state(
+                        portal.prev_state,
                         event_type=ACDConversationEvents.TransferFailed,
                         reason=msg,
                         destination=queue.room_id,
@@ -434,22 +451,23 @@ class AgentManager:
                     status = 409
                     await self.show_no_agents_message(portal=portal, queue=queue)
 
-                if put_enqueued_portal:
-                    msg = f"There are no agents available, however, the chat was enqueued"
-                    status = 202
-
-                    portal.selected_option = queue.room_id
-                    await portal.update()
+                async with portal.transition():
+                    if put_enqueued_portal:
+                        msg = f"There are no agents available, however, the chat was enqueued"
+                        status = 202
 
-                    self.log.debug(f"Portal [{portal.room_id}] state has been changed to ENQUEUED")
-                    await portal.update_state(state=PortalState.ENQUEUED)
+                        portal.selected_option = queue.room_id
+                        self.log.debug(
+                            f"Portal [{portal.room_id}] state has been changed to ENQUEUED"
+                        )
+                        await portal.update_state(PortalState.ENQUEUED)
 
-                await send_conversation_event(
-                    portal=portal,
-                    event_type=ACDConversationEvents.QueueEmpty,
-                    queue_room_id=queue.room_id,
-                    enqueued=put_enqueued_portal,
-                )
+                    await send_conversation_event(
+                        portal=portal,
+                        event_type=ACDConversationEvents.QueueEmpty,
+                        queue_room_id=queue.room_id,
+                        enqueued=put_enqueued_portal,
+                    )
 
                 portal.unlock(transfer)
                 json_response = Util.create_response_data(
@@ -624,13 +642,14 @@ class AgentManager:
             # Setting the selected menu option for the customer.
             self.log.debug(f"Saving room [{portal.room_id}]")
 
-            if queue:
-                portal.selected_option = queue.room_id
-                await portal.save()
-
             self.log.debug(f"Removing room [{portal.room_id}] from portal enqueued list")
-            await portal.update_state(PortalState.PENDING)
-            await send_conversation_event(portal=portal, event_type=ACDConversationEvents.Connect)
+            async with portal.transition():
+                if queue:
+                    portal.selected_option = queue.room_id
+
+                await portal.update_state(
+                    PortalState.PENDING, event_type=ACDConversationEvents.Connect
+                )
 
             agent_displayname = await self.intent.get_displayname(user_id=agent_id)
             detail = ""
@@ -721,9 +740,8 @@ class AgentManager:
             self.log.debug(f"Unlocking room {portal.room_id}..., agent {agent_id} already in room")
         else:
             self.log.debug(f"[{agent_id}] DID NOT ACCEPT the invite. Inviting next agent ...")
-            await portal.update_state(portal.prev_state)
-            await send_conversation_event(
-                portal=portal,
+            await portal.update_state(
+                portal.prev_state,
                 event_type=ACDConversationEvents.AssignFailed,
                 user_mxid=agent_id,
                 reason="Invite timeout",
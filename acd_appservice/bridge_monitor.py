@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime
+from typing import Dict, List
+
+from mautrix.util.logging import TraceLogger
+
+from .client import ProvisionBridge
+from .config import Config
+from .db.bridge_status import BridgeStatus
+from .puppet import Puppet
+
+log: TraceLogger = logging.getLogger("acd.bridge_monitor")
+
+
+class BridgeMonitor:
+    """It pings the bridges of the puppets every `utils.wait_ping_time` seconds and saves
+    the results in the bridge_status table, the control room of a puppet is notified
+    only when its connection status changes"""
+
+    config: Config = None
+    _task: asyncio.Task = None
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def start(cls):
+        log.info("Starting the bridge monitor")
+        cls._task = asyncio.create_task(cls.run_loop())
+
+    @classmethod
+    def stop(cls):
+        if cls._task:
+            cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def run_loop(cls):
+        while True:
+            try:
+                await cls.check_all()
+            except Exception as e:
+                log.exception(f"Error checking the bridges: {e}")
+
+            await asyncio.sleep(cls.config["utils.wait_ping_time"])
+
+    @classmethod
+    async def check_all(cls) -> List[BridgeStatus]:
+        """It checks the connection of all the puppets, except the gupshup ones
+        that do not keep a connection"""
+        puppets: List[Puppet] = [
+            puppet
+            async for puppet in Puppet.all_with_custom_mxid()
+            if puppet.bridge and puppet.bridge != "gupshup"
+        ]
+
+        statuses = await cls.check_puppets(puppets=puppets, jitter=True)
+        connected = sum(status.is_connected for status in statuses)
+        log.info(f"{connected} of {len(statuses)} bridges are connected")
+        return statuses
+
+    @classmethod
+    async def check_puppets(
+        cls, puppets: List[Puppet], jitter: bool = False
+    ) -> List[BridgeStatus]:
+        """It pings the bridges of several puppets concurrently,
+        at most `acd.bridge_monitor.concurrency` at a time
+
+        Parameters
+        ----------
+        puppets : List[Puppet]
+            The puppets to check.
+        jitter : bool
+            Wait a random time up to `acd.bridge_monitor.jitter` seconds before each ping,
+            so the bridges do not receive all the pings at once.
+
+        Returns
+        -------
+            The status of the puppets that could be checked.
+
+        """
+        semaphore = asyncio.Semaphore(cls.config["acd.bridge_monitor.concurrency"])
+
+        async def check(puppet: Puppet) -> BridgeStatus:
+            if jitter:
+                await asyncio.sleep(random.uniform(0, cls.config["acd.bridge_monitor.jitter"]))
+            async with semaphore:
+                return await cls.check(puppet)
+
+        results = await asyncio.gather(
+            *[check(puppet) for puppet in puppets], return_exceptions=True
+        )
+
+        statuses: List[BridgeStatus] = []
+        for puppet, result in zip(puppets, results):
+            if isinstance(result, Exception):
+                log.error(f"Error checking the bridge of {puppet.custom_mxid}: {result}")
+                continue
+            statuses.append(result)
+
+        return statuses
+
+    @classmethod
+    async def check(cls, puppet: Puppet) -> BridgeStatus:
+        """It pings the bridge of a puppet and saves the result
+
+        Parameters
+        ----------
+        puppet : Puppet
+            The puppet to check.
+
+        Returns
+        -------
+            The saved status.
+
+        """
+        bridge_connector = ProvisionBridge(
+            config=cls.config, session=puppet.intent.api.session, bridge=puppet.bridge
+        )
+        _, response = await bridge_connector.ping(user_id=puppet.custom_mxid)
+        is_connected = cls.is_connected(bridge=puppet.bridge, response=response)
+
+        now = datetime.utcnow()
+        previous = await BridgeStatus.get_by_puppet_mxid(puppet.custom_mxid)
+        changed = not previous or previous.is_connected != is_connected
+        status = BridgeStatus(
+            puppet_mxid=puppet.custom_mxid,
+            bridge=puppet.bridge,
+            is_connected=is_connected,
+            response=json.dumps(response),
+            checked_date=now,
+            changed_date=now if changed else previous.changed_date,
+        )
+        await status.upsert()
+
+        if puppet.bridge == "mautrix":
+            # Update the registered number for this puppet without the +
+            phone = (response.get("whatsapp") or {}).get("phone") if is_connected else None
+            puppet.phone = phone.replace("+", "") if phone else None
+            await puppet.save()
+
+        if changed:
+            await cls.notify_change(puppet=puppet, status=status, response=response)
+
+        return status
+
+    @staticmethod
+    def is_connected(bridge: str, response: Dict) -> bool:
+        if response.get("error"):
+            return False
+
+        if bridge == "mautrix":
+            conn = (response.get("whatsapp") or {}).get("conn")
+            return bool(conn and conn.get("is_connected"))
+
+        return True
+
+    @classmethod
+    async def notify_change(cls, puppet: Puppet, status: BridgeStatus, response: Dict):
+        if status.is_connected:
+            log.info(
+                f"The user [{puppet.custom_mxid}] :: [{puppet.email}]"
+                f" is correctly connected to {puppet.bridge} ✅"
+            )
+            text = "✅ I am connected to WhastApp ✅"
+        else:
+            log.warning(
+                f"The user [{puppet.custom_mxid}] :: [{puppet.email}]"
+                f" is not correctly connected to {puppet.bridge} 🚫"
+            )
+            text = f"🚫 I am not connected to WhastApp 🚫 :: Error {response.get('error')}"
+
+        if puppet.bridge == "mautrix" and puppet.control_room_id:
+            await puppet.intent.send_notice(room_id=puppet.control_room_id, text=text)
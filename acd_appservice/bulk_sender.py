@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from markdown import markdown
+from mautrix.types import Format, MessageType, TextMessageEventContent
+from mautrix.util.logging import TraceLogger
+
+from .client import ProvisionBridge
+from .config import Config
+from .db.job import Job
+from .job_manager import JobManager
+from .message import Message
+
+if TYPE_CHECKING:
+    from .puppet import Puppet
+
+log: TraceLogger = logging.getLogger("acd.bulk_sender")
+
+
+class RateLimiter:
+    """It spaces the calls to `rate` per second, the waits are booked in order"""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+
+    async def wait(self):
+        if not self.interval:
+            return
+
+        now = time.monotonic()
+        delay = self.next_time - now
+        self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BulkSender:
+    """It sends a message to many phone numbers in a background job of the JobManager,
+    the recipients are processed by a bounded pool of workers, the calls to each bridge
+    are limited to `rate_limits` per second and the sent messages are saved in batches"""
+
+    config: Config = None
+
+    RATE_LIMITERS: Dict[str, RateLimiter] = {}
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def get_rate_limiter(cls, bridge: str) -> RateLimiter:
+        """The limiter is shared by all the jobs that send through the bridge"""
+        if bridge not in cls.RATE_LIMITERS:
+            rate_limits: Dict = cls.config["acd.bulk_send.rate_limits"] or {}
+            cls.RATE_LIMITERS[bridge] = RateLimiter(
+                rate=rate_limits.get(bridge, rate_limits.get("default", 0))
+            )
+        return cls.RATE_LIMITERS[bridge]
+
+    @classmethod
+    async def send_message(
+        cls, puppet: Puppet, phone: str, message: str, msg_type: str
+    ) -> Tuple[int, Dict]:
+        """It opens the chat with the phone number through the bridge and sends the message
+
+        Parameters
+        ----------
+        puppet : Puppet
+            The puppet that sends the message.
+        phone : str
+            The phone number, with the + prefix.
+        message : str
+            The message to send.
+        msg_type : str
+            The message type, only `text` is supported.
+
+        Returns
+        -------
+            The status and the data, with the `event_id` and the `room_id` if it was sent.
+
+        """
+        # TODO WORKAROUND FOR NOT LINKING TO THE MENU IN A BIC
+        user_prefix = puppet.config[f"bridges.{puppet.bridge}.user_prefix"]
+        user_domain = puppet.config["homeserver.domain"]
+        portal_creator = f"@{user_prefix}_{phone.replace('+', '')}:{user_domain}"
+
+        log.debug(f"Putting portal with creator {portal_creator} in BIC rooms")
+        puppet.BIC_ROOMS.add(portal_creator)
+
+        # We create a connector with the bridge
+        bridge_connector = ProvisionBridge(
+            session=puppet.intent.api.session, config=puppet.config, bridge=puppet.bridge
+        )
+
+        status, response = await bridge_connector.pm(user_id=puppet.custom_mxid, phone=phone)
+
+        if response.get("error") or not response.get("room_id"):
+            return status, response
+
+        customer_room_id = response.get("room_id")
+
+        if msg_type == "text":
+            content = TextMessageEventContent(
+                msgtype=MessageType.TEXT,
+                body=message,
+                format=Format.HTML,
+                formatted_body=markdown(message),
+            )
+
+        # Here you can have the other message types when you think about implementing them
+        # if msg_type == "image":
+        #     content = MediaMessageEventContent(
+        #         msgtype=MessageType.IMAGE,
+        #         body=message,
+        #         format=Format.HTML,
+        #         formatted_body=message,
+        #     )
+
+        if puppet.config[f"bridges.{puppet.bridge}.send_template_command"]:
+            # If another bridge must send templates, make this method (gupshup_template) generic.
+            status, data = await bridge_connector.gupshup_template(
+                room_id=customer_room_id, user_id=puppet.custom_mxid, template=message
+            )
+            if not status in [200, 201]:
+                return status, data
+
+            event_id = data.get("event_id")
+        else:
+            event_id = await puppet.intent.send_message(room_id=customer_room_id, content=content)
+
+        return 201, {"event_id": event_id, "room_id": customer_room_id}
+
+    @classmethod
+    async def submit_job(
+        cls,
+        puppet: Puppet,
+        recipients: List[Dict],
+        msg_type: str,
+        created_by: str | None = None,
+    ) -> Job:
+        """It submits the job to the JobManager, it runs in the background
+
+        Parameters
+        ----------
+        puppet : Puppet
+            The puppet that sends the messages.
+        recipients : List[Dict]
+            The `phone` and the `message` of each recipient,
+            the phones are already validated and prefixed with +.
+        msg_type : str
+            The message type of all the messages.
+        created_by : str | None
+            The mxid of the user that started the job.
+
+        Returns
+        -------
+            The pending job, to follow its progress.
+
+        """
+        return await JobManager.submit(
+            kind="bulk_send",
+            total=len(recipients),
+            created_by=created_by,
+            run=lambda job: cls.run(job, puppet, recipients, msg_type),
+        )
+
+    @classmethod
+    async def run(cls, job: Job, puppet: Puppet, recipients: List[Dict], msg_type: str) -> Dict:
+        """It sends the messages, the sent and failed recipients are added to the progress
+        of the job
+
+        Returns
+        -------
+            A dict with the puppet, the bridge and the phones that could not be reached.
+
+        """
+        pending: asyncio.Queue[Dict] = asyncio.Queue()
+        for recipient in recipients:
+            pending.put_nowait(recipient)
+
+        sent_messages: List[Message] = []
+        # Phone and error of the recipients that could not be reached
+        errors: List[Dict] = []
+        rate_limiter = cls.get_rate_limiter(puppet.bridge)
+
+        async def save_messages(size: int) -> bool:
+            """It saves the sent messages if there are `size` at least,
+            a failed batch is kept to be saved again in the next call"""
+            nonlocal sent_messages
+            if not sent_messages or len(sent_messages) < size:
+                return True
+
+            batch, sent_messages = sent_messages, []
+            try:
+                await Message.insert_many(batch)
+            except Exception as e:
+                log.exception(f"Error saving {len(batch)} messages of the job {job.id}: {e}")
+                sent_messages = batch + sent_messages
+                return False
+            return True
+
+        async def save_periodically():
+            """The messages are saved every `flush_interval` seconds even if the batch
+            is not full, so the slow jobs do not keep them in memory"""
+            while True:
+                await asyncio.sleep(cls.config["acd.bulk_send.flush_interval"])
+                await save_messages(size=1)
+
+        async def worker():
+            while not pending.empty():
+                recipient = pending.get_nowait()
+                await rate_limiter.wait()
+                try:
+                    status, data = await cls.send_message(
+                        puppet=puppet,
+                        phone=recipient["phone"],
+                        message=recipient["message"],
+                        msg_type=msg_type,
+                    )
+                except Exception as e:
+                    log.exception(e)
+                    status, data = 500, {"error": str(e)}
+
+                if status not in [200, 201]:
+                    errors.append({"phone": recipient["phone"], "error": data.get("error")})
+                    await JobManager.progress(job, failed=1)
+                    continue
+
+                # The read receipts can arrive before the message is saved
+                Message.track(data["event_id"])
+                sent_messages.append(
+                    Message(
+                        event_id=data["event_id"],
+                        room_id=data["room_id"],
+                        sender=puppet.custom_mxid,
+                        receiver=recipient["phone"],
+                        timestamp_send=datetime.timestamp(datetime.utcnow()),
+                    )
+                )
+                await JobManager.progress(job, done=1)
+                await save_messages(size=cls.config["acd.bulk_send.insert_batch_size"])
+
+        workers = min(cls.config["acd.bulk_send.concurrency"], len(recipients)) or 1
+        saver = asyncio.create_task(save_periodically())
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            # The messages sent before a cancellation are saved too
+            saver.cancel()
+            for attempt in range(cls.config["acd.bulk_send.insert_retries"] + 1):
+                if await save_messages(size=1):
+                    break
+                await asyncio.sleep(2**attempt)
+            else:
+                log.error(f"{len(sent_messages)} sent messages of the job {job.id} were not saved")
+
+        return {"puppet_mxid": puppet.custom_mxid, "bridge": puppet.bridge, "errors": errors}
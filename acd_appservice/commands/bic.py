@@ -10,7 +10,7 @@ from mautrix.types import RoomID, UserID
 from mautrix.util.logging import TraceLogger
 
 from ..client import ProvisionBridge
-from ..events import ACDConversationEvents, send_conversation_event
+from ..events import ACDConversationEvents
 from ..portal import Portal, PortalState
 from ..puppet import Puppet
 from ..signaling import Signaling
@@ -227,18 +227,18 @@ async def bic(evt: CommandEvent) -> Dict:
         # On transit refers to a state of the chat, if it is on transit, the bic will be start,
         # but none entity (agent, menubot) enters to the room until customer sends a message.
         if on_transit:
-            # Set chat status to ON_TRANSIT
-            await portal.update_state(PortalState.ON_TRANSIT)
-            await send_conversation_event(
-                portal=portal,
-                event_type=ACDConversationEvents.BIC,
-                sender=evt.sender,
-                destination=destination,
-            )
-
-            # Setting destination that will be processed when the customer answers with a message.
-            portal.destination_on_transit = destination
-            await portal.update()
+            async with portal.transition():
+                # Set chat status to ON_TRANSIT
+                if not await portal.update_state(
+                    PortalState.ON_TRANSIT,
+                    event_type=ACDConversationEvents.BIC,
+                    sender=evt.sender,
+                    destination=destination,
+                ):
+                    return portal.invalid_state_response(PortalState.ON_TRANSIT)
+
+                # Setting destination that will be processed when the customer answers
+                portal.destination_on_transit = destination
 
             return Util.create_response_data(
                 detail="BIC successfully, waiting for client message",
@@ -246,13 +246,13 @@ async def bic(evt: CommandEvent) -> Dict:
                 room_id=portal.room_id,
             )
 
-        await portal.update_state(PortalState.START)
-        await send_conversation_event(
-            portal=portal,
+        if not await portal.update_state(
+            PortalState.START,
             event_type=ACDConversationEvents.BIC,
             sender=evt.sender.mxid,
             destination=destination,
-        )
+        ):
+            return portal.invalid_state_response(PortalState.START)
 
         return await process_bic_destination(
             destination=destination,
@@ -313,7 +313,9 @@ async def process_destination_agent(
     agent: User = await User.get_by_mxid(agent_id, create=False)
     current_agent = await portal.get_current_agent()
 
-    await portal.update_state(PortalState.FOLLOWUP)
+    if not await portal.update_state(PortalState.FOLLOWUP):
+        return portal.invalid_state_response(PortalState.FOLLOWUP)
+
     await puppet.agent_manager.signaling.set_chat_status(
         room_id=portal.room_id, status=Signaling.FOLLOWUP, agent=agent.mxid
     )
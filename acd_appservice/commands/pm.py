@@ -161,10 +161,10 @@ async def pm(evt: CommandEvent) -> Dict:
                 )
 
             if agent and agent.mxid == evt.sender.mxid:
-                await portal.update_state(PortalState.FOLLOWUP)
-                await puppet.agent_manager.signaling.set_chat_status(
-                    room_id=portal.room_id, status=Signaling.FOLLOWUP, agent=evt.sender.mxid
-                )
+                if await portal.update_state(PortalState.FOLLOWUP):
+                    await puppet.agent_manager.signaling.set_chat_status(
+                        room_id=portal.room_id, status=Signaling.FOLLOWUP, agent=evt.sender.mxid
+                    )
 
                 await send_conversation_event(
                     portal=portal,
@@ -211,44 +211,49 @@ async def pm(evt: CommandEvent) -> Dict:
     if not return_params.get("reply"):
         # the room is marked as followup and campaign from previous room state
         # is not kept
-        await portal.update_state(PortalState.FOLLOWUP)
-        await send_conversation_event(
-            portal=portal,
+        changed = await portal.update_state(
+            PortalState.FOLLOWUP,
             event_type=ACDConversationEvents.BIC,
             sender=evt.sender.mxid,
             destination=evt.sender.mxid,
         )
-        await puppet.agent_manager.signaling.set_chat_status(
-            room_id=portal.room_id,
-            status=Signaling.FOLLOWUP,
-            agent=evt.sender.mxid,
-            campaign_room_id=None,
-            keep_campaign=False,
-        )
-        # clear campaign in the ik.chat.campaign_selection state event
-        await puppet.agent_manager.signaling.set_selected_campaign(
-            room_id=portal.room_id, campaign_room_id=None
-        )
-        if puppet.config["acd.supervisors_to_invite.invite"]:
-            asyncio.create_task(portal.invite_supervisors())
-
-        # kick menu bot
-        evt.log.debug(f"Kicking the menubot out of the room {portal.room_id}")
-        try:
-            # TODO Remove when all clients have menuflow
-            menubot = await portal.get_current_menubot()
-            if menubot:
-                await puppet.room_manager.send_menubot_command(
-                    menubot.mxid, "cancel_task", portal.room_id
-                )
-                # ------  end remove -------
-            await portal.remove_menubot(
-                reason=f"{evt.sender.mxid} pm existing room {portal.room_id}"
+        if not changed:
+            # The chat keeps its state, so its status and members are not touched
+            invalid_state = portal.invalid_state_response(PortalState.FOLLOWUP)
+            status = invalid_state["status"]
+            return_params["reply"] = invalid_state["data"]["detail"]
+        else:
+            await puppet.agent_manager.signaling.set_chat_status(
+                room_id=portal.room_id,
+                status=Signaling.FOLLOWUP,
+                agent=evt.sender.mxid,
+                campaign_room_id=None,
+                keep_campaign=False,
+            )
+            # clear campaign in the ik.chat.campaign_selection state event
+            await puppet.agent_manager.signaling.set_selected_campaign(
+                room_id=portal.room_id, campaign_room_id=None
             )
-        except Exception as e:
-            evt.log.exception(e)
+            if puppet.config["acd.supervisors_to_invite.invite"]:
+                asyncio.create_task(portal.invite_supervisors())
+
+            # kick menu bot
+            evt.log.debug(f"Kicking the menubot out of the room {portal.room_id}")
+            try:
+                # TODO Remove when all clients have menuflow
+                menubot = await portal.get_current_menubot()
+                if menubot:
+                    await puppet.room_manager.send_menubot_command(
+                        menubot.mxid, "cancel_task", portal.room_id
+                    )
+                    # ------  end remove -------
+                await portal.remove_menubot(
+                    reason=f"{evt.sender.mxid} pm existing room {portal.room_id}"
+                )
+            except Exception as e:
+                evt.log.exception(e)
 
-        return_params["reply"] = "Now you are joined in room with [number], message was sent."
+            return_params["reply"] = "Now you are joined in room with [number], message was sent."
 
     # Sending a message to the frontend.
     cmd_front_msg = (
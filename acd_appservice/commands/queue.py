@@ -6,7 +6,7 @@ from slugify import slugify
 
 from ..events import ACDMembershipEvents, send_membership_event
 from ..queue import Queue
-from ..queue_membership import QueueMembership
+from ..queue_membership import QueueMembership, QueueMembershipState
 from ..user import User
 from ..util import Util
 from .handler import CommandArg, CommandEvent, command_handler
@@ -130,6 +130,16 @@ def args_parser():
 
     # Sub command list
     parser_list: ArgumentParser = subparsers.add_parser("list")
+    parser_list.add_argument("--limit", "-l", dest="limit", type=int, required=False)
+    parser_list.add_argument("--after", "-a", dest="after", type=str, required=False)
+    parser_list.add_argument(
+        "--membership-state",
+        "-s",
+        dest="membership_state",
+        type=str,
+        required=False,
+        choices=[state.value for state in QueueMembershipState],
+    )
 
     # Sub command set
     parser_set: ArgumentParser = subparsers.add_parser("set")
@@ -214,7 +224,9 @@ async def queue(evt: CommandEvent) -> Dict:
         return await info(evt=evt, room_id=queue_room_id)
 
     elif action == "list":
-        return await _list(evt=evt)
+        return await _list(
+            evt=evt, limit=args.limit, after=args.after, membership_state=args.membership_state
+        )
     elif action == "set":
         queue_room_id: RoomID = args.queue if args.queue else evt.room_id
         return await _set(evt=evt, queue_room_id=queue_room_id)
@@ -505,35 +517,50 @@ async def info(evt: CommandEvent, room_id: RoomID) -> Dict:
         await evt.reply(detail)
         return json_response
 
-    memberships: List[QueueMembership] = await QueueMembership.get_by_queue(fk_queue=queue.id)
-    text = f"#### Room: {await queue.get_formatted_room_id()}"
+    memberships: List[QueueMembership] = (
+        await QueueMembership.get_by_queue(fk_queue=queue.id) or []
+    )
+    users = await User.get_by_ids([membership.fk_user for membership in memberships])
+    displaynames = await User.get_displaynames(list(users.values()))
+
+    # The notice is not built if it will not be sent (e.g. API requests)
+    text = "" if evt.mute_reply else f"#### Room: {await queue.get_formatted_room_id()}"
 
     _memberships: List[Dict[str:Any]] = []
 
-    if memberships:
+    if memberships and not evt.mute_reply:
         text += "\n#### Current memberships:"
-        for membership in memberships:
-            user: User = await User.get_by_id(membership.fk_user)
-            text += f"\n\n- {await user.get_formatted_displayname()} -> state: {membership.state.value} || paused: {membership.paused}"
-            _memberships.append(
-                {
-                    "user_id": user.mxid,
-                    "displayname": await user.get_displayname(),
-                    "is_admin": user.is_admin,
-                    "state": membership.state.value,
-                    "paused": membership.paused,
-                    "creation_date": membership.creation_date.strftime("%Y-%m-%d %H:%M:%S%z")
-                    if membership.creation_date
-                    else None,
-                    "state_date": membership.state_date.strftime("%Y-%m-%d %H:%M:%S%z")
-                    if membership.state_date
-                    else None,
-                    "pause_date": membership.pause_date.strftime("%Y-%m-%d %H:%M:%S%z")
-                    if membership.pause_date
-                    else None,
-                    "pause_reason": membership.pause_reason,
-                }
+
+    for membership in memberships:
+        user: User = users.get(membership.fk_user)
+        if not user:
+            continue
+
+        displayname = displaynames.get(user.mxid)
+        if not evt.mute_reply:
+            text += (
+                f"\n\n- {User.format_displayname(mxid=user.mxid, displayname=displayname)} "
+                f"-> state: {membership.state.value} || paused: {membership.paused}"
             )
+        _memberships.append(
+            {
+                "user_id": user.mxid,
+                "displayname": displayname,
+                "is_admin": user.is_admin,
+                "state": membership.state.value,
+                "paused": membership.paused,
+                "creation_date": membership.creation_date.strftime("%Y-%m-%d %H:%M:%S%z")
+                if membership.creation_date
+                else None,
+                "state_date": membership.state_date.strftime("%Y-%m-%d %H:%M:%S%z")
+                if membership.state_date
+                else None,
+                "pause_date": membership.pause_date.strftime("%Y-%m-%d %H:%M:%S%z")
+                if membership.pause_date
+                else None,
+                "pause_reason": membership.pause_reason,
+            }
+        )
     await evt.reply(text=text)
 
     return {
@@ -549,27 +576,43 @@ async def info(evt: CommandEvent, room_id: RoomID) -> Dict:
     }
 
 
-async def _list(evt: CommandEvent) -> Dict:
-    """`list` returns a list of all registered queues
+async def _list(
+    evt: CommandEvent,
+    limit: Optional[int] = None,
+    after: Optional[RoomID] = None,
+    membership_state: Optional[str] = None,
+) -> Dict:
+    """`list` returns a list of all registered queues, or a page of them
 
     Parameters
     ----------
     evt : CommandEvent
         The event object.
+    limit : Optional[int]
+        Max number of queues, all the queues if it is None.
+    after : Optional[RoomID]
+        The `next_room_id` of the previous page.
+    membership_state : Optional[str]
+        Only the queues with at least one membership in this state.
 
     Returns
     -------
         A dictionary with a status code and a data key.
 
     """
-    queues: List[Queue] = await Queue.get_all()
+    queues: List[Queue] = await Queue.get_all(
+        after=after, limit=limit, membership_state=membership_state
+    )
 
     text = "#### Registered queues"
 
     if not queues:
         await evt.reply(text + "\nNo rooms available")
+        data = {"queues": []}
+        if limit:
+            data["next_room_id"] = None
         return {
-            "data": {"queues": []},
+            "data": data,
             "status": 200,
         }
 
@@ -589,8 +632,12 @@ async def _list(evt: CommandEvent) -> Dict:
 
     await evt.reply(text)
 
+    data = {"queues": _queues}
+    if limit:
+        data["next_room_id"] = queues[-1].room_id if len(queues) == limit else None
+
     return {
-        "data": {"queues": _queues},
+        "data": data,
         "status": 200,
     }
 
@@ -9,11 +9,14 @@ from mautrix.types import RoomID, UserID
 from mautrix.util.logging import TraceLogger
 
 from ..config import Config
-from ..events import ACDConversationEvents, send_conversation_event
+from ..db.job import Job
+from ..events import ACDConversationEvents
+from ..job_manager import JobManager
 from ..portal import Portal, PortalState
 from ..puppet import Puppet
 from ..signaling import Signaling
 from ..user import User
+from ..util import Util
 from .handler import CommandArg, CommandEvent, CommandProcessor, command_handler
 
 author_arg = CommandArg(
@@ -92,13 +95,17 @@ async def resolve(evt: CommandEvent) -> Dict:
         detail = "Group queues or control rooms cannot be resolved."
         evt.log.error(detail)
         await evt.intent.send_notice(room_id=portal_room_id, text=detail)
-        return
+        return Util.create_response_data(detail=detail, room_id=portal_room_id, status=422)
 
     puppet: Puppet = await Puppet.get_by_portal(portal_room_id=portal_room_id)
 
     portal = await Portal.get_by_room_id(
         room_id=portal_room_id, fk_puppet=puppet.pk, intent=puppet.intent, bridge=puppet.bridge
     )
+    # A chat that can not be resolved keeps its members
+    if not portal.can_change_state(PortalState.RESOLVED):
+        return portal.invalid_state_response(PortalState.RESOLVED)
+
     agent = await portal.get_current_agent()
 
     try:
@@ -124,18 +131,20 @@ async def resolve(evt: CommandEvent) -> Dict:
     # When the supervisor resolves an open chat, menubot is still in the chat
     await portal.remove_menubot(reason=puppet.config["acd.resolve_chat.notice"])
 
-    # Cleaning portal destination
-    portal.destination_on_transit = None
-    await portal.save()
-
-    # set chat status to resolved
-    await portal.update_state(PortalState.RESOLVED)
-    await send_conversation_event(
-        portal=portal,
-        event_type=ACDConversationEvents.Resolve,
-        sender=evt.sender.mxid,
-        agent_removed=agent,
-    )
+    async with portal.transition():
+        # Cleaning portal destination
+        portal.destination_on_transit = None
+
+        # set chat status to resolved
+        resolved = await portal.update_state(
+            PortalState.RESOLVED,
+            event_type=ACDConversationEvents.Resolve,
+            sender=evt.sender.mxid,
+            agent_removed=agent,
+        )
+
+    if not resolved:
+        return portal.invalid_state_response(PortalState.RESOLVED)
 
     await puppet.agent_manager.signaling.set_chat_status(
         room_id=portal.room_id, status=Signaling.RESOLVED, agent=author
@@ -163,95 +172,104 @@ async def resolve(evt: CommandEvent) -> Dict:
 
 class BulkResolve:
     log: TraceLogger = logging.getLogger("acd.bulk_resolve")
-    room_ids = set()
-    active_resolve = False
 
     def __init__(self, config: Config, commands: CommandProcessor) -> None:
         self.commands = commands
         self.config = config
         self.block_size = self.config["acd.bulk_resolve.block_size"]
 
+    async def resolve_room(
+        self, room_id: RoomID, user: User, user_id: UserID, send_message: str
+    ) -> bool:
+        """It runs the resolve command in the room
+
+        Returns
+        -------
+            True if the room was resolved.
+
+        """
+        try:
+            puppet: Puppet = await Puppet.get_by_portal(portal_room_id=room_id)
+            if not puppet:
+                self.log.warning(
+                    f"The room {room_id} has not been resolved because the puppet was not found"
+                )
+                return False
+
+            if not puppet.bridge:
+                self.log.warning(
+                    f"The room {room_id} has not been resolved because I didn't found the bridge"
+                )
+                return False
+
+            result = await self.commands.handle(
+                sender=user,
+                command="resolve",
+                args_list=["-p", room_id, "-a", user_id, "-sm", send_message],
+                intent=puppet.intent,
+                is_management=False,
+            )
+        except Exception as e:
+            self.log.exception(f"The room {room_id} has not been resolved: {e}")
+            return False
+
+        return not (isinstance(result, dict) and result.get("status", 200) >= 400)
+
     async def resolve(
-        self, new_room_ids: List[RoomID], user: User, user_id: UserID, send_message: str
-    ):
-        """It resolves all the rooms in the `room_ids` set, in blocks of `block_size` rooms
+        self,
+        room_ids: List[RoomID],
+        user: User,
+        user_id: UserID,
+        send_message: str,
+        job: Job | None = None,
+    ) -> Dict:
+        """It resolves the rooms in blocks of `block_size` rooms
 
         Parameters
         ----------
-        new_room_ids : List[RoomID]
-            List[RoomID]
+        room_ids : List[RoomID]
+            The rooms to be resolved.
         user : User
             The user that will be used to send the message.
         user_id : UserID
             The user ID of the user who will send the message.
         send_message : str
-            The message to be sent to the room.
+            Whether a resolution message is sent to the rooms.
+        job : Job | None
+            The job that runs the bulk resolve, the resolved and failed rooms are added
+            to its progress after each block.
 
         Returns
         -------
-            A list of rooms to be resolved.
+            A dict with the rooms that have not been resolved.
 
         """
+        room_ids = list(dict.fromkeys(room_ids))
+        not_resolved: List[RoomID] = []
 
-        # Adding the new rooms to the set of rooms to be resolved.
-        self.room_ids |= set(new_room_ids)
-
-        self.log.info(
-            f"Starting bulk resolve of {len(new_room_ids)} rooms, "
-            f"current rooms {len(self.room_ids)}"
-        )
-
-        if self.active_resolve:
-            self.log.debug(
-                f"Rooms have been enqueued {len(new_room_ids)}, "
-                "as there is an active bulk resolution"
-            )
-            return
-
-        self.active_resolve = True
+        self.log.info(f"Starting bulk resolve of {len(room_ids)} rooms")
 
-        # Resolving the rooms in bulk.
-        while len(self.room_ids) > 0:
-            tasks = []
-
-            rooms_to_resolve = list(self.room_ids)[0 : self.block_size]
+        for start in range(0, len(room_ids), self.block_size):
+            rooms_to_resolve = room_ids[start : start + self.block_size]
             self.log.info(
-                f"Rooms to be resolved: {len(rooms_to_resolve)}, current rooms {len(self.room_ids)}"
+                f"Rooms to be resolved: {len(rooms_to_resolve)}, "
+                f"pending rooms {len(room_ids) - start}"
             )
 
-            for room_id in rooms_to_resolve:
-                self.room_ids.remove(room_id)
-                puppet: Puppet = await Puppet.get_by_portal(portal_room_id=room_id)
-                if not puppet:
-                    self.log.warning(
-                        f"The room {room_id} has not been resolved because the puppet was not found"
-                    )
-                    continue
-
-                bridge = puppet.bridge
-
-                if not bridge:
-                    self.log.warning(
-                        f"The room {room_id} has not been resolved because I didn't found the bridge"
-                    )
-                    continue
-
-                args = ["-p", room_id, "-a", user_id, "-sm", send_message]
-
-                tasks.append(
-                    self.commands.handle(
-                        sender=user,
-                        command="resolve",
-                        args_list=args,
-                        intent=puppet.intent,
-                        is_management=False,
+            results = await asyncio.gather(
+                *(
+                    self.resolve_room(
+                        room_id=room_id, user=user, user_id=user_id, send_message=send_message
                     )
+                    for room_id in rooms_to_resolve
                 )
+            )
+            failed = [room_id for room_id, ok in zip(rooms_to_resolve, results) if not ok]
+            not_resolved.extend(failed)
 
-            try:
-                await asyncio.gather(*tasks)
-            except Exception as e:
-                self.log.error(e)
-                continue
+            if job:
+                await JobManager.progress(
+                    job, done=len(rooms_to_resolve) - len(failed), failed=len(failed)
+                )
 
-        self.active_resolve = False
+        return {"not_resolved": not_resolved}
@@ -146,13 +146,15 @@ async def transfer(evt: CommandEvent) -> str:
 
     queue: Queue = await Queue.get_by_room_id(room_id=campaign_room_id, create=False)
 
-    await portal.update_state(PortalState.ON_DISTRIBUTION)
-    await send_conversation_event(
-        portal=portal,
+    if not await portal.update_state(
+        PortalState.ON_DISTRIBUTION,
         event_type=ACDConversationEvents.Transfer,
         sender=evt.sender.mxid,
         destination=queue.room_id,
-    )
+    ):
+        # The chat is not transferred, the agent stays in it
+        portal.unlock(transfer=True)
+        return portal.invalid_state_response(PortalState.ON_DISTRIBUTION)
 
     current_agent: User = await portal.get_current_agent()
     if enqueue_chat and current_agent:
@@ -215,42 +217,44 @@ async def transfer_user(evt: CommandEvent) -> str:
 
     agent: User = await User.get_by_mxid(agent_id, create=False)
 
-    await portal.update_state(PortalState.ASSIGNED)
-    await send_conversation_event(
-        portal=portal,
-        event_type=ACDConversationEvents.Transfer,
-        sender=evt.sender.mxid,
-        destination=agent_id,
-    )
-
-    if not agent:
-        await portal.update_state(portal.prev_state)
-        await send_conversation_event(
-            portal=portal,
-            event_type=ACDConversationEvents.TransferFailed,
-            reason="Agent not found",
+    # A failed transfer is saved once, back in its previous state
+    async with portal.transition():
+        if not await portal.update_state(
+            PortalState.ASSIGNED,
+            event_type=ACDConversationEvents.Transfer,
+            sender=evt.sender.mxid,
             destination=agent_id,
-        )
-        return Util.create_response_data(
-            detail="Agent with given user id does not exist", room_id=portal.room_id, status=404
-        )
+        ):
+            return portal.invalid_state_response(PortalState.ASSIGNED)
 
-    if not puppet:
-        return
+        if not agent:
+            await portal.update_state(
+                portal.prev_state,
+                event_type=ACDConversationEvents.TransferFailed,
+                reason="Agent not found",
+                destination=agent_id,
+            )
+            return Util.create_response_data(
+                detail="Agent with given user id does not exist",
+                room_id=portal.room_id,
+                status=404,
+            )
 
-    # Checking if the room is locked, if it is, it returns.
-    if portal.is_locked:
-        await portal.update_state(portal.prev_state)
-        await send_conversation_event(
-            portal=portal,
-            event_type=ACDConversationEvents.TransferFailed,
-            destination=agent_id,
-            reason="Room is locked by transfer",
-        )
-        evt.log.debug(f"Room: {portal.room_id} LOCKED by Transfer user")
-        return Util.create_response_data(
-            detail="Current portal is locked by transfer", room_id=portal.room_id, status=423
-        )
+        if not puppet:
+            return
+
+        # Checking if the room is locked, if it is, it returns.
+        if portal.is_locked:
+            await portal.update_state(
+                portal.prev_state,
+                event_type=ACDConversationEvents.TransferFailed,
+                destination=agent_id,
+                reason="Room is locked by transfer",
+            )
+            evt.log.debug(f"Room: {portal.room_id} LOCKED by Transfer user")
+            return Util.create_response_data(
+                detail="Current portal is locked by transfer", room_id=portal.room_id, status=423
+            )
 
     evt.log.debug(f"INIT TRANSFER for {portal.room_id} to AGENT {agent.mxid}")
 
@@ -271,9 +275,8 @@ async def transfer_user(evt: CommandEvent) -> str:
     try:
         # Checking if the agent is already in the room, if so, it sends a message to the room.
         if transfer_author.mxid == agent.mxid:
-            await portal.update_state(portal.prev_state)
-            await send_conversation_event(
-                portal=portal,
+            await portal.update_state(
+                portal.prev_state,
                 event_type=ACDConversationEvents.TransferFailed,
                 destination=agent_id,
                 reason="Agent is already in the room",
@@ -315,9 +318,8 @@ async def transfer_user(evt: CommandEvent) -> str:
                         detail=msg, room_id=evt.room_id, status=200
                     )
             else:
-                await portal.update_state(portal.prev_state)
-                await send_conversation_event(
-                    portal=portal,
+                await portal.update_state(
+                    portal.prev_state,
                     event_type=ACDConversationEvents.TransferFailed,
                     reason="Agent not available",
                     destination=agent_id,
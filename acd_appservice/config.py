@@ -101,6 +101,10 @@ class Config(BaseBridgeConfig):
         copy("acd.no_agents_for_transfer")
         copy_dict("acd.resolve_chat")
         copy("acd.bulk_resolve.block_size")
+        copy("acd.jobs.concurrency")
+        copy("acd.jobs.max_jobs")
+        copy("acd.jobs.save_interval")
+        copy("acd.jobs.retention_days")
         copy("acd.available_agents_room")
         copy("acd.queues.visibility")
         copy("acd.enqueued_portals.portals_per_agent")
@@ -109,6 +113,43 @@ class Config(BaseBridgeConfig):
         copy("acd.enqueued_portals.search_pending_rooms_interval")
         copy("acd.queues.invitees")
         copy("acd.use_presence")
+        copy("acd.portal_message_events")
+        copy("acd.portal_write_behind.enabled")
+        copy("acd.portal_write_behind.flush_interval")
+        copy("acd.portal_write_behind.sync_states")
+        copy("acd.tracked_messages_filter.enabled")
+        copy("acd.tracked_messages_filter.capacity")
+        copy("acd.tracked_messages_filter.error_rate")
+        copy("acd.message_retention.enabled")
+        copy("acd.message_retention.retention_days")
+        copy("acd.message_retention.archive")
+        copy("acd.message_retention.archive_retention_days")
+        copy("acd.message_retention.batch_size")
+        copy("acd.message_retention.interval")
+        copy("acd.displaynames.cache_ttl")
+        copy("acd.displaynames.fetch_concurrency")
+        copy("acd.displaynames.max_cached")
+        copy("acd.bridge_monitor.concurrency")
+        copy("acd.bridge_monitor.jitter")
+        copy("acd.bridge_monitor.max_age")
+        copy("acd.response_cache.enabled")
+        copy("acd.response_cache.max_entries")
+        copy("acd.bulk_send.concurrency")
+        copy_dict("acd.bulk_send.rate_limits")
+        copy("acd.bulk_send.insert_batch_size")
+        copy("acd.bulk_send.flush_interval")
+        copy("acd.bulk_send.insert_retries")
+        copy("acd.bulk_send.max_recipients")
+        copy("acd.event_stream.enabled")
+        copy("acd.event_stream.max_subscribers")
+        copy("acd.event_stream.max_buffer")
+        copy("acd.event_stream.keepalive_interval")
+        copy("acd.api_auth.cache_ttl")
+        copy("acd.api_auth.negative_cache_ttl")
+        copy("acd.api_auth.max_cached_callers")
+        copy("acd.signaling.chat_data_ttl")
+        copy("acd.signaling.max_cached_chats")
+        copy("acd.api_body.max_size")
         copy_dict("acd.access_methods")
 
         # Utils
@@ -120,7 +161,22 @@ class Config(BaseBridgeConfig):
         copy_dict("ikono_api")
 
         # NATS
-        copy_dict("nats")
+        copy("nats.enabled")
+        copy("nats.address")
+        copy("nats.user")
+        copy("nats.password")
+        copy("nats.subject")
+        copy("nats.duplicate_window")
+        copy("nats.partitions.enabled")
+        copy("nats.partitions.by")
+        copy("nats.partitions.count")
+        copy("nats.payload_encoding")
+        copy("nats.outbox.enabled")
+        copy("nats.outbox.batch_size")
+        copy("nats.outbox.flush_interval")
+        copy("nats.outbox.lease")
+        copy("nats.outbox.retention_days")
+        copy("nats.outbox.cleanup_interval")
 
     @property
     def namespaces(self) -> dict[str, list[dict[str, Any]]]:
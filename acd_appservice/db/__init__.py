@@ -1,5 +1,8 @@
 from mautrix.util.async_db import Database
 
+from .bridge_status import BridgeStatus
+from .event_outbox import EventOutbox
+from .job import Job
 from .message import Message
 from .portal import Portal
 from .puppet import Puppet
@@ -10,7 +13,17 @@ from .user import User
 
 
 def init(db: Database) -> None:
-    for table in [Puppet, Portal, Message, User, Queue, QueueMembership]:
+    for table in [
+        Puppet,
+        Portal,
+        Message,
+        User,
+        Queue,
+        QueueMembership,
+        EventOutbox,
+        BridgeStatus,
+        Job,
+    ]:
         table.db = db
 
 
@@ -23,4 +36,7 @@ __all__ = [
     "User",
     "Queue",
     "QueueMembership",
+    "EventOutbox",
+    "BridgeStatus",
+    "Job",
 ]
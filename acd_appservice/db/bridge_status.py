@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, ClassVar, Dict, List
+
+import asyncpg
+from attr import dataclass
+from mautrix.types import UserID
+from mautrix.util.async_db import Database
+
+fake_db = Database.create("") if TYPE_CHECKING else None
+
+
+@dataclass
+class BridgeStatus:
+    """The last ping of the bridge of a puppet, saved by the bridge monitor"""
+
+    db: ClassVar[Database] = fake_db
+
+    puppet_mxid: UserID
+    bridge: str | None
+    is_connected: bool
+    response: str
+    checked_date: datetime
+    changed_date: datetime
+
+    @property
+    def _values(self):
+        return (
+            self.puppet_mxid,
+            self.bridge,
+            self.is_connected,
+            self.response,
+            self.checked_date,
+            self.changed_date,
+        )
+
+    _columns = "puppet_mxid, bridge, is_connected, response, checked_date, changed_date"
+
+    @classmethod
+    def _from_row(cls, row: asyncpg.Record) -> BridgeStatus:
+        return cls(**row)
+
+    @property
+    def response_data(self) -> Dict:
+        return json.loads(self.response)
+
+    def is_older_than(self, seconds: float) -> bool:
+        """True if the last ping was more than `seconds` ago"""
+        checked_date = self.checked_date
+        if checked_date.tzinfo:
+            checked_date = checked_date.astimezone(timezone.utc).replace(tzinfo=None)
+        return datetime.utcnow() - checked_date > timedelta(seconds=seconds)
+
+    async def upsert(self) -> None:
+        q = (
+            f"INSERT INTO bridge_status ({self._columns}) VALUES ($1, $2, $3, $4, $5, $6) "
+            "ON CONFLICT (puppet_mxid) DO UPDATE SET bridge=$2, is_connected=$3, response=$4, "
+            "checked_date=$5, changed_date=$6"
+        )
+        await self.db.execute(q, *self._values)
+
+    @classmethod
+    async def get_by_puppet_mxid(cls, puppet_mxid: UserID) -> BridgeStatus | None:
+        q = f"SELECT {cls._columns} FROM bridge_status WHERE puppet_mxid=$1"
+        row = await cls.db.fetchrow(q, puppet_mxid)
+        if not row:
+            return None
+        return cls._from_row(row)
+
+    @classmethod
+    async def get_by_puppet_mxids(cls, puppet_mxids: List[UserID]) -> Dict[UserID, BridgeStatus]:
+        """Get the last status of several puppets with a single query
+
+        Parameters
+        ----------
+        puppet_mxids : List[UserID]
+            The mxids of the puppets.
+
+        Returns
+        -------
+            A dict with the status of each puppet found.
+
+        """
+        q = f"SELECT {cls._columns} FROM bridge_status WHERE puppet_mxid = ANY($1::TEXT[])"
+        rows = await cls.db.fetch(q, puppet_mxids)
+        return {row["puppet_mxid"]: cls._from_row(row) for row in rows}
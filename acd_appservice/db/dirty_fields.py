@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+
+class DirtyFields:
+    """It keeps the values that were read from or written to the database,
+    so an update only writes the columns that have changed since then
+
+    The class must define `_columns` and `_values` in the same order.
+    """
+
+    # Values of the row in the database, None if they are unknown
+    _saved_values: Tuple | None = None
+
+    @classmethod
+    def _column_names(cls) -> Tuple[str]:
+        return tuple(column.strip() for column in cls._columns.split(","))
+
+    def _mark_as_saved(self, values: Tuple | None = None):
+        self._saved_values = values if values is not None else self._values
+
+    def _dirty_columns(self, values: Tuple, exclude: Tuple[str] = ()) -> Dict[str, Any]:
+        """Get the columns whose values are different from the saved ones
+
+        Parameters
+        ----------
+        values : Tuple
+            The current values, in the same order as `_columns`.
+        exclude : Tuple[str]
+            Columns that are never updated, e.g. the keys of the WHERE clause.
+
+        Returns
+        -------
+            A dict with the changed columns and their values,
+            all the columns if the saved values are unknown.
+
+        """
+        saved_values = self._saved_values or (object(),) * len(values)
+        return {
+            column: value
+            for column, value, saved_value in zip(self._column_names(), values, saved_values)
+            if column not in exclude and value != saved_value
+        }
+
+    @staticmethod
+    def _set_clause(columns: Dict[str, Any], start: int) -> str:
+        """It builds the SET clause of the update, the placeholders begin at `start`"""
+        return ", ".join(
+            f"{column}=${position}" for position, column in enumerate(columns, start=start)
+        )
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import TYPE_CHECKING, ClassVar, List
+
+import asyncpg
+from attr import dataclass
+from mautrix.util.async_db import Database
+
+fake_db = Database.create("") if TYPE_CHECKING else None
+
+
+@dataclass
+class EventOutbox:
+    db: ClassVar[Database] = fake_db
+
+    subject: str
+    payload: str
+    creation_date: datetime
+    delivered_date: datetime | None = None
+    event_id: str | None = None
+    id: int | None = None
+
+    @property
+    def _values(self):
+        return (
+            self.event_id,
+            self.subject,
+            self.payload,
+            self.creation_date,
+            self.delivered_date,
+        )
+
+    _columns = "event_id, subject, payload, creation_date, delivered_date"
+
+    @classmethod
+    def _from_row(cls, row: asyncpg.Record) -> EventOutbox:
+        return cls(**row)
+
+    @staticmethod
+    def unnest_values(events: List[EventOutbox]) -> tuple:
+        """It transposes the values of the events into one list per column,
+        so several events can be inserted with a single query using unnest"""
+        return tuple(list(column) for column in zip(*(event._values for event in events)))
+
+    async def insert(self) -> None:
+        """It inserts the event in the outbox, it will be published by the outbox flusher"""
+        q = f"INSERT INTO event_outbox ({self._columns}) VALUES ($1, $2, $3, $4, $5) RETURNING id"
+        self.id = await self.db.fetchval(q, *self._values)
+
+    @classmethod
+    async def claim_pending(cls, claimed_by: str, limit: int, lease: int) -> List[EventOutbox]:
+        """It leases the oldest events that have not been delivered yet to a flusher
+
+        The events of a subject leased by another flusher are skipped, so the events
+        of a subject are only published by one flusher at a time and keep their order.
+        The claims are serialized with an advisory lock, it is only held while the
+        events are leased, not while they are published.
+
+        Parameters
+        ----------
+        claimed_by : str
+            The id of the flusher.
+        limit : int
+            Max number of events to lease.
+        lease : int
+            Seconds until the lease expires, then other flushers can publish the events.
+
+        Returns
+        -------
+            A list of EventOutbox objects sorted by id.
+
+        """
+        q = (
+            "WITH leased AS ("
+            "SELECT DISTINCT subject FROM event_outbox WHERE delivered_date IS NULL "
+            "AND claimed_until > now() AND claimed_by <> $1"
+            "), claimed AS ("
+            "UPDATE event_outbox SET claimed_by=$1, "
+            "claimed_until=now() + $3::INTEGER * INTERVAL '1 second' "
+            "WHERE id IN (SELECT id FROM event_outbox WHERE delivered_date IS NULL "
+            "AND subject NOT IN (SELECT subject FROM leased) ORDER BY id ASC LIMIT $2) "
+            f"RETURNING id, {cls._columns}"
+            ") SELECT * FROM claimed ORDER BY id ASC"
+        )
+        async with cls.db.acquire() as conn, conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('event_outbox'))")
+            rows = await conn.fetch(q, claimed_by, limit, lease)
+        return [cls._from_row(row) for row in rows]
+
+    @classmethod
+    async def release(cls, ids: List[int], claimed_by: str) -> None:
+        """It ends the lease of the events that have not been published,
+        so the next flush starts again from them"""
+        q = (
+            "UPDATE event_outbox SET claimed_by=NULL, claimed_until=NULL "
+            "WHERE id = ANY($1::BIGINT[]) AND claimed_by=$2"
+        )
+        await cls.db.execute(q, ids, claimed_by)
+
+    @classmethod
+    async def get_after(
+        cls, after_id: int, limit: int, pending_only: bool = False
+    ) -> List[EventOutbox]:
+        """Get the events after an id, it is used to read the outbox in blocks
+
+        Parameters
+        ----------
+        after_id : int
+            Events with an id greater than this one are returned.
+        limit : int
+            Max number of events to get.
+        pending_only : bool
+            If True, only the events that have not been delivered are returned.
+
+        Returns
+        -------
+            A list of EventOutbox objects sorted by id.
+
+        """
+        pending_filter = "AND delivered_date IS NULL " if pending_only else ""
+        q = (
+            f"SELECT id, {cls._columns} FROM event_outbox WHERE id > $1 "
+            f"{pending_filter}ORDER BY id ASC LIMIT $2"
+        )
+        rows = await cls.db.fetch(q, after_id, limit)
+        return [cls._from_row(row) for row in rows]
+
+    @classmethod
+    async def mark_as_delivered(cls, ids: List[int], delivered_date: datetime) -> None:
+        """It marks a batch of events as delivered with a single query
+
+        Parameters
+        ----------
+        ids : List[int]
+            Ids of the delivered events.
+        delivered_date : datetime
+            Date of the delivery.
+        """
+        q = (
+            "UPDATE event_outbox SET delivered_date=$2, claimed_by=NULL, claimed_until=NULL "
+            "WHERE id = ANY($1::BIGINT[])"
+        )
+        await cls.db.execute(q, ids, delivered_date)
+
+    @classmethod
+    async def delete_delivered_before(cls, date: datetime) -> int:
+        """It deletes the events delivered before a date
+
+        Parameters
+        ----------
+        date : datetime
+            Events delivered before this date are deleted.
+
+        Returns
+        -------
+            The number of deleted events.
+
+        """
+        q = "DELETE FROM event_outbox WHERE delivered_date < $1"
+        result = await cls.db.execute(q, date)
+        # asyncpg returns the status of the command, e.g. "DELETE 10"
+        return int(result.split()[-1])
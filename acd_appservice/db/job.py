@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, ClassVar, Dict, List
+
+import asyncpg
+from attr import dataclass
+from mautrix.types import SerializableEnum
+from mautrix.util.async_db import Database
+
+fake_db = Database.create("") if TYPE_CHECKING else None
+
+
+class JobStatus(SerializableEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    # The ACD stopped while the job was pending or running
+    INTERRUPTED = "interrupted"
+
+
+UNFINISHED = [JobStatus.PENDING.value, JobStatus.RUNNING.value]
+
+
+@dataclass
+class Job:
+    """A long operation of the API that runs in the background, its progress is saved
+    so it can be queried with the id returned by the endpoint that started it"""
+
+    db: ClassVar[Database] = fake_db
+
+    id: str
+    kind: str
+    status: JobStatus
+    creation_date: datetime
+    update_date: datetime
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    result: str | None = None
+    error: str | None = None
+    created_by: str | None = None
+
+    @property
+    def _values(self):
+        return (
+            self.id,
+            self.kind,
+            self.status.value,
+            self.total,
+            self.done,
+            self.failed,
+            self.result,
+            self.error,
+            self.created_by,
+            self.creation_date,
+            self.update_date,
+        )
+
+    _columns = (
+        "id, kind, status, total, done, failed, result, error, "
+        "created_by, creation_date, update_date"
+    )
+
+    @classmethod
+    def _from_row(cls, row: asyncpg.Record) -> Job:
+        data = {**row}
+        status = JobStatus(data.pop("status"))
+        return cls(status=status, **data)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status.value not in UNFINISHED
+
+    @property
+    def result_data(self) -> Dict | None:
+        return json.loads(self.result) if self.result else None
+
+    def serialize(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "pending": max(self.total - self.done - self.failed, 0),
+            "result": self.result_data,
+            "error": self.error,
+            "created_by": self.created_by,
+            "creation_date": self.creation_date.isoformat(),
+            "update_date": self.update_date.isoformat(),
+        }
+
+    async def insert(self) -> None:
+        q = (
+            f"INSERT INTO job ({self._columns}) "
+            "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)"
+        )
+        await self.db.execute(q, *self._values)
+
+    async def update(self) -> None:
+        q = (
+            "UPDATE job SET status=$2, total=$3, done=$4, failed=$5, result=$6, error=$7, "
+            "update_date=$8 WHERE id=$1"
+        )
+        await self.db.execute(
+            q,
+            self.id,
+            self.status.value,
+            self.total,
+            self.done,
+            self.failed,
+            self.result,
+            self.error,
+            self.update_date,
+        )
+
+    @classmethod
+    async def get_by_id(cls, id: str) -> Job | None:
+        q = f"SELECT {cls._columns} FROM job WHERE id=$1"
+        row = await cls.db.fetchrow(q, id)
+        if not row:
+            return None
+        return cls._from_row(row)
+
+    @classmethod
+    async def get_recent(
+        cls, limit: int, kind: str | None = None, status: str | None = None
+    ) -> List[Job]:
+        """Get the last created jobs, optionally of a kind and a status"""
+        q = (
+            f"SELECT {cls._columns} FROM job "
+            "WHERE ($1::TEXT IS NULL OR kind=$1) AND ($2::TEXT IS NULL OR status=$2) "
+            "ORDER BY creation_date DESC LIMIT $3"
+        )
+        rows = await cls.db.fetch(q, kind, status, limit)
+        return [cls._from_row(row) for row in rows]
+
+    @classmethod
+    async def interrupt_unfinished(cls, update_date: datetime) -> int:
+        """It marks as interrupted the jobs that were pending or running when the ACD stopped
+
+        Returns
+        -------
+            The number of interrupted jobs.
+
+        """
+        q = (
+            "UPDATE job SET status=$1, error=$2, update_date=$3 "
+            "WHERE status = ANY($4::TEXT[]) RETURNING id"
+        )
+        rows = await cls.db.fetch(
+            q,
+            JobStatus.INTERRUPTED.value,
+            "The ACD was stopped before the job finished",
+            update_date,
+            UNFINISHED,
+        )
+        return len(rows)
+
+    @classmethod
+    async def delete_finished_before(cls, date: datetime) -> None:
+        q = "DELETE FROM job WHERE update_date < $1 AND NOT status = ANY($2::TEXT[])"
+        await cls.db.execute(q, date, UNFINISHED)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, ClassVar
+from datetime import datetime
+from typing import TYPE_CHECKING, ClassVar, List, Set, Tuple
 
 from attr import dataclass
 from mautrix.types import EventID, RoomID, UserID
@@ -41,6 +42,28 @@ class Message:
         )
         await self.db.execute(q, *self._values)
 
+    @classmethod
+    async def insert_many(cls, messages: List[Message]) -> None:
+        """It inserts the messages with a single query
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The messages to insert.
+
+        """
+        if not messages:
+            return
+
+        columns = [list(values) for values in zip(*(message._values for message in messages))]
+        q = (
+            "INSERT INTO message (event_id, room_id, sender, receiver, timestamp_send, "
+            "                     timestamp_read, was_read) "
+            "SELECT * FROM unnest($1::TEXT[], $2::TEXT[], $3::TEXT[], $4::TEXT[], "
+            "                     $5::BIGINT[], $6::BIGINT[], $7::BOOLEAN[])"
+        )
+        await cls.db.execute(q, *columns)
+
     async def mark_as_read(
         self,
         receiver: str,
@@ -70,11 +93,150 @@ class Message:
 
     @classmethod
     async def get_by_event_id(cls, event_id: EventID) -> Message | None:
+        # The archived messages are found too
         q = (
             "SELECT event_id, room_id, sender, receiver, timestamp_send, timestamp_read, was_read "
-            "FROM message WHERE event_id=$1"
+            "FROM message WHERE event_id=$1 "
+            "UNION ALL "
+            "SELECT event_id, room_id, sender, receiver, timestamp_send, timestamp_read, was_read "
+            "FROM message_archive WHERE event_id=$1 LIMIT 1"
         )
         row = await cls.db.fetchrow(q, event_id)
         if not row:
             return None
         return cls(**row)
+
+    @classmethod
+    async def get_tracked_event_ids(cls, event_ids: List[EventID]) -> Set[EventID]:
+        """Get the event ids that belong to a message sent by the send_message endpoint
+
+        Parameters
+        ----------
+        event_ids : List[EventID]
+            The event ids to look up.
+
+        Returns
+        -------
+            A set with the event ids found.
+
+        """
+        q = "SELECT event_id FROM message WHERE event_id = ANY($1::TEXT[])"
+        rows = await cls.db.fetch(q, event_ids)
+        return {row["event_id"] for row in rows}
+
+    @classmethod
+    async def get_event_ids(
+        cls, after: EventID | None = None, limit: int = 10000
+    ) -> List[EventID]:
+        """Get a page of the event ids of the messages, ordered by event_id
+
+        Parameters
+        ----------
+        after : EventID | None
+            The last event id of the previous page.
+        limit : int
+            The page size.
+
+        Returns
+        -------
+            A list with the event ids of the page.
+
+        """
+        q = "SELECT event_id FROM message WHERE event_id > $1 ORDER BY event_id LIMIT $2"
+        rows = await cls.db.fetch(q, after or "", limit)
+        return [row["event_id"] for row in rows]
+
+    @classmethod
+    async def mark_as_read_many(
+        cls, room_id: RoomID, receipts: List[Tuple[EventID, str, int]]
+    ) -> None:
+        """It applies the read receipts of a room with a single query
+
+        Whatsapp bridge only sends us the read verification of the last message sent,
+        so the previous unread messages of the receiver are marked as read too.
+
+        Parameters
+        ----------
+        room_id : RoomID
+            The room of the receipts.
+        receipts : List[Tuple[EventID, str, int]]
+            The event id, the receiver and the read timestamp of each receipt.
+
+        """
+        event_ids, receivers, timestamps = zip(*receipts)
+        q = (
+            "UPDATE message SET timestamp_read=r.timestamp_read, was_read='t' "
+            "FROM unnest($2::TEXT[], $3::TEXT[], $4::BIGINT[]) "
+            "AS r(event_id, receiver, timestamp_read) "
+            "WHERE message.room_id=$1 AND (message.event_id=r.event_id "
+            "OR (message.receiver=r.receiver AND message.was_read='f'))"
+        )
+        await cls.db.execute(q, room_id, list(event_ids), list(receivers), list(timestamps))
+
+    @classmethod
+    async def archive_sent_before(cls, timestamp: int, limit: int) -> int:
+        """It moves the oldest messages sent before a timestamp to the message_archive table
+
+        Parameters
+        ----------
+        timestamp : int
+            Messages sent before this timestamp (seconds) are archived.
+        limit : int
+            Max number of messages moved.
+
+        Returns
+        -------
+            The number of archived messages.
+
+        """
+        # The archived rows win over the ones already in the archive (e.g. an event
+        # restored and archived again), the count is of the rows deleted from message
+        q = (
+            "WITH archived AS ("
+            "    DELETE FROM message WHERE event_id IN ("
+            "        SELECT event_id FROM message WHERE timestamp_send < $1 "
+            "        ORDER BY timestamp_send LIMIT $2"
+            "    ) RETURNING event_id, room_id, sender, receiver, timestamp_send, "
+            "                timestamp_read, was_read"
+            "), inserted AS ("
+            "    INSERT INTO message_archive (event_id, room_id, sender, receiver, "
+            "                                 timestamp_send, timestamp_read, was_read, "
+            "                                 archived_date) "
+            "    SELECT event_id, room_id, sender, receiver, timestamp_send, timestamp_read, "
+            "           was_read, $3 FROM archived "
+            "    ON CONFLICT (event_id) DO UPDATE SET room_id=excluded.room_id, "
+            "    sender=excluded.sender, receiver=excluded.receiver, "
+            "    timestamp_send=excluded.timestamp_send, timestamp_read=excluded.timestamp_read, "
+            "    was_read=excluded.was_read, archived_date=excluded.archived_date"
+            ") "
+            "SELECT count(*) FROM archived"
+        )
+        return await cls.db.fetchval(q, timestamp, limit, datetime.utcnow())
+
+    @classmethod
+    async def delete_sent_before(cls, timestamp: int, limit: int, table: str = "message") -> int:
+        """It deletes the oldest messages sent before a timestamp
+
+        Parameters
+        ----------
+        timestamp : int
+            Messages sent before this timestamp (seconds) are deleted.
+        limit : int
+            Max number of messages deleted.
+        table : str
+            `message` or `message_archive`.
+
+        Returns
+        -------
+            The number of deleted messages.
+
+        """
+        q = (
+            f"DELETE FROM {table} WHERE event_id IN ("
+            f"    SELECT event_id FROM {table} WHERE timestamp_send < $1 "
+            "    ORDER BY timestamp_send LIMIT $2"
+            ")"
+        )
+        result = await cls.db.execute(q, timestamp, limit)
+        # asyncpg returns the status of the command, e.g. "DELETE 10"
+        return int(result.split()[-1])
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import TYPE_CHECKING, ClassVar, Dict, List
+from typing import TYPE_CHECKING, ClassVar, Dict, List, Set
 
 import asyncpg
 from attr import dataclass
 from mautrix.types import RoomID, SerializableEnum, UserID
 from mautrix.util.async_db import Database
 
+from .dirty_fields import DirtyFields
+from .event_outbox import EventOutbox
+
 fake_db = Database.create("") if TYPE_CHECKING else None
 
 
@@ -23,9 +26,46 @@ class PortalState(SerializableEnum):
     ASSIGNED = "ASSIGNED"
     ON_TRANSIT = "ON_TRANSIT"
 
+    def can_change_to(self, state: PortalState) -> bool:
+        return state == self or state in PORTAL_TRANSITIONS[self]
+
+
+# States that a conversation can take from each state, ON_DISTRIBUTION, ASSIGNED and ON_TRANSIT
+# are only kept while the chat is distributed, transferred or waiting for the customer
+PORTAL_TRANSITIONS: Dict[PortalState, Set[PortalState]] = {
+    PortalState.INIT: set(PortalState),
+    PortalState.START: set(PortalState),
+    PortalState.ONMENU: set(PortalState),
+    PortalState.ENQUEUED: set(PortalState),
+    PortalState.PENDING: set(PortalState),
+    PortalState.FOLLOWUP: set(PortalState),
+    PortalState.RESOLVED: set(PortalState),
+    PortalState.ON_DISTRIBUTION: {
+        PortalState.ASSIGNED,
+        PortalState.ENQUEUED,
+        PortalState.START,
+        PortalState.RESOLVED,
+        PortalState.INIT,
+    },
+    PortalState.ASSIGNED: {
+        PortalState.PENDING,
+        PortalState.FOLLOWUP,
+        PortalState.ON_DISTRIBUTION,
+        PortalState.START,
+        PortalState.RESOLVED,
+        PortalState.INIT,
+    },
+    PortalState.ON_TRANSIT: {
+        PortalState.START,
+        PortalState.FOLLOWUP,
+        PortalState.RESOLVED,
+        PortalState.INIT,
+    },
+}
+
 
 @dataclass
-class Portal:
+class Portal(DirtyFields):
     db: ClassVar[Database] = fake_db
 
     room_id: RoomID
@@ -69,20 +109,73 @@ class Portal:
         state = PortalState(data.pop("state"))
         prev_state = data.pop("prev_state")
         parsed_prev_state = PortalState(prev_state) if prev_state else None
-        return cls(state=state, prev_state=parsed_prev_state, **data)
+        portal = cls(state=state, prev_state=parsed_prev_state, **data)
+        portal._mark_as_saved()
+        return portal
 
     async def insert(self) -> None:
         """It inserts a new row into the room table"""
         q = f"INSERT INTO portal ({self._columns}) VALUES ($1, $2, $3, $4, $5, $6, $7)"
-        await self.db.execute(q, *self._values)
+        values = self._values
+        await self.db.execute(q, *values)
+        self._mark_as_saved(values)
+
+    async def update(self, outbox: List[EventOutbox] | None = None) -> None:
+        """It updates the changed columns of the portal in the database
+
+        Parameters
+        ----------
+        outbox : List[EventOutbox]
+            Events of the changes, they are inserted in the outbox with the same query.
+
+        """
+        values = self._values
+        changes = self._dirty_columns(values, exclude=("room_id",))
+        q, args = None, []
+        if changes:
+            q = f"UPDATE portal SET {self._set_clause(changes, start=2)} WHERE room_id=$1"
+            args = [self.room_id, *changes.values()]
+
+        if outbox:
+            start = len(args) + 1
+            insert = (
+                f"INSERT INTO event_outbox ({EventOutbox._columns}) "
+                f"SELECT * FROM unnest(${start}::TEXT[], ${start + 1}::TEXT[], "
+                f"${start + 2}::TEXT[], ${start + 3}::TIMESTAMP WITH TIME ZONE[], "
+                f"${start + 4}::TIMESTAMP WITH TIME ZONE[])"
+            )
+            q = f"WITH updated_portal AS ({q}) {insert}" if q else insert
+            args.extend(EventOutbox.unnest_values(outbox))
+
+        if not q:
+            return
+
+        await self.db.execute(q, *args)
+        self._mark_as_saved(values)
+
+    @classmethod
+    async def update_many(cls, portals: List[Portal]) -> None:
+        """It updates several portals with a single query
 
-    async def update(self) -> None:
-        """It updates the portal's selected_option, state, and fk_puppet in the database"""
+        Parameters
+        ----------
+        portals : List[Portal]
+            The portals to update.
+
+        """
         q = (
-            "UPDATE portal SET selected_option=$2, state=$3, prev_state=$4, "
-            "state_date=$5, destination_on_transit=$6, fk_puppet=$7 WHERE room_id=$1"
+            "UPDATE portal SET selected_option=u.selected_option, state=u.state, "
+            "prev_state=u.prev_state, state_date=u.state_date, "
+            "destination_on_transit=u.destination_on_transit, fk_puppet=u.fk_puppet "
+            "FROM unnest($1::TEXT[], $2::TEXT[], $3::TEXT[], $4::TEXT[], "
+            "$5::TIMESTAMP WITH TIME ZONE[], $6::TEXT[], $7::INT[]) AS u(room_id, "
+            "selected_option, state, prev_state, state_date, destination_on_transit, fk_puppet) "
+            "WHERE portal.room_id=u.room_id"
         )
-        await self.db.execute(q, *self._values)
+        values = [portal._values for portal in portals]
+        await cls.db.execute(q, *(list(column) for column in zip(*values)))
+        for portal, portal_values in zip(portals, values):
+            portal._mark_as_saved(portal_values)
 
     @classmethod
     async def get_by_room_id(cls, room_id: RoomID) -> Portal | None:
@@ -8,11 +8,14 @@ from mautrix.types import ContentURI, RoomID, SyncToken, UserID
 from mautrix.util.async_db import Database
 from yarl import URL
 
+from .dirty_fields import DirtyFields
+from .versions import Versions
+
 fake_db = Database.create("") if TYPE_CHECKING else None
 
 
 @dataclass
-class Puppet:
+class Puppet(DirtyFields):
     """Puppet representation in the db"""
 
     db: ClassVar[Database] = fake_db
@@ -62,23 +65,33 @@ class Puppet:
             f"INSERT INTO puppet ({self._columns}) "
             "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)"
         )
-        await self.db.execute(q, *self._values)
+        values = self._values
+        await self.db.execute(q, *values)
+        self._mark_as_saved(values)
+        Versions.bump(Versions.PUPPET, key=self.custom_mxid)
 
     async def update(self) -> None:
-        q = (
-            "UPDATE puppet SET email=$1, phone=$2, bridge=$3, destination=$4, photo_mxc=$5, name_set=$6,"
-            "                  avatar_set=$7, is_registered=$8, custom_mxid=$9, access_token=$10,"
-            "                  next_batch=$11, base_url=$12, control_room_id=$13 "
-            "WHERE custom_mxid=$9"
-        )
-        await self.db.execute(q, *self._values)
+        """It updates the changed columns of the puppet"""
+        values = self._values
+        changes = self._dirty_columns(values, exclude=("custom_mxid",))
+        if not changes:
+            return
+
+        q = f"UPDATE puppet SET {self._set_clause(changes, start=2)} WHERE custom_mxid=$1"
+        await self.db.execute(q, self.custom_mxid, *changes.values())
+        self._mark_as_saved(values)
+        # The sync token changes all the time and it is not part of the puppet info
+        if changes.keys() - {"next_batch"}:
+            Versions.bump(Versions.PUPPET, key=self.custom_mxid)
 
     @classmethod
     def _from_row(cls, row: asyncpg.Record) -> Puppet:
         data = {**row}
         base_url_str = data.pop("base_url")
         base_url = URL(base_url_str) if base_url_str is not None else None
-        return cls(base_url=base_url, **data)
+        puppet = cls(base_url=base_url, **data)
+        puppet._mark_as_saved()
+        return puppet
 
     @classmethod
     @property
@@ -101,6 +114,12 @@ class Puppet:
             return None
         return cls._from_row(row)
 
+    @classmethod
+    async def get_by_custom_mxids(cls, mxids: List[UserID]) -> list[Puppet]:
+        q = f"{cls.query} custom_mxid = ANY($1::TEXT[])"
+        rows = await cls.db.fetch(q, mxids)
+        return [cls._from_row(row) for row in rows]
+
     @classmethod
     async def get_info_by_custom_mxid(cls, mxid: UserID) -> Dict | None:
         columns_to_remove = ["access_token", "next_batch", "base_url"]
@@ -183,6 +202,32 @@ class Puppet:
         control_room_ids = [control_room_id.get("control_room_id") for control_room_id in rows]
         return control_room_ids
 
+    @classmethod
+    async def get_control_room_ids_page(
+        cls, after: RoomID | None = None, limit: int | None = None
+    ) -> list[RoomID]:
+        """Get the control rooms ordered by room_id, optionally a page of them
+
+        Parameters
+        ----------
+        after : RoomID | None
+            Only the control rooms greater than this one, to get the next page.
+        limit : int | None
+            Max number of control rooms, all of them if it is None.
+
+        Returns
+        -------
+            A list of room ids.
+
+        """
+        q = (
+            "SELECT control_room_id FROM puppet WHERE control_room_id IS NOT NULL "
+            "AND ($1::TEXT IS NULL OR control_room_id > $1) "
+            "ORDER BY control_room_id LIMIT $2"
+        )
+        rows = await cls.db.fetch(q, after, limit)
+        return [row["control_room_id"] for row in rows]
+
     @classmethod
     async def all_with_custom_mxid(cls) -> list[Puppet]:
         q = f"{cls.query} custom_mxid IS NOT NULL"
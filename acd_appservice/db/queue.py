@@ -7,6 +7,8 @@ from attr import dataclass
 from mautrix.types import RoomID
 from mautrix.util.async_db import Database
 
+from .versions import Versions
+
 fake_db = Database.create("") if TYPE_CHECKING else None
 
 
@@ -35,14 +37,17 @@ class Queue:
     async def insert(self) -> None:
         q = f"INSERT INTO queue ({self._columns}) VALUES ($1, $2, $3)"
         await self.db.execute(q, *self._values)
+        Versions.bump(Versions.QUEUE)
 
     async def update(self) -> None:
         q = "UPDATE queue SET name=$2, description=$3 WHERE room_id=$1"
         await self.db.execute(q, *self._values)
+        Versions.bump(Versions.QUEUE)
 
     async def delete(self) -> None:
         q = "DELETE FROM queue WHERE room_id=$1"
         await self.db.execute(q, self.room_id)
+        Versions.bump(Versions.QUEUE)
 
     @classmethod
     async def get_by_room_id(cls, room_id: RoomID) -> Queue | None:
@@ -61,9 +66,38 @@ class Queue:
         return cls._from_row(row)
 
     @classmethod
-    async def get_all(cls) -> List[Queue] | None:
-        q = f"SELECT id, {cls._columns} FROM queue"
-        rows = await cls.db.fetch(q)
+    async def get_all(
+        cls,
+        after: RoomID | None = None,
+        limit: int | None = None,
+        membership_state: str | None = None,
+    ) -> List[Queue] | None:
+        """Get the queues ordered by room_id, optionally a page of them
+
+        Parameters
+        ----------
+        after : RoomID | None
+            Only the queues whose room_id is greater than this one, to get the next page.
+        limit : int | None
+            Max number of queues, all the queues if it is None.
+        membership_state : str | None
+            Only the queues with at least one membership in this state.
+
+        Returns
+        -------
+            A list of queues.
+
+        """
+        q = (
+            f"SELECT id, {cls._columns} FROM queue "
+            "WHERE ($1::TEXT IS NULL OR room_id > $1) "
+            "AND ($3::TEXT IS NULL OR EXISTS ("
+            "    SELECT 1 FROM queue_membership "
+            "    WHERE queue_membership.fk_queue = queue.id AND queue_membership.state = $3"
+            ")) "
+            "ORDER BY room_id LIMIT $2"
+        )
+        rows = await cls.db.fetch(q, after, limit, membership_state)
         if not rows:
             return None
 
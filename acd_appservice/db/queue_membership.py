@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, ClassVar, List
+from typing import TYPE_CHECKING, AsyncIterator, ClassVar, List
 
 from attr import dataclass
 from mautrix.util.async_db import Database
@@ -12,6 +12,9 @@ from enum import Enum
 
 import asyncpg
 
+from .dirty_fields import DirtyFields
+from .versions import Versions
+
 
 class QueueMembershipState(Enum):
     ONLINE = "online"
@@ -27,7 +30,7 @@ class QueueMembershipState(Enum):
 
 
 @dataclass
-class QueueMembership:
+class QueueMembership(DirtyFields):
     db: ClassVar[Database] = fake_db
 
     id: int
@@ -65,22 +68,36 @@ class QueueMembership:
     def _from_row(cls, row: asyncpg.Record) -> QueueMembership:
         data = {**row}
         state = QueueMembershipState(data.pop("state"))
-        return cls(state=state, **data)
+        membership = cls(state=state, **data)
+        membership._mark_as_saved()
+        return membership
 
     async def insert(self) -> None:
         q = f"""INSERT INTO queue_membership ({self._columns})
         VALUES ($1, $2, $3, $4, $5, $6, $7, $8)"""
-        await self.db.execute(q, *self._values)
+        values = self._values
+        await self.db.execute(q, *values)
+        self._mark_as_saved(values)
+        Versions.bump(Versions.QUEUE_MEMBERSHIP)
 
     async def update(self) -> None:
-        q = """UPDATE queue_membership
-        SET creation_date=$3, state_date=$4, pause_date=$5, pause_reason=$6,
-        state=$7, paused=$8 WHERE fk_user=$1 AND fk_queue=$2"""
-        await self.db.execute(q, *self._values)
+        values = self._values
+        changes = self._dirty_columns(values, exclude=("fk_user", "fk_queue"))
+        if not changes:
+            return
+
+        q = (
+            f"UPDATE queue_membership SET {self._set_clause(changes, start=3)} "
+            "WHERE fk_user=$1 AND fk_queue=$2"
+        )
+        await self.db.execute(q, self.fk_user, self.fk_queue, *changes.values())
+        self._mark_as_saved(values)
+        Versions.bump(Versions.QUEUE_MEMBERSHIP)
 
     async def delete(self) -> None:
         q = 'DELETE FROM "queue_membership" WHERE fk_user=$1 AND fk_queue=$2'
         await self.db.execute(q, self.fk_user, self.fk_queue)
+        Versions.bump(Versions.QUEUE_MEMBERSHIP)
 
     @classmethod
     async def get_by_queue_and_user(cls, fk_user: int, fk_queue: int) -> QueueMembership | None:
@@ -180,6 +197,66 @@ class QueueMembership:
 
         return results if results else None
 
+    @classmethod
+    async def iter_all_user_memberships(
+        cls,
+        after: str | None = None,
+        limit: int | None = None,
+        state: str | None = None,
+        prefetch: int = 500,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Iterate the memberships of all the users that have memberships, ordered by user mxid,
+        the rows are read with a server-side cursor, `prefetch` rows at a time
+
+        Parameters
+        ----------
+        after : str | None
+            Only the users whose mxid is greater than this one, to get the next page.
+        limit : int | None
+            Max number of users, all the users if it is None.
+        state : str | None
+            Only the memberships in this state.
+        prefetch : int
+            Number of rows read from the cursor in each round trip.
+
+        Returns
+        -------
+            The memberships with the mxid of the user.
+
+        """
+
+        q = """
+            WITH members AS (
+                SELECT DISTINCT "user".id, "user".mxid
+                FROM "user"
+                JOIN queue_membership ON queue_membership.fk_user = "user".id
+                WHERE ($1::TEXT IS NULL OR "user".mxid > $1)
+                AND ($3::TEXT IS NULL OR queue_membership.state = $3)
+                ORDER BY "user".mxid ASC
+                LIMIT $2
+            )
+            SELECT
+                members.mxid,
+                queue.room_id,
+                queue.name,
+                queue.description,
+                queue_membership.state_date,
+                queue_membership.pause_date,
+                queue_membership.pause_reason,
+                queue_membership.state,
+                queue_membership.paused
+            FROM members
+            JOIN queue_membership ON queue_membership.fk_user = members.id
+            JOIN queue ON queue.id = queue_membership.fk_queue
+            WHERE $3::TEXT IS NULL OR queue_membership.state = $3
+            ORDER BY members.mxid ASC
+        """
+
+        # The cursors only exist inside a transaction
+        async with cls.db.acquire() as conn, conn.transaction():
+            async for row in conn.wrapped.cursor(q, after, limit, state, prefetch=prefetch):
+                yield row
+
     @classmethod
     async def get_members(cls) -> List[dict] | None:
         """Get all users that have memberships
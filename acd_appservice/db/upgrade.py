@@ -117,3 +117,133 @@ async def upgrade_v5(conn: Connection) -> None:
 async def upgrade_v6(conn: Connection) -> None:
     await conn.execute("ALTER TABLE portal ADD COLUMN prev_state TEXT")
     await conn.execute("ALTER TABLE portal ADD COLUMN destination_on_transit TEXT")
+
+
+@upgrade_table.register(description="Table event_outbox")
+async def upgrade_v7(conn: Connection) -> None:
+    await conn.execute(
+        """CREATE TABLE event_outbox (
+        id                  BIGSERIAL PRIMARY KEY,
+        subject             TEXT NOT NULL,
+        payload             TEXT NOT NULL,
+        creation_date       TIMESTAMP WITH TIME ZONE NOT NULL,
+        delivered_date      TIMESTAMP WITH TIME ZONE
+        )"""
+    )
+    await conn.execute(
+        "CREATE INDEX idx_event_outbox_pending ON event_outbox(id) WHERE delivered_date IS NULL"
+    )
+    await conn.execute(
+        "CREATE INDEX idx_event_outbox_delivered_date ON event_outbox(delivered_date)"
+    )
+
+
+@upgrade_table.register(description="Add column event_id to event_outbox table")
+async def upgrade_v8(conn: Connection) -> None:
+    await conn.execute("ALTER TABLE event_outbox ADD COLUMN event_id TEXT")
+
+
+@upgrade_table.register(description="Indexes for the enqueued portals, read receipts and queues")
+async def upgrade_v9(conn: Connection) -> None:
+    # Enqueued portals scan: WHERE state AND fk_puppet ORDER BY selected_option, state_date
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_portal_puppet_state "
+        "ON portal(fk_puppet, state, selected_option, state_date)"
+    )
+    # Read receipts only update the unread messages of a receiver in a room
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_message_unread "
+        "ON message(room_id, receiver) WHERE was_read = false"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_queue_membership_user_state "
+        "ON queue_membership(fk_user, state)"
+    )
+    # Queue.get_by_slugified_name
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_queue_slugified_name "
+        "ON queue((REPLACE(LOWER(name), ' ', '_')))"
+    )
+
+
+@upgrade_table.register(description="Add message_archive table and message retention index")
+async def upgrade_v10(conn: Connection) -> None:
+    await conn.execute(
+        """CREATE TABLE message_archive (
+        event_id            TEXT PRIMARY KEY,
+        room_id             TEXT NOT NULL,
+        sender              TEXT NOT NULL,
+        receiver            TEXT NOT NULL,
+        timestamp_send      BIGINT,
+        timestamp_read      BIGINT,
+        was_read            BOOLEAN NOT NULL DEFAULT false,
+        archived_date       TIMESTAMP WITH TIME ZONE NOT NULL
+        )"""
+    )
+    # The retention job moves the oldest messages in batches
+    await conn.execute("CREATE INDEX idx_message_timestamp_send ON message(timestamp_send)")
+    await conn.execute(
+        "CREATE INDEX idx_message_archive_timestamp_send ON message_archive(timestamp_send)"
+    )
+
+
+@upgrade_table.register(description="Indexes for the paginated lists")
+async def upgrade_v11(conn: Connection) -> None:
+    # Users by role, ordered by mxid
+    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_role_mxid ON "user"(role, mxid)')
+    await conn.execute("DROP INDEX IF EXISTS idx_role_user")
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_puppet_control_room_id "
+        "ON puppet(control_room_id) WHERE control_room_id IS NOT NULL"
+    )
+    # Membership state filters of the queues and the users
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_queue_membership_queue_state "
+        "ON queue_membership(fk_queue, state)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_queue_membership_state_user "
+        "ON queue_membership(state, fk_user)"
+    )
+
+
+@upgrade_table.register(description="Add bridge_status table")
+async def upgrade_v12(conn: Connection) -> None:
+    await conn.execute(
+        """CREATE TABLE bridge_status (
+        puppet_mxid         TEXT PRIMARY KEY,
+        bridge              TEXT,
+        is_connected        BOOLEAN NOT NULL DEFAULT false,
+        response            TEXT NOT NULL,
+        checked_date        TIMESTAMP WITH TIME ZONE NOT NULL,
+        changed_date        TIMESTAMP WITH TIME ZONE NOT NULL
+        )"""
+    )
+
+
+@upgrade_table.register(description="Add job table")
+async def upgrade_v13(conn: Connection) -> None:
+    await conn.execute(
+        """CREATE TABLE job (
+        id                  TEXT PRIMARY KEY,
+        kind                TEXT NOT NULL,
+        status              TEXT NOT NULL,
+        total               INTEGER NOT NULL DEFAULT 0,
+        done                INTEGER NOT NULL DEFAULT 0,
+        failed              INTEGER NOT NULL DEFAULT 0,
+        result              TEXT,
+        error               TEXT,
+        created_by          TEXT,
+        creation_date       TIMESTAMP WITH TIME ZONE NOT NULL,
+        update_date         TIMESTAMP WITH TIME ZONE NOT NULL
+        )"""
+    )
+    await conn.execute("CREATE INDEX idx_job_status ON job (status)")
+
+
+@upgrade_table.register(description="Add the lease of the flushers to event_outbox")
+async def upgrade_v14(conn: Connection) -> None:
+    await conn.execute("ALTER TABLE event_outbox ADD COLUMN claimed_by TEXT")
+    await conn.execute(
+        "ALTER TABLE event_outbox ADD COLUMN claimed_until TIMESTAMP WITH TIME ZONE"
+    )
@@ -7,6 +7,8 @@ from attr import dataclass
 from mautrix.types import RoomID, SerializableEnum, UserID
 from mautrix.util.async_db import Database
 
+from .versions import Versions
+
 fake_db = Database.create("") if TYPE_CHECKING else None
 
 
@@ -47,14 +49,17 @@ class User:
     async def insert(self) -> None:
         q = 'INSERT INTO "user" (mxid, management_room, role) VALUES ($1, $2, $3)'
         await self.db.execute(q, *self._values)
+        Versions.bump(Versions.USER, key=self.mxid)
 
     async def update(self) -> None:
         q = 'UPDATE "user" SET management_room=$2, role=$3 WHERE mxid=$1'
         await self.db.execute(q, *self._values)
+        Versions.bump(Versions.USER, key=self.mxid)
 
     async def delete(self) -> None:
         q = 'DELETE FROM "user" WHERE mxid=$1'
         await self.db.execute(q, self.mxid)
+        Versions.bump(Versions.USER, key=self.mxid)
 
     @classmethod
     async def get_by_mxid(cls, user_id: UserID) -> User | None:
@@ -73,9 +78,47 @@ class User:
         return cls._from_row(row)
 
     @classmethod
-    async def get_users_by_role(cls, role: str) -> List[Dict]:
-        q = f'SELECT id, {cls._columns} FROM "user" WHERE role=$1 ORDER BY mxid'
-        rows = await cls.db.fetch(q, role)
+    async def get_by_ids(cls, ids: List[int]) -> List[User]:
+        q = f'SELECT id, {cls._columns} FROM "user" WHERE id = ANY($1::INT[])'
+        rows = await cls.db.fetch(q, ids)
+        return [cls._from_row(row) for row in rows]
+
+    @classmethod
+    async def get_users_by_role(
+        cls,
+        role: str,
+        after: UserID | None = None,
+        limit: int | None = None,
+        membership_state: str | None = None,
+    ) -> List[Dict]:
+        """Get the users of a role ordered by mxid, optionally a page of them
+
+        Parameters
+        ----------
+        role : str
+            The role of the users.
+        after : UserID | None
+            Only the users whose mxid is greater than this one, to get the next page.
+        limit : int | None
+            Max number of users, all the users if it is None.
+        membership_state : str | None
+            Only the users with at least one membership in this state.
+
+        Returns
+        -------
+            A list of dicts with the users.
+
+        """
+        q = (
+            f'SELECT id, {cls._columns} FROM "user" '
+            "WHERE role=$1 AND ($2::TEXT IS NULL OR mxid > $2) "
+            "AND ($4::TEXT IS NULL OR EXISTS ("
+            "    SELECT 1 FROM queue_membership "
+            '    WHERE queue_membership.fk_user = "user".id AND queue_membership.state = $4'
+            ")) "
+            "ORDER BY mxid LIMIT $3"
+        )
+        rows = await cls.db.fetch(q, role, after, limit, membership_state)
         if not rows:
             return None
 
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+
+class Versions:
+    """In-process version counters of the tables, they are bumped on every write,
+    so the readers can know if something changed without querying the database.
+
+    A write bumps the counter of the table and, if a key is given, the counter
+    of that row (e.g. a puppet by custom_mxid).
+    """
+
+    QUEUE = "queue"
+    QUEUE_MEMBERSHIP = "queue_membership"
+    PUPPET = "puppet"
+    USER = "user"
+    # It is not a table, it is bumped when a displayname fetched from the homeserver changes
+    DISPLAYNAMES = "displaynames"
+
+    counters: Dict[str | Tuple[str, Any], int] = {}
+
+    @classmethod
+    def bump(cls, table: str, key: Any = None) -> None:
+        cls.counters[table] = cls.counters.get(table, 0) + 1
+        if key is not None:
+            cls.counters[(table, key)] = cls.counters.get((table, key), 0) + 1
+
+    @classmethod
+    def get(cls, table: str, key: Any = None) -> int:
+        return cls.counters.get(table if key is None else (table, key), 0)
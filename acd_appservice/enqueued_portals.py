@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import itertools
 import logging
 from asyncio import create_task, sleep
@@ -8,9 +10,10 @@ from mautrix.util.logging import TraceLogger
 
 from .agent_manager import AgentManager
 from .config import Config
-from .events import ACDConversationEvents, send_conversation_event
+from .events import ACDConversationEvents
 from .portal import Portal, PortalState
-from .queue import Queue
+from .portal_writer import PortalWriter
+from .queue import Queue, QueueAvailability
 from .util.business_hours import BusinessHour
 
 
@@ -78,7 +81,10 @@ class EnqueuedPortals:
                             f"Enqueued rooms in [{queue.name} - {queue.room_id}]: {len(group)}"
                         )
 
-                        available_agents_count = await queue.get_available_agents_count()
+                        # The availability of the queue is computed once per pass and it is
+                        # shared by the distribution and the events of the portals
+                        availability = await queue.get_availability()
+                        available_agents_count = availability.available_agents_count
 
                         # Flag to know if iteration count will be increased
                         if available_agents_count > 0:
@@ -95,7 +101,7 @@ class EnqueuedPortals:
                         ]
 
                         await self.distribute_enqueued_portals(
-                            enqueued_portals_to_distribute, queue
+                            enqueued_portals_to_distribute, queue, availability
                         )
 
                     # Increase enqueued_iteration_count if there are available agents
@@ -109,17 +115,27 @@ class EnqueuedPortals:
         except Exception as error:
             self.log.exception(error)
 
-    async def distribute_enqueued_portals(self, enqueued_portals: List[Portal], queue: Queue):
+    async def distribute_enqueued_portals(
+        self,
+        enqueued_portals: List[Portal],
+        queue: Queue,
+        availability: QueueAvailability | None = None,
+    ):
         """This function distributes enqueued portals to agents if they are available.
 
         Parameters
         ----------
         enqueued_portals : List[Portal]
         queue : Queue
+        availability : QueueAvailability | None
+            Snapshot of the agents of the queue taken in the current pass.
         """
         if not enqueued_portals:
             return
 
+        if not availability:
+            availability = await queue.get_availability()
+
         for portal in enqueued_portals:
             portal.main_intent = self.intent
             portal.bridge = self.agent_manager.bridge
@@ -133,10 +149,13 @@ class EnqueuedPortals:
                 )
                 continue
 
-            await portal.update_state(PortalState.ON_DISTRIBUTION)
-            await send_conversation_event(
-                portal=portal, event_type=ACDConversationEvents.AvailableAgents, queue=queue
-            )
+            if not await portal.update_state(
+                PortalState.ON_DISTRIBUTION,
+                event_type=ACDConversationEvents.AvailableAgents,
+                queue=queue,
+                availability=availability,
+            ):
+                continue
 
             portal.lock()
             create_task(
@@ -144,6 +163,7 @@ class EnqueuedPortals:
                     portal=portal,
                     queue=queue,
                     agent_id=self.agent_manager.CURRENT_AGENT.get(queue.room_id),
+                    total_agents=availability.agents_count,
                 )
             )
 
@@ -157,6 +177,8 @@ class EnqueuedPortals:
 
         """
         self.log.debug(f"Searching for [{PortalState.ENQUEUED.value}] rooms...")
+        # The portals that left the queue may be waiting for the write-behind flush
+        await PortalWriter.flush()
         # Get enqueued portals sorted by queue and state_date
         enqueued_portals: List[Portal] = await Portal.get_rooms_by_state_and_puppet(
             state=PortalState.ENQUEUED, fk_puppet=self.puppet_pk
@@ -204,6 +226,6 @@ class EnqueuedPortals:
         enqueued_portals : List[Portal]
         """
         for portal in enqueued_portals:
-            await portal.update_state(portal.prev_state)
-            portal.selected_option = None
-            await portal.save()
+            async with portal.transition():
+                await portal.update_state(portal.prev_state)
+                portal.selected_option = None
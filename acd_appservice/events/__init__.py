@@ -20,6 +20,7 @@ from .event_generator import (
     send_membership_event,
     send_room_event,
 )
+from .event_stream import EventStream
 from .event_types import (
     ACDConversationEvents,
     ACDEventTypes,
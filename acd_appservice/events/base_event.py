@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 import logging
+from datetime import datetime, timezone
 
 from attr import dataclass, ib
 from mautrix.types import SerializableAttrs, UserID
 from mautrix.util.logging import TraceLogger
 from nats.js.client import JetStreamContext
 
+from ..db.event_outbox import EventOutbox
 from ..db.portal import PortalState
+from .event_stream import EventStream
 from .event_types import (
     ACDConversationEvents,
     ACDEventTypes,
@@ -18,6 +22,7 @@ from .event_types import (
     ACDRoomEvents,
 )
 from .nats_publisher import NatsPublisher
+from .outbox_flusher import OutboxFlusher
 
 log: TraceLogger = logging.getLogger("report.event")
 
@@ -30,27 +35,113 @@ class BaseEvent(SerializableAttrs):
     )
     timestamp: float = ib(factory=float)
     sender: UserID = ib(factory=UserID)
+    event_id: str = ib(default=None)
 
-    def send(self):
-        asyncio.create_task(self.send_to_nats())
+    def __attrs_post_init__(self):
+        if not self.event_id:
+            self.event_id = self.generate_event_id()
 
-    async def send_to_nats(self):
-        jetstream: JetStreamContext = None
+    def generate_event_id(self) -> str:
+        """It generates a deterministic id for the event using the room,
+        the event type, the state transition and the timestamp,
+        the same event always has the same id, so NATS can discard the duplicates
+
+        Returns
+        -------
+            A hexadecimal string.
+
+        """
+        room = getattr(self, "room_id", None) or getattr(self, "queue", None)
+        member = getattr(self, "member", None)
+        if isinstance(member, dict):
+            member = member.get("mxid")
+        prev_state = getattr(self, "prev_state", None)
+        state = getattr(self, "state", None)
+
+        key = "|".join(
+            str(value)
+            for value in (
+                room,
+                self.event_type,
+                self.event,
+                f"{prev_state}->{state}",
+                member,
+                self.sender,
+                self.timestamp,
+            )
+        )
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    @property
+    def partition_key(self) -> str | None:
+        return NatsPublisher.get_partition_key(vars(self))
+
+    @property
+    def subject(self) -> str:
+        return NatsPublisher.get_subject(self.event_type, self.partition_key)
+
+    async def send(self):
+        if OutboxFlusher.is_enabled():
+            await self.send_to_outbox()
+        else:
+            asyncio.create_task(self.send_to_nats())
+
+        self.send_to_stream()
 
+    def send_to_stream(self):
+        """It sends the event to the clients of the events stream, it is called
+        once the change of the event is saved, whichever way the event goes to NATS"""
+        if EventStream.SUBSCRIBERS:
+            EventStream.publish(self.serialize())
+
+    def save_to_file(self):
         file = open("/data/room_events.txt", "a")
         file.write(f"{json.dumps(self.serialize())}\n\n")
         if self.event_type == ACDEventTypes.CONVERSATION and self.state == PortalState.RESOLVED:
             file.write(f"################# ------- New conversation ------- #################\n")
         file.close()
+
+    def to_outbox(self) -> EventOutbox:
+        return EventOutbox(
+            event_id=self.event_id,
+            subject=self.subject,
+            payload=json.dumps(self.serialize()),
+            creation_date=datetime.now(timezone.utc),
+        )
+
+    async def send_to_outbox(self):
+        """It stores the event in the outbox, the outbox flusher publishes it to NATS
+
+        Only the conversation events of a portal transition are stored with the same
+        query of the change (`Portal.save`). The events sent with this method (member,
+        membership and room events, and the conversation events sent outside a transition)
+        are stored in their own statement after the change is saved, so they are not
+        transactional: a failure between both can lose the event.
+        """
+        self.save_to_file()
+        log.debug(f"Storing event in the outbox {self.serialize()}")
+
+        try:
+            await self.to_outbox().insert()
+        except Exception as e:
+            log.error(f"Error storing event in the outbox: {e}")
+            # Do not lose the event, publish it directly
+            asyncio.create_task(self.publish())
+
+    async def send_to_nats(self):
+        self.save_to_file()
         log.error(f"Sending event {self.serialize()}")
+        await self.publish()
 
+    async def publish(self):
+        jetstream: JetStreamContext = None
         _, jetstream = await NatsPublisher.get_connection()
         if jetstream:
             try:
-                subject = NatsPublisher.config["nats.subject"]
                 await jetstream.publish(
-                    subject=f"{subject}.{self.event_type}",
-                    payload=json.dumps(self.serialize()).encode(),
+                    subject=self.subject,
+                    payload=NatsPublisher.encode_payload(self.serialize()),
+                    headers=NatsPublisher.get_headers(self.event_id),
                 )
             except Exception as e:
                 log.error(f"Error publishing event to NATS: {e}")
@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING
 
 from ..matrix_room import RoomType
-from ..queue import Queue
+from ..queue import Queue, QueueAvailability
 from ..user import User
 from .conversation_events import (
     AssignEvent,
@@ -198,6 +198,11 @@ async def send_conversation_event(*, portal: Portal, event_type: ACDConversation
         )
     elif event_type == ACDConversationEvents.AvailableAgents:
         queue: Queue = kwargs.get("queue")
+        # Use the snapshot of the scheduling pass when it is given,
+        # otherwise the agents are requested to the queue
+        availability: QueueAvailability = kwargs.get("availability")
+        if not availability:
+            availability = await queue.get_availability()
         event = AvailableAgentsEvent(
             event_type=ACDEventTypes.CONVERSATION,
             event=ACDConversationEvents.AvailableAgents,
@@ -208,8 +213,8 @@ async def send_conversation_event(*, portal: Portal, event_type: ACDConversation
             acd=portal.main_intent.mxid,
             customer_mxid=portal.creator,
             queue_room_id=queue.room_id,
-            agents_count=await queue.get_agent_count(),
-            available_agents_count=await queue.get_available_agents_count(),
+            agents_count=availability.agents_count,
+            available_agents_count=availability.available_agents_count,
             timestamp=datetime.utcnow().timestamp(),
         )
     elif event_type == ACDConversationEvents.QueueEmpty:
@@ -227,7 +232,7 @@ async def send_conversation_event(*, portal: Portal, event_type: ACDConversation
             timestamp=datetime.utcnow().timestamp(),
         )
 
-    event.send()
+    await portal.send_event(event)
 
 
 async def send_member_event(event_type: ACDMemberEvents, **kwargs):
@@ -265,7 +270,7 @@ async def send_member_event(event_type: ACDMemberEvents, **kwargs):
             timestamp=datetime.utcnow().timestamp(),
         )
 
-    event.send()
+    await event.send()
 
 
 async def send_membership_event(event_type: ACDMembershipEvents, **kwargs):
@@ -289,7 +294,7 @@ async def send_membership_event(event_type: ACDMembershipEvents, **kwargs):
             timestamp=datetime.utcnow().timestamp(),
         )
 
-    event.send()
+    await event.send()
 
 
 async def send_room_event(event_type: ACDRoomEvents, room: Portal | Queue, **kwargs):
@@ -309,4 +314,4 @@ async def send_room_event(event_type: ACDRoomEvents, room: Portal | Queue, **kwa
             timestamp=datetime.utcnow().timestamp(),
         )
 
-    event.send()
+    await event.send()
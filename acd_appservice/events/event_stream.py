@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, List, Set
+
+from mautrix.util.logging import TraceLogger
+
+from ..config import Config
+
+log: TraceLogger = logging.getLogger("acd.event_stream")
+
+
+class EventSubscriber:
+    """A client of the event stream, it only receives the events that match its filters
+
+    The events wait in a bounded buffer until they are written to the client,
+    if the buffer is full the client is too slow and it is dropped.
+    """
+
+    def __init__(
+        self,
+        max_buffer: int,
+        event_types: List[str] | None = None,
+        events: List[str] | None = None,
+        room_ids: List[str] | None = None,
+        queues: List[str] | None = None,
+        members: List[str] | None = None,
+    ) -> None:
+        self.buffer: asyncio.Queue[Dict | None] = asyncio.Queue(maxsize=max_buffer)
+        self.event_types = set(event_types or [])
+        self.events = set(events or [])
+        self.room_ids = set(room_ids or [])
+        self.queues = set(queues or [])
+        self.members = set(members or [])
+        self.dropped = False
+
+    @staticmethod
+    def get_members(event: Dict) -> Set[str]:
+        """The agents and users that the event is about"""
+        member = event.get("member")
+        members = {event.get("agent_mxid"), event.get("user_mxid")}
+        members.add(member.get("mxid") if isinstance(member, dict) else member)
+        members.discard(None)
+        return members
+
+    def matches(self, event: Dict) -> bool:
+        if self.event_types and event.get("event_type") not in self.event_types:
+            return False
+        if self.events and event.get("event") not in self.events:
+            return False
+        if self.room_ids and event.get("room_id") not in self.room_ids:
+            return False
+        if self.queues and (event.get("queue") or event.get("queue_room_id")) not in self.queues:
+            return False
+        if self.members and not self.members & self.get_members(event):
+            return False
+        return True
+
+    def put(self, event: Dict) -> bool:
+        """It adds the event to the buffer
+
+        Returns
+        -------
+            False if the buffer is full.
+
+        """
+        try:
+            self.buffer.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def drop(self):
+        """The pending events are discarded and the reader gets None to close the stream"""
+        self.dropped = True
+        while not self.buffer.empty():
+            self.buffer.get_nowait()
+        self.buffer.put_nowait(None)
+
+    async def get(self) -> Dict | None:
+        return await self.buffer.get()
+
+
+class EventStream:
+    """It fans out the ACD events to the clients of the events stream endpoint,
+    so the dashboards get the changes without polling the API"""
+
+    config: Config = None
+
+    SUBSCRIBERS: Set[EventSubscriber] = set()
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.config and cls.config["acd.event_stream.enabled"])
+
+    @classmethod
+    def subscribe(cls, **filters) -> EventSubscriber | None:
+        """It adds a subscriber with the given filters
+
+        Returns
+        -------
+            The subscriber, None if there are `max_subscribers` already.
+
+        """
+        if len(cls.SUBSCRIBERS) >= cls.config["acd.event_stream.max_subscribers"]:
+            return None
+
+        subscriber = EventSubscriber(
+            max_buffer=cls.config["acd.event_stream.max_buffer"], **filters
+        )
+        cls.SUBSCRIBERS.add(subscriber)
+        log.debug(f"New events subscriber, {len(cls.SUBSCRIBERS)} subscribers")
+        return subscriber
+
+    @classmethod
+    def unsubscribe(cls, subscriber: EventSubscriber):
+        cls.SUBSCRIBERS.discard(subscriber)
+
+    @classmethod
+    def publish(cls, event: Dict):
+        """It sends the serialized event to the matching subscribers, without waiting for them"""
+        for subscriber in list(cls.SUBSCRIBERS):
+            if not subscriber.matches(event):
+                continue
+
+            if not subscriber.put(event):
+                log.warning("Dropping a slow events subscriber, its buffer is full")
+                subscriber.drop()
+                cls.unsubscribe(subscriber)
@@ -1,9 +1,14 @@
+import json
 import logging
+from typing import Dict, List, Optional
+from zlib import crc32
 
+import msgpack
 from mautrix.util.logging import TraceLogger
 from nats import connect as nats_connect
 from nats.aio.client import Client as NATSClient
 from nats.js.client import JetStreamContext
+from nats.js.errors import BadRequestError
 
 from ..config import Config
 
@@ -11,13 +16,28 @@ log: TraceLogger = logging.getLogger("acd.nats")
 
 
 class NatsPublisher:
+    JSON = "json"
+    MSGPACK = "msgpack"
+
     _nats_conn: NATSClient = None
     _jetstream_conn: JetStreamContext = None
     config: Config = None
 
+    # The settings used to publish each event are read once from the config
+    subject: str = None
+    partitions_enabled: bool = False
+    partitions_by: str = None
+    partitions_count: int = None
+    payload_encoding: str = JSON
+
     @classmethod
     def init_cls(cls, config: Config):
         cls.config = config
+        cls.subject = config["nats.subject"]
+        cls.partitions_enabled = config["nats.partitions.enabled"]
+        cls.partitions_by = config["nats.partitions.by"]
+        cls.partitions_count = config["nats.partitions.count"]
+        cls.payload_encoding = config["nats.payload_encoding"]
 
     @classmethod
     async def get_connection(cls) -> JetStreamContext:
@@ -37,10 +57,116 @@ class NatsPublisher:
         log.info("Connecting to NATS JetStream")
         nc: NATSClient = await nats_connect(cls.config["nats.address"])
         js = nc.jetstream()
-        subject = f"{cls.config['nats.subject']}.*"
-        await js.add_stream(name="acd", subjects=[subject])
+        stream_config = {
+            "name": "acd",
+            "subjects": cls.get_stream_subjects(),
+            "duplicate_window": cls.config["nats.duplicate_window"],
+        }
+        try:
+            await js.add_stream(**stream_config)
+        except BadRequestError:
+            # The stream already exists with a different configuration
+            await js.update_stream(**stream_config)
         return nc, js
 
+    @classmethod
+    def get_stream_subjects(cls) -> List[str]:
+        if not cls.partitions_enabled:
+            return [f"{cls.subject}.*"]
+
+        # The not partitioned subjects are kept to receive the events published
+        # before the partitions were enabled
+        return [f"{cls.subject}.*", f"{cls.subject}.*.*"]
+
+    @classmethod
+    def get_partition_key(cls, data: Dict) -> Optional[str]:
+        """It returns the puppet or the queue of an event, it is used to publish
+        the events of the same puppet or queue in the same partition
+
+        Parameters
+        ----------
+        data : Dict
+            The fields of the event.
+
+        Returns
+        -------
+            The puppet or the queue of the event.
+
+        """
+        if cls.partitions_by == "queue":
+            return data.get("queue_room_id") or data.get("queue") or data.get("room_id")
+
+        return data.get("acd") or data.get("sender")
+
+    @classmethod
+    def get_subject(cls, event_type: str, partition_key: Optional[str] = None) -> str:
+        """It returns the subject where the event is published,
+        if the partitions are enabled it is `{subject}.{event_type}.{partition}`
+
+        Parameters
+        ----------
+        event_type : str
+            Type of the event, CONVERSATION, MEMBER, MEMBERSHIP or ROOM.
+        partition_key : Optional[str]
+            Puppet or queue used to calculate the partition of the event.
+
+        Returns
+        -------
+            The subject of the event.
+
+        """
+        subject = f"{cls.subject}.{event_type}"
+        if not cls.partitions_enabled:
+            return subject
+
+        # crc32 is used instead of hash() because it is the same in all the processes
+        partition = crc32((partition_key or "").encode()) % cls.partitions_count
+        return f"{subject}.{partition}"
+
+    @classmethod
+    def encode_payload(cls, data: Dict) -> bytes:
+        """It encodes the serialized event with the configured payload encoding
+
+        Parameters
+        ----------
+        data : Dict
+            The serialized event.
+
+        Returns
+        -------
+            The payload of the message.
+
+        """
+        if cls.payload_encoding == cls.MSGPACK:
+            return msgpack.packb(data)
+
+        return json.dumps(data).encode()
+
+    @classmethod
+    def get_headers(cls, event_id: Optional[str]) -> Optional[Dict]:
+        """It returns the headers of the message, `Nats-Msg-Id` is used by JetStream
+        to discard duplicated messages and `Content-Type` tells the consumers
+        how the payload is encoded
+
+        Parameters
+        ----------
+        event_id : Optional[str]
+            Deterministic id of the event.
+
+        Returns
+        -------
+            A dict with the headers or None if there are no headers.
+
+        """
+        headers = {}
+        if event_id:
+            headers["Nats-Msg-Id"] = event_id
+
+        if cls.payload_encoding == cls.MSGPACK:
+            headers["Content-Type"] = "application/msgpack"
+
+        return headers or None
+
     @classmethod
     async def close_connection(cls):
         if cls._nats_conn:
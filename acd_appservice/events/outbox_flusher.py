@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from uuid import uuid4
+
+from mautrix.util.logging import TraceLogger
+from nats.js.client import JetStreamContext
+
+from ..config import Config
+from ..db.event_outbox import EventOutbox
+from .nats_publisher import NatsPublisher
+
+log: TraceLogger = logging.getLogger("acd.outbox")
+
+
+class OutboxFlusher:
+    """It publishes the events stored in the outbox table to NATS in batches,
+    marks them as delivered and deletes the old delivered events
+
+    Several ACD instances can flush the same outbox, each flusher leases a batch
+    of events and the subjects leased by another flusher are skipped.
+    """
+
+    config: Config = None
+    # It identifies the leases of this flusher in the outbox
+    flusher_id: str = uuid4().hex
+    _flush_task: asyncio.Task = None
+    _cleanup_task: asyncio.Task = None
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(
+            cls.config and cls.config["nats.enabled"] and cls.config["nats.outbox.enabled"]
+        )
+
+    @classmethod
+    def start(cls):
+        if not cls.is_enabled():
+            return
+
+        log.info("Starting the events outbox flusher")
+        cls._flush_task = asyncio.create_task(cls.flush_loop())
+        cls._cleanup_task = asyncio.create_task(cls.cleanup_loop())
+
+    @classmethod
+    async def stop(cls):
+        for task in [cls._flush_task, cls._cleanup_task]:
+            if task:
+                task.cancel()
+
+        cls._flush_task = None
+        cls._cleanup_task = None
+
+        if cls.is_enabled():
+            # Publish the pending events before closing the NATS connection
+            try:
+                while await cls.flush() >= cls.config["nats.outbox.batch_size"]:
+                    pass
+            except Exception as e:
+                log.error(f"Error flushing the outbox on stop: {e}")
+
+    @classmethod
+    async def flush_loop(cls):
+        while True:
+            try:
+                published = await cls.flush()
+            except Exception as e:
+                log.exception(f"Error flushing the outbox: {e}")
+                published = 0
+
+            # If the batch was full there are more pending events, keep flushing
+            if published < cls.config["nats.outbox.batch_size"]:
+                await asyncio.sleep(cls.config["nats.outbox.flush_interval"])
+
+    @classmethod
+    async def flush(cls) -> int:
+        """It publishes a batch of pending events and marks the published ones as delivered
+
+        Returns
+        -------
+            The number of published events.
+
+        """
+        jetstream: JetStreamContext = None
+        _, jetstream = await NatsPublisher.get_connection()
+        if not jetstream:
+            return 0
+
+        # The events are published outside of the transaction that leases them
+        events: List[EventOutbox] = await EventOutbox.claim_pending(
+            claimed_by=cls.flusher_id,
+            limit=cls.config["nats.outbox.batch_size"],
+            lease=cls.config["nats.outbox.lease"],
+        )
+        if not events:
+            return 0
+
+        delivered_ids = await cls.publish(jetstream=jetstream, events=events)
+        if delivered_ids:
+            await EventOutbox.mark_as_delivered(
+                ids=delivered_ids, delivered_date=datetime.now(timezone.utc)
+            )
+            log.debug(f"{len(delivered_ids)} outbox events have been published to NATS")
+
+        if len(delivered_ids) < len(events):
+            delivered = set(delivered_ids)
+            await EventOutbox.release(
+                ids=[event.id for event in events if event.id not in delivered],
+                claimed_by=cls.flusher_id,
+            )
+
+        return len(delivered_ids)
+
+    @classmethod
+    async def publish(cls, jetstream: JetStreamContext, events: List[EventOutbox]) -> List[int]:
+        """It publishes the events of each subject one after the other in the order
+        of the outbox, the subjects are published concurrently
+
+        A subject stops at its first failure, its next events are not published
+        so the next flush starts again from the failed one. If a lease expires
+        before its events are published, another flusher can publish them again,
+        the `Nats-Msg-Id` header lets JetStream discard the duplicates.
+
+        Returns
+        -------
+            The ids of the published events.
+
+        """
+        by_subject: Dict[str, List[EventOutbox]] = {}
+        for event in events:
+            by_subject.setdefault(event.subject, []).append(event)
+
+        async def publish_subject(subject_events: List[EventOutbox]) -> List[int]:
+            delivered_ids: List[int] = []
+            for event in subject_events:
+                try:
+                    await jetstream.publish(
+                        subject=event.subject,
+                        payload=NatsPublisher.encode_payload(json.loads(event.payload)),
+                        headers=NatsPublisher.get_headers(event.event_id),
+                    )
+                except Exception as e:
+                    log.error(f"Error publishing the outbox event {event.id} to NATS: {e}")
+                    break
+                delivered_ids.append(event.id)
+            return delivered_ids
+
+        results = await asyncio.gather(
+            *[publish_subject(subject_events) for subject_events in by_subject.values()]
+        )
+        return sorted(event_id for delivered_ids in results for event_id in delivered_ids)
+
+    @classmethod
+    async def cleanup_loop(cls):
+        while True:
+            try:
+                retention = timedelta(days=cls.config["nats.outbox.retention_days"])
+                deleted = await EventOutbox.delete_delivered_before(
+                    datetime.now(timezone.utc) - retention
+                )
+                if deleted:
+                    log.info(f"{deleted} delivered events have been deleted from the outbox")
+            except Exception as e:
+                log.exception(f"Error cleaning up the outbox: {e}")
+
+            await asyncio.sleep(cls.config["nats.outbox.cleanup_interval"])
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from mautrix.util.logging import TraceLogger
+
+from .config import Config
+from .db.job import Job, JobStatus
+
+log: TraceLogger = logging.getLogger("acd.job_manager")
+
+# It does the work of the job and reports its progress, the returned data is saved as the result
+JobRunner = Callable[[Job], Awaitable[Optional[Dict]]]
+
+
+class JobManager:
+    """It runs the long operations of the API in background jobs, the HTTP request only
+    starts the job and the client follows its progress with the job id.
+
+    At most `concurrency` jobs run at the same time, the rest wait as pending.
+    The status of the jobs is saved in the job table, the progress counts are saved
+    at most every `save_interval` seconds while the job runs.
+    """
+
+    config: Config = None
+
+    # The pending and running jobs, their progress is more recent than the saved one
+    JOBS: Dict[str, Job] = {}
+    TASKS: Dict[str, asyncio.Task] = {}
+    LAST_SAVES: Dict[str, float] = {}
+
+    semaphore: asyncio.Semaphore = None
+    stopping: bool = False
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+        cls.semaphore = asyncio.Semaphore(config["acd.jobs.concurrency"])
+        cls.stopping = False
+
+    @classmethod
+    async def recover(cls):
+        """It marks as interrupted the jobs left unfinished by the last run of the ACD
+        and deletes the finished jobs older than `retention_days`"""
+        now = datetime.utcnow()
+        interrupted = await Job.interrupt_unfinished(update_date=now)
+        if interrupted:
+            log.warning(f"{interrupted} jobs were interrupted by the last stop of the ACD")
+
+        await Job.delete_finished_before(
+            date=now - timedelta(days=cls.config["acd.jobs.retention_days"])
+        )
+
+    @classmethod
+    async def stop(cls):
+        """It cancels the pending and running jobs, they are saved as interrupted"""
+        cls.stopping = True
+        tasks = list(cls.TASKS.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for job in list(cls.JOBS.values()):
+            await cls.save_not_started(job)
+
+    @classmethod
+    def is_full(cls) -> bool:
+        """True if there are `max_jobs` jobs pending or running already"""
+        return len(cls.JOBS) >= cls.config["acd.jobs.max_jobs"]
+
+    @classmethod
+    async def submit(
+        cls, kind: str, run: JobRunner, total: int = 0, created_by: str | None = None
+    ) -> Job:
+        """It saves a pending job and runs it in the background
+
+        Parameters
+        ----------
+        kind : str
+            The operation of the job, e.g. `bulk_resolve`.
+        run : JobRunner
+            The function that does the work, it gets the job to report the progress.
+        total : int
+            The number of items that the job processes.
+        created_by : str | None
+            The mxid of the user that started the job.
+
+        Returns
+        -------
+            The pending job.
+
+        """
+        now = datetime.utcnow()
+        job = Job(
+            id=uuid4().hex,
+            kind=kind,
+            status=JobStatus.PENDING,
+            creation_date=now,
+            update_date=now,
+            total=total,
+            created_by=created_by,
+        )
+        await job.insert()
+
+        cls.JOBS[job.id] = job
+        task = asyncio.create_task(cls.run(job, run))
+        cls.TASKS[job.id] = task
+        task.add_done_callback(lambda _: cls.TASKS.pop(job.id, None))
+        return job
+
+    @classmethod
+    async def run(cls, job: Job, run: JobRunner):
+        try:
+            async with cls.semaphore:
+                job.status = JobStatus.RUNNING
+                await cls.save(job)
+                log.info(f"Starting the job {job.id} ({job.kind}) of {job.total} items")
+                result = await run(job)
+
+            job.result = json.dumps(result, default=str) if result is not None else None
+            job.status = JobStatus.FINISHED
+        except asyncio.CancelledError:
+            job.status = JobStatus.INTERRUPTED if cls.stopping else JobStatus.CANCELLED
+            raise
+        except Exception as e:
+            log.exception(f"Error running the job {job.id} ({job.kind}): {e}")
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            cls.JOBS.pop(job.id, None)
+            await cls.save(job)
+            cls.LAST_SAVES.pop(job.id, None)
+            log.info(
+                f"The job {job.id} is {job.status.value}, "
+                f"{job.done} items done, {job.failed} failed of {job.total}"
+            )
+
+    @classmethod
+    async def save(cls, job: Job):
+        job.update_date = datetime.utcnow()
+        cls.LAST_SAVES[job.id] = time.monotonic()
+        try:
+            await job.update()
+        except Exception as e:
+            log.exception(f"Error saving the job {job.id}: {e}")
+
+    @classmethod
+    async def progress(cls, job: Job, done: int = 0, failed: int = 0):
+        """It adds the processed items to the job, it is saved if `save_interval` has passed"""
+        job.done += done
+        job.failed += failed
+
+        if (
+            time.monotonic() - cls.LAST_SAVES.get(job.id, 0)
+            >= cls.config["acd.jobs.save_interval"]
+        ):
+            await cls.save(job)
+
+    @classmethod
+    async def get_job(cls, job_id: str) -> Job | None:
+        return cls.JOBS.get(job_id) or await Job.get_by_id(job_id)
+
+    @classmethod
+    async def cancel(cls, job_id: str) -> Job | None:
+        """It cancels a pending or running job and waits until it is saved as cancelled
+
+        Returns
+        -------
+            The cancelled job, None if the job is not pending or running.
+
+        """
+        job = cls.JOBS.get(job_id)
+        task = cls.TASKS.get(job_id)
+        if not (job and task):
+            return None
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await cls.save_not_started(job)
+        return job
+
+    @classmethod
+    async def save_not_started(cls, job: Job):
+        """The tasks cancelled before their first step do not run the job, so it is saved here"""
+        if cls.JOBS.pop(job.id, None):
+            job.status = JobStatus.INTERRUPTED if cls.stopping else JobStatus.CANCELLED
+            await cls.save(job)
+            cls.LAST_SAVES.pop(job.id, None)
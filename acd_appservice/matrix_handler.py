@@ -4,6 +4,7 @@ import asyncio
 import logging
 import re
 from shlex import split
+from typing import Dict, List, Tuple
 
 from asyncpg.exceptions import UniqueViolationError
 from markdown import markdown
@@ -22,7 +23,6 @@ from mautrix.types import (
     ReceiptEvent,
     ReceiptType,
     RoomID,
-    SingleReceiptEventContent,
     StateEvent,
     StateUnsigned,
     StrippedStateEvent,
@@ -61,6 +61,7 @@ class MatrixHandler:
         self.acd_appservice = acd_appservice
         self.az = self.acd_appservice.az
         self.config = self.acd_appservice.config
+        self.username_regex = re.compile(self.config["utils.username_regex"])
         self.az.matrix_event_handler(self.init_handle_event)
 
     async def wait_for_connection(self) -> None:
@@ -189,6 +190,12 @@ class MatrixHandler:
         elif evt.type.is_ephemeral and isinstance(evt, (ReceiptEvent)):
             await self.handle_ephemeral_event(evt)
 
+        elif evt.type == Signaling.CHAT_STATUS_EVENT_TYPE:
+            # The chat status sent by the puppets is already in the cache,
+            # only the changes made by other users are saved
+            if evt.sender not in Puppet.by_custom_mxid:
+                Signaling.cache_chat_data(room_id=evt.room_id, content=evt.content)
+
     async def send_welcome_message(self, room_id: RoomID, inviter: User) -> None:
         """If the user who invited the bot to the room doesn't have a management room set,
         set it to the current room and send a notice to the room
@@ -254,25 +261,40 @@ class MatrixHandler:
         if not evt.content:
             return
 
-        for event_id in evt.content:
-            for user_id in evt.content.get(event_id).get(ReceiptType.READ) or evt.content.get(
-                event_id
-            ).get(ReceiptType.READ_PRIVATE):
-                username_regex = self.config["utils.username_regex"]
-                user_prefix = re.search(username_regex, user_id)
-                message = await Message.get_by_event_id(event_id=event_id)
-                if user_prefix and message:
-                    timestamp_read: SingleReceiptEventContent = (
-                        evt.content.get(event_id).get(ReceiptType.READ).get(user_id).ts
-                    )
-                    await message.mark_as_read(
-                        receiver=f"+{user_prefix.group('number')}",
-                        event_id=event_id,
-                        room_id=evt.room_id,
-                        timestamp_read=round(timestamp_read / 1000),
-                        was_read=True,
-                    )
-                    self.log.debug(f"The message {event_id} has been read at {timestamp_read}")
+        # Read receipts of the customers: event_id, receiver and read timestamp
+        receipts: List[Tuple[EventID, str, int]] = []
+        for event_id, content in evt.content.items():
+            users = content.get(ReceiptType.READ) or content.get(ReceiptType.READ_PRIVATE) or {}
+            for user_id, receipt in users.items():
+                user_prefix = self.username_regex.search(user_id)
+                if user_prefix and Message.is_tracked(event_id):
+                    receipts.append((event_id, f"+{user_prefix.group('number')}", receipt.ts))
+
+        if not receipts:
+            return
+
+        # Only the messages sent by the send_message endpoint are saved
+        tracked_event_ids = await Message.get_tracked_event_ids(
+            list({event_id for event_id, _, _ in receipts})
+        )
+
+        # The latest receipt of each receiver also marks the previous messages as read
+        latest_receipts: Dict[str, Tuple[EventID, int]] = {}
+        for event_id, receiver, timestamp_read in receipts:
+            if event_id not in tracked_event_ids:
+                continue
+            if receiver not in latest_receipts or latest_receipts[receiver][1] < timestamp_read:
+                latest_receipts[receiver] = (event_id, timestamp_read)
+
+        if not latest_receipts:
+            return
+
+        read_receipts = [
+            (event_id, receiver, round(timestamp_read / 1000))
+            for receiver, (event_id, timestamp_read) in latest_receipts.items()
+        ]
+        await Message.mark_as_read_many(room_id=evt.room_id, receipts=read_receipts)
+        self.log.debug(f"{len(read_receipts)} read receipts saved in the room {evt.room_id}")
 
     async def handle_invite(self, evt: StrippedStateEvent):
         """If the user who was invited is a acd[n], then join the room
@@ -524,8 +546,7 @@ class MatrixHandler:
         # TODO TEMPORARY SOLUTION TO LINK TO THE MENU IN A UIC
         if not portal.creator in puppet.BIC_ROOMS:
             # set chat status to start before process the destination
-            await portal.update_state(PortalState.START)
-            await send_conversation_event(portal=portal, event_type=ACDConversationEvents.UIC)
+            await portal.update_state(PortalState.START, event_type=ACDConversationEvents.UIC)
 
             if puppet.destination:
                 portal: Portal = await Portal.get_by_room_id(
@@ -767,16 +788,25 @@ class MatrixHandler:
 
         # Ignore messages from ourselves or agents if not a command
         if sender.is_agent:
-            await portal.update_state(PortalState.FOLLOWUP)
-            await send_conversation_event(
-                portal=portal,
-                event_type=ACDConversationEvents.PortalMessage,
-                sender=sender.mxid,
-                event_id=event_id,
-            )
-            await puppet.agent_manager.signaling.set_chat_status(
+            # Only the first message of the agent changes the state of the conversation
+            if portal.state != PortalState.FOLLOWUP:
+                await portal.update_state(PortalState.FOLLOWUP)
+
+            if self.config["acd.portal_message_events"]:
+                await send_conversation_event(
+                    portal=portal,
+                    event_type=ACDConversationEvents.PortalMessage,
+                    sender=sender.mxid,
+                    event_id=event_id,
+                )
+
+            # A rejected state change keeps the chat status of the previous state
+            if portal.state == PortalState.FOLLOWUP and not Signaling.has_chat_status(
                 room_id=portal.room_id, status=Signaling.FOLLOWUP, agent=sender.mxid
-            )
+            ):
+                await puppet.agent_manager.signaling.set_chat_status(
+                    room_id=portal.room_id, status=Signaling.FOLLOWUP, agent=sender.mxid
+                )
             return
 
         # If the room name is empty, it is setting the room name to the new room name.
@@ -803,17 +833,25 @@ class MatrixHandler:
 
         if room_agent:
             # if message is not from agents, bots or ourselves, it is from the customer
-            await portal.update_state(PortalState.PENDING)
-            await send_conversation_event(
-                portal=portal,
-                event_type=ACDConversationEvents.PortalMessage,
-                sender=sender.mxid,
-                event_id=event_id,
-            )
+            # Only the first message of the customer changes the state of the conversation
+            if portal.state != PortalState.PENDING:
+                await portal.update_state(PortalState.PENDING)
 
-            await puppet.agent_manager.signaling.set_chat_status(
+            if self.config["acd.portal_message_events"]:
+                await send_conversation_event(
+                    portal=portal,
+                    event_type=ACDConversationEvents.PortalMessage,
+                    sender=sender.mxid,
+                    event_id=event_id,
+                )
+
+            # A rejected state change keeps the chat status of the previous state
+            if portal.state == PortalState.PENDING and not Signaling.has_chat_status(
                 room_id=portal.room_id, status=Signaling.PENDING, agent=room_agent.mxid
-            )
+            ):
+                await puppet.agent_manager.signaling.set_chat_status(
+                    room_id=portal.room_id, status=Signaling.PENDING, agent=room_agent.mxid
+                )
 
             if await puppet.agent_manager.business_hours.is_not_business_hour():
                 await puppet.agent_manager.business_hours.send_business_hours_message(
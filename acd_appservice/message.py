@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import logging
-from typing import cast
+from typing import List, cast
 
 from mautrix.types import EventID, RoomID, UserID
 from mautrix.util.logging import TraceLogger
 
 from .config import Config
 from .db import Message as DBMessage
+from .util import BloomFilter
 
 
 class Message(DBMessage):
@@ -16,6 +17,11 @@ class Message(DBMessage):
     log: TraceLogger = logging.getLogger("acd.message")
     config: Config
 
+    # Event ids of the messages in the table, used to skip the read receipts
+    # of the untracked messages without querying the database
+    tracked_events: BloomFilter | None = None
+    tracked_events_loaded: bool = False
+
     def __init__(
         self,
         event_id: EventID,
@@ -68,6 +74,22 @@ class Message(DBMessage):
             was_read=was_read,
         )
         await msg.insert()
+        if cls.tracked_events is not None:
+            cls.tracked_events.add(event_id)
+
+    @classmethod
+    def track(cls, event_id: EventID) -> None:
+        """It adds a sent message to the tracked events before it is saved,
+        so its read receipts are not skipped"""
+        if cls.tracked_events is not None:
+            cls.tracked_events.add(event_id)
+
+    @classmethod
+    async def insert_many(cls, messages: List[Message]) -> None:
+        await super().insert_many(messages)
+        if cls.tracked_events is not None:
+            for message in messages:
+                cls.tracked_events.add(message.event_id)
 
     @classmethod
     async def get_by_event_id(cls, event_id: EventID) -> Message | None:
@@ -76,3 +98,57 @@ class Message(DBMessage):
             return message
 
         return None
+
+    @classmethod
+    def init_cls(cls, config: Config) -> None:
+        cls.config = config
+        cls.tracked_events = None
+        cls.tracked_events_loaded = False
+        if config["acd.tracked_messages_filter.enabled"]:
+            cls.tracked_events = BloomFilter(
+                capacity=config["acd.tracked_messages_filter.capacity"],
+                error_rate=config["acd.tracked_messages_filter.error_rate"],
+            )
+
+    @classmethod
+    async def load_tracked_events(cls) -> None:
+        """It adds the event ids of the saved messages to the tracked events filter"""
+        if cls.tracked_events is None:
+            return
+
+        event_id = None
+        while True:
+            event_ids = await cls.get_event_ids(after=event_id)
+            if not event_ids:
+                break
+
+            for event_id in event_ids:
+                cls.tracked_events.add(event_id)
+
+        cls.tracked_events_loaded = True
+        cls.log.info(f"{len(cls.tracked_events)} tracked messages loaded")
+        if cls.tracked_events.is_full:
+            cls.log.warning(
+                "The tracked messages exceed the capacity of the filter, "
+                "increase acd.tracked_messages_filter.capacity"
+            )
+
+    @classmethod
+    def is_tracked(cls, event_id: EventID) -> bool:
+        """Check if the event may belong to a message sent by the send_message endpoint
+
+        Parameters
+        ----------
+        event_id : EventID
+            The event id to check.
+
+        Returns
+        -------
+            False if the message is not in the table, True if it may be
+            or the filter is not available.
+
+        """
+        if cls.tracked_events is None or not cls.tracked_events_loaded:
+            return True
+
+        return event_id in cls.tracked_events
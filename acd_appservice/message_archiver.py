@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from mautrix.util.logging import TraceLogger
+
+from .config import Config
+from .db.message import Message as DBMessage
+
+log: TraceLogger = logging.getLogger("acd.message_archiver")
+
+
+class MessageArchiver:
+    """It keeps the message table small, the messages older than `retention_days`
+    are moved to the message_archive table (or deleted) in batches,
+    and the archived ones older than `archive_retention_days` are deleted"""
+
+    config: Config = None
+    _task: asyncio.Task = None
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.config and cls.config["acd.message_retention.enabled"])
+
+    @classmethod
+    def start(cls):
+        if not cls.is_enabled():
+            return
+
+        log.info("Starting the message archiver")
+        cls._task = asyncio.create_task(cls.run_loop())
+
+    @classmethod
+    def stop(cls):
+        if cls._task:
+            cls._task.cancel()
+            cls._task = None
+
+    @classmethod
+    async def run_loop(cls):
+        while True:
+            try:
+                await cls.run()
+            except Exception as e:
+                log.exception(f"Error archiving the old messages: {e}")
+
+            await asyncio.sleep(cls.config["acd.message_retention.interval"])
+
+    @classmethod
+    def get_timestamp(cls, days: int) -> int:
+        return int((datetime.utcnow() - timedelta(days=days)).timestamp())
+
+    @classmethod
+    async def run(cls) -> tuple[int, int]:
+        """It archives (or deletes) the old messages and deletes the old archived ones
+
+        Returns
+        -------
+            The number of archived and the number of deleted messages.
+
+        """
+        batch_size = cls.config["acd.message_retention.batch_size"]
+        timestamp = cls.get_timestamp(cls.config["acd.message_retention.retention_days"])
+
+        archived = 0
+        deleted = 0
+        while True:
+            if cls.config["acd.message_retention.archive"]:
+                moved = await DBMessage.archive_sent_before(timestamp=timestamp, limit=batch_size)
+                archived += moved
+            else:
+                moved = await DBMessage.delete_sent_before(timestamp=timestamp, limit=batch_size)
+                deleted += moved
+
+            if moved < batch_size:
+                break
+            # Let the other queries run between the batches
+            await asyncio.sleep(0.1)
+
+        archive_retention_days = cls.config["acd.message_retention.archive_retention_days"]
+        if archive_retention_days:
+            timestamp = cls.get_timestamp(archive_retention_days)
+            while True:
+                moved = await DBMessage.delete_sent_before(
+                    timestamp=timestamp, limit=batch_size, table="message_archive"
+                )
+                deleted += moved
+                if moved < batch_size:
+                    break
+                await asyncio.sleep(0.1)
+
+        if archived or deleted:
+            log.info(f"{archived} messages have been archived and {deleted} have been deleted")
+
+        return archived, deleted
@@ -4,8 +4,10 @@ import asyncio
 import json
 import logging
 import re
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Dict, List, Optional, cast
+from typing import AsyncIterator, Dict, List, Optional, cast
 
 from mautrix.api import Method, SynapseAdminPath
 from mautrix.appservice import IntentAPI
@@ -22,12 +24,33 @@ from mautrix.util.logging import TraceLogger
 from .config import Config
 from .db.portal import Portal as DBPortal
 from .db.portal import PortalState
-from .events import ACDConversationEvents, send_conversation_event
+from .events import ACDConversationEvents, BaseEvent, send_conversation_event
+from .events.outbox_flusher import OutboxFlusher
 from .matrix_room import MatrixRoom
+from .portal_writer import PortalWriter
 from .user import User
 from .util import Util
 
 
+class PortalTransition:
+    """An open transition of a portal, it belongs to the task that opened it"""
+
+    def __init__(self) -> None:
+        self.task = asyncio.current_task()
+        self.events: List[BaseEvent] = []
+
+    def is_current(self) -> bool:
+        return self.task is asyncio.current_task()
+
+
+# The open transitions of the current task by room, each task (and the tasks it creates)
+# gets its own copy, so the changes of other coroutines on the same portal are never
+# saved or sent by a transition that they did not open
+open_transitions: ContextVar[Dict[RoomID, PortalTransition]] = ContextVar(
+    "open_transitions", default={}
+)
+
+
 class Portal(DBPortal, MatrixRoom):
     log: TraceLogger = logging.getLogger("acd.portal")
     config: Config
@@ -53,14 +76,128 @@ class Portal(DBPortal, MatrixRoom):
         self.by_id[self.id] = self
         self.by_room_id[self.room_id] = self
 
-    async def update_state(self, state: PortalState):
-        self.log.debug(
-            f"Updating room [{self.room_id}] state [{self.state.value}] to [{state.value}]"
+    def can_change_state(self, state: PortalState) -> bool:
+        """A state change is valid if it is in the transitions table,
+        going back to the previous state is always valid, it reverts a failed distribution
+
+        Parameters
+        ----------
+        state : PortalState
+            The new state of the conversation.
+
+        Returns
+        -------
+            A boolean value.
+
+        """
+        if not state:
+            return False
+
+        return self.state.can_change_to(state) or state == self.prev_state
+
+    async def update_state(
+        self, state: PortalState, event_type: ACDConversationEvents = None, **kwargs
+    ) -> bool:
+        """It changes the conversation state and sends the conversation event of the change,
+        the portal and the event are saved when the transition ends
+
+        Parameters
+        ----------
+        state : PortalState
+            The new state of the conversation.
+        event_type : ACDConversationEvents
+            The conversation event of the change, the kwargs are the data of the event.
+
+        Returns
+        -------
+            True if the state was changed, False if the change is not a valid transition.
+
+        """
+        if not self.can_change_state(state):
+            self.log.warning(
+                f"Invalid state change in room [{self.room_id}] "
+                f"[{self.state.value}] to [{state.value if state else None}], ignoring it"
+            )
+            return False
+
+        async with self.transition():
+            self.log.debug(
+                f"Updating room [{self.room_id}] state [{self.state.value}] to [{state.value}]"
+            )
+            self.prev_state = self.state
+            self.state = state
+            self.state_date = self.now()
+
+            if event_type:
+                await send_conversation_event(portal=self, event_type=event_type, **kwargs)
+
+        return True
+
+    def invalid_state_response(self, state: PortalState) -> Dict:
+        """It creates the response of a rejected state change, the callers return it
+        instead of doing the side effects (notices, chat status) of the change
+
+        Parameters
+        ----------
+        state : PortalState
+            The rejected state.
+
+        Returns
+        -------
+            A response with the 409 status.
+
+        """
+        return Util.create_response_data(
+            detail=(
+                f"The conversation can not change from [{self.state.value}] "
+                f"to [{state.value if state else None}]"
+            ),
+            room_id=self.room_id,
+            status=409,
         )
-        self.prev_state = self.state
-        self.state = state
-        self.state_date = self.now()
-        await self.save()
+
+    @asynccontextmanager
+    async def transition(self) -> AsyncIterator[None]:
+        """It groups the changes of a logical operation (e.g. ASSIGNED -> PENDING),
+        the intermediate states are kept in memory and when the block ends the portal
+        is saved once and the conversation events are sent together
+
+            async with portal.transition():
+                await portal.update_state(PortalState.ASSIGNED, ACDConversationEvents.Assigned)
+                ...
+                await portal.update_state(PortalState.PENDING, ACDConversationEvents.Connect)
+
+        """
+        if self.get_transition():
+            # The outer transition saves the portal
+            yield
+            return
+
+        values = self._values
+        transition = PortalTransition()
+        token = open_transitions.set({**open_transitions.get(), self.room_id: transition})
+        try:
+            yield
+        finally:
+            open_transitions.reset(token)
+            if transition.events or self._values != values:
+                await self.save(events=transition.events)
+
+    def get_transition(self) -> PortalTransition | None:
+        """The transition of the portal opened by the current task"""
+        transition = open_transitions.get().get(self.room_id)
+        if transition and transition.is_current():
+            return transition
+        return None
+
+    async def send_event(self, event: BaseEvent):
+        """It sends a conversation event, if the current task has an open transition
+        the event is sent when the transition ends"""
+        transition = self.get_transition()
+        if transition:
+            transition.events.append(event)
+        else:
+            await event.send()
 
     async def update_room_name(self, new_room_name: Optional[str] = None) -> None:
         """
@@ -271,9 +408,54 @@ class Portal(DBPortal, MatrixRoom):
 
         self.LOCKED_PORTALS.remove(self.room_id)
 
-    async def save(self) -> None:
+    async def save(self, events: List[BaseEvent] | None = None, force: bool = False) -> None:
+        """It saves the portal and sends the conversation events of the changes,
+        if the outbox is enabled the events are stored with the same query
+
+        With the write-behind enabled, the portal is saved in the next flush
+        unless its state is one of the `sync_states` or the save is forced.
+
+        Parameters
+        ----------
+        events : List[BaseEvent]
+            Conversation events of the changes.
+        force : bool
+            Save the portal now, even if the write-behind is enabled.
+
+        """
         await self._add_to_cache()
-        await self.update()
+
+        if not force and PortalWriter.is_enabled() and not PortalWriter.is_sync_state(self.state):
+            PortalWriter.add(self)
+            for event in events or []:
+                await event.send()
+            return
+
+        outbox = None
+        if events and OutboxFlusher.is_enabled():
+            for event in events:
+                event.save_to_file()
+            outbox = [event.to_outbox() for event in events]
+
+        # The portal is saved now, the pending flush is not needed
+        async with PortalWriter.sync_save(self.room_id):
+            if not outbox:
+                await self.update()
+            else:
+                try:
+                    await self.update(outbox=outbox)
+                except Exception as e:
+                    self.log.error(f"Error storing the events of the room {self.room_id}: {e}")
+                    # Do not lose the events, publish them directly
+                    await self.update()
+                    for event in events:
+                        asyncio.create_task(event.publish())
+
+        for event in events or []:
+            if outbox:
+                event.send_to_stream()
+            else:
+                await event.send()
 
     async def set_relay(self) -> None:
         """Send the command set-relay to a portal."""
@@ -330,8 +512,10 @@ class Portal(DBPortal, MatrixRoom):
         """
 
         self.log.debug(f"This room will be set up :: {self.room_id}")
-        await self.update_state(PortalState.INIT)
-        await send_conversation_event(portal=self, event_type=ACDConversationEvents.Create)
+        await self.update_state(
+            PortalState.INIT,
+            event_type=ACDConversationEvents.Create,
+        )
 
         bridge = self.bridge
         if bridge and bridge in self.config["bridges"] and bridge != "chatterbox":
@@ -436,9 +620,8 @@ class Portal(DBPortal, MatrixRoom):
             try:
                 await self.add_member(menubot_mxid)
                 # When menubot enters to the portal, set the portal state in ONMENU
-                await self.update_state(PortalState.ONMENU)
-                await send_conversation_event(
-                    portal=self,
+                await self.update_state(
+                    PortalState.ONMENU,
                     event_type=ACDConversationEvents.Assigned,
                     sender=self.main_intent.mxid,
                     assigned_user=menubot_mxid,
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+from mautrix.types import RoomID
+from mautrix.util.logging import TraceLogger
+
+from .config import Config
+from .db.portal import Portal as DBPortal
+from .db.portal import PortalState
+
+log: TraceLogger = logging.getLogger("acd.portal_writer")
+
+
+class PortalWriter:
+    """It saves the changed portals in batches (write-behind), the portals in memory
+    are the source of truth and the rows are updated every `flush_interval` milliseconds,
+    the changes to one of the `sync_states` are saved immediately by the portal,
+    a flush and the immediate saves never run at the same time, so an older batch
+    can not overwrite the newer values of a portal"""
+
+    config: Config = None
+    _flush_task: asyncio.Task = None
+    _lock: asyncio.Lock = None
+
+    DIRTY_PORTALS: Dict[RoomID, DBPortal] = {}
+
+    # Flush stats, they are logged every `STATS_INTERVAL` flushes
+    STATS_INTERVAL = 100
+    flushes: int = 0
+    flushed_portals: int = 0
+    max_batch_size: int = 0
+    max_latency: float = 0
+
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
+    @classmethod
+    def lock(cls) -> asyncio.Lock:
+        # It is created in the running loop
+        if not cls._lock:
+            cls._lock = asyncio.Lock()
+        return cls._lock
+
+    @classmethod
+    @asynccontextmanager
+    async def sync_save(cls, room_id: RoomID) -> AsyncIterator[None]:
+        """It wraps an immediate save of a portal, the pending flush of the portal is
+        discarded and the save waits for a running flush to finish"""
+        if not cls.is_enabled():
+            yield
+            return
+
+        async with cls.lock():
+            cls.discard(room_id)
+            yield
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return bool(cls.config and cls.config["acd.portal_write_behind.enabled"])
+
+    @classmethod
+    def is_sync_state(cls, state: PortalState) -> bool:
+        return state.value in cls.config["acd.portal_write_behind.sync_states"]
+
+    @classmethod
+    def add(cls, portal: DBPortal):
+        cls.DIRTY_PORTALS[portal.room_id] = portal
+
+    @classmethod
+    def discard(cls, room_id: RoomID):
+        cls.DIRTY_PORTALS.pop(room_id, None)
+
+    @classmethod
+    def start(cls):
+        if not cls.is_enabled():
+            return
+
+        log.info("Starting the portal write-behind")
+        cls._flush_task = asyncio.create_task(cls.flush_loop())
+
+    @classmethod
+    async def stop(cls):
+        if cls._flush_task:
+            cls._flush_task.cancel()
+            cls._flush_task = None
+
+        # Save the pending portals before closing the database
+        try:
+            await cls.flush()
+        except Exception as e:
+            log.error(f"Error saving the pending portals on stop: {e}")
+
+    @classmethod
+    async def flush_loop(cls):
+        while True:
+            await asyncio.sleep(cls.config["acd.portal_write_behind.flush_interval"] / 1000)
+            try:
+                await cls.flush()
+            except Exception as e:
+                log.exception(f"Error saving the pending portals: {e}")
+
+    @classmethod
+    async def flush(cls) -> int:
+        """It saves all the changed portals with a single query
+
+        Returns
+        -------
+            The number of saved portals.
+
+        """
+        if not cls.DIRTY_PORTALS:
+            return 0
+
+        async with cls.lock():
+            portals: List[DBPortal] = list(cls.DIRTY_PORTALS.values())
+            cls.DIRTY_PORTALS = {}
+
+            start = time.perf_counter()
+            try:
+                await DBPortal.update_many(portals)
+            except Exception:
+                # Keep them to be saved in the next flush
+                for portal in portals:
+                    cls.DIRTY_PORTALS.setdefault(portal.room_id, portal)
+                raise
+
+        latency = (time.perf_counter() - start) * 1000
+        log.debug(f"{len(portals)} portals have been saved in {latency:.1f} ms")
+        cls.count_flush(len(portals), latency)
+        return len(portals)
+
+    @classmethod
+    def count_flush(cls, batch_size: int, latency: float):
+        cls.flushes += 1
+        cls.flushed_portals += batch_size
+        cls.max_batch_size = max(cls.max_batch_size, batch_size)
+        cls.max_latency = max(cls.max_latency, latency)
+
+        if cls.flushes % cls.STATS_INTERVAL == 0:
+            log.info(
+                f"Portal write-behind: {cls.flushes} flushes, "
+                f"avg batch size {cls.flushed_portals / cls.flushes:.1f}, "
+                f"max batch size {cls.max_batch_size}, max latency {cls.max_latency:.1f} ms"
+            )
+            cls.max_batch_size = 0
+            cls.max_latency = 0
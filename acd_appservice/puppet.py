@@ -275,6 +275,29 @@ class Puppet(DBPuppet, BasePuppet):
 
         return None
 
+    @classmethod
+    async def get_by_custom_mxids(cls, mxids: List[UserID]) -> List[Puppet]:
+        """Get several puppets, the ones that are not cached are loaded with a single query
+
+        Parameters
+        ----------
+        mxids : List[UserID]
+            The custom mxids of the puppets.
+
+        Returns
+        -------
+            The puppets found, in the order of the mxids.
+
+        """
+        missing = [mxid for mxid in mxids if mxid not in cls.by_custom_mxid]
+        if missing:
+            for puppet in await super().get_by_custom_mxids(missing):
+                puppet = cast(cls, puppet)
+                if puppet.custom_mxid not in cls.by_custom_mxid:
+                    puppet._add_to_cache()
+
+        return [cls.by_custom_mxid[mxid] for mxid in mxids if mxid in cls.by_custom_mxid]
+
     @classmethod
     @async_getter_lock
     async def get_by_email(cls, email: str) -> Puppet | None:
@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 from typing import List, Optional, cast
 
+from attr import dataclass, ib
 from mautrix.appservice import IntentAPI
 from mautrix.errors.base import IntentError
 from mautrix.types import RoomID, UserID
@@ -14,6 +15,23 @@ from .queue_membership import QueueMembership
 from .user import User
 
 
+@dataclass
+class QueueAvailability:
+    """Snapshot of the agents of a queue, it is taken once per scheduling pass
+    and shared by the distribution and the events of that pass."""
+
+    agents: List[User] = ib(factory=list)
+    available_agents: List[User] = ib(factory=list)
+
+    @property
+    def agents_count(self) -> int:
+        return len(self.agents)
+
+    @property
+    def available_agents_count(self) -> int:
+        return len(self.available_agents)
+
+
 class Queue(DBQueue, MatrixRoom):
     room_id: RoomID
     name: str = ""
@@ -170,8 +188,8 @@ class Queue(DBQueue, MatrixRoom):
             An integer value which represents the count of available agents.
 
         """
-        available_agents = await self.get_available_agents()
-        return len(available_agents) if available_agents else 0
+        availability = await self.get_availability()
+        return availability.available_agents_count
 
     async def get_agents(self) -> List[User]:
         """Get all the users in the channel, remove the bots, and return the remaining users
@@ -204,15 +222,24 @@ class Queue(DBQueue, MatrixRoom):
 
         """
 
-        agents: List[User] = await self.get_agents()
+        availability = await self.get_availability()
+        return availability.available_agents or None
+
+    async def get_availability(self) -> QueueAvailability:
+        """It gets the agents of the queue only once and checks which of them are available
+
+        Returns
+        -------
+            A `QueueAvailability` with the agents and the available agents of the queue.
+
+        """
+        agents: List[User] = await self.get_agents() or []
         available_agents = [
             agent
             for agent in agents
             if await agent.is_online(self.id) and not await agent.is_paused(self.id)
         ]
-        if not available_agents:
-            available_agents = None
-        return available_agents
+        return QueueAvailability(agents=agents, available_agents=available_agents)
 
     def remove_not_agents(self, members: List[User]) -> List[User]:
         """Removes non-agents from a list of users
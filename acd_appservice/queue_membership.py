@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime as dt
-from typing import Dict, cast
+from typing import AsyncIterator, Dict, List, Tuple, cast
 
+from mautrix.types import UserID
 from mautrix.util.logging import TraceLogger
 
 from .db.queue_membership import QueueMembership as DBMembership
@@ -115,16 +116,56 @@ class QueueMembership(DBMembership):
             A list of dictionaries with memberships data of the user.
 
         """
-        memberships = []
-        dt_format = "%Y-%m-%d %H:%M:%S%z"
         user_memberships = await cls.get_user_memberships(fk_user)
+        return [cls.serialize_membership(membership) for membership in user_memberships or []]
+
+    @classmethod
+    async def iter_serialized_memberships_by_user(
+        cls,
+        after: UserID | None = None,
+        limit: int | None = None,
+        state: QueueMembershipState | None = None,
+    ) -> AsyncIterator[Tuple[UserID, List[Dict]]]:
+        """Iterate the serialized memberships of all the users with a single query,
+        the rows come ordered by user so each user is yielded as soon as it is complete
+
+        Parameters
+        ----------
+        after : UserID | None
+            Only the users whose mxid is greater than this one, to get the next page.
+        limit : int | None
+            Max number of users, all the users if it is None.
+        state : QueueMembershipState | None
+            Only the memberships in this state.
 
-        if user_memberships:
-            for membership in user_memberships:
-                membership = dict(membership)
-                state_date: dt = membership.get("state_date")
-                pause_date: dt = membership.get("pause_date")
-                membership["state_date"] = state_date.strftime(dt_format) if state_date else None
-                membership["pause_date"] = pause_date.strftime(dt_format) if pause_date else None
-                memberships.append(membership)
-        return memberships
+        Returns
+        -------
+            The mxid and the memberships of each user, ordered by user mxid.
+
+        """
+        mxid: UserID | None = None
+        memberships: List[Dict] = []
+        async for membership in cls.iter_all_user_memberships(
+            after=after, limit=limit, state=state.value if state else None
+        ):
+            membership = dict(membership)
+            membership_mxid = membership.pop("mxid")
+            if membership_mxid != mxid and memberships:
+                yield mxid, memberships
+                memberships = []
+            mxid = membership_mxid
+            memberships.append(cls.serialize_membership(membership))
+
+        if memberships:
+            yield mxid, memberships
+
+    @staticmethod
+    def serialize_membership(membership: Dict) -> Dict:
+        """It formats the dates of a membership"""
+        membership = dict(membership)
+        dt_format = "%Y-%m-%d %H:%M:%S%z"
+        state_date: dt = membership.get("state_date")
+        pause_date: dt = membership.get("pause_date")
+        membership["state_date"] = state_date.strftime(dt_format) if state_date else None
+        membership["pause_date"] = pause_date.strftime(dt_format) if pause_date else None
+        return membership
@@ -0,0 +1,303 @@
+"""Replay the recorded ACD events into NATS.
+
+The events are read from the events file (/data/room_events.txt) or from the outbox table
+and they are published in batches, the position of the last published batch is saved
+in a checkpoint file so an interrupted replay can be resumed.
+
+    python -m acd_appservice.replay_events -c config.yaml --source file
+    python -m acd_appservice.replay_events -c config.yaml --source outbox --pending-only
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from mautrix.util.async_db import Database
+from mautrix.util.logging import TraceLogger
+from nats.js.client import JetStreamContext
+
+from .config import Config
+from .db import EventOutbox, upgrade_table
+from .events.nats_publisher import NatsPublisher
+
+log: TraceLogger = logging.getLogger("acd.replay")
+
+CONVERSATION_BANNER = "################# ------- New conversation ------- #################"
+
+# An event to replay, its position in the source and the event data
+ReplayEvent = Tuple[int, Dict]
+
+
+class Checkpoint:
+    """It saves the position of the last published event of a source"""
+
+    def __init__(self, path: str, source: str) -> None:
+        self.path = path
+        self.source = source
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return 0
+
+        if data.get("source") != self.source:
+            log.warning(f"The checkpoint {self.path} belongs to another source, ignoring it")
+            return 0
+
+        return data.get("position", 0)
+
+    def save(self, position: int):
+        # Write in a temporary file and replace it to not corrupt the checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"source": self.source, "position": position}, file)
+        os.replace(tmp_path, self.path)
+
+
+async def read_file_events(path: str, offset: int) -> AsyncIterator[ReplayEvent]:
+    """It reads the events file entry by entry, without loading the whole file
+
+    The entries are separated by blank lines and "New conversation" banners,
+    the position of each event is the offset in bytes after its entry.
+
+    Parameters
+    ----------
+    path : str
+        Path of the events file.
+    offset : int
+        Offset in bytes where the reading starts.
+
+    Returns
+    -------
+        An async iterator of (position, event) tuples.
+
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        position = offset
+        entry: List[bytes] = []
+
+        while True:
+            line = file.readline()
+            position += len(line)
+            text = line.strip()
+
+            if text and not text.decode(errors="replace").startswith(CONVERSATION_BANNER):
+                entry.append(text)
+                continue
+
+            # A blank line, a banner or the end of the file closes the entry
+            if entry:
+                raw = b"".join(entry)
+                entry = []
+                try:
+                    yield position, json.loads(raw)
+                except ValueError:
+                    log.warning(f"Skipping malformed entry before byte {position}: {raw[:100]}")
+
+            if not line:
+                break
+
+
+async def read_outbox_events(
+    after_id: int, block_size: int, pending_only: bool
+) -> AsyncIterator[ReplayEvent]:
+    """It reads the outbox in blocks of `block_size` events
+
+    Parameters
+    ----------
+    after_id : int
+        Id of the last replayed event.
+    block_size : int
+        Number of events read in each query.
+    pending_only : bool
+        If True, only the events that have not been delivered are replayed.
+
+    Returns
+    -------
+        An async iterator of (id, event) tuples.
+
+    """
+    while True:
+        events = await EventOutbox.get_after(
+            after_id=after_id, limit=block_size, pending_only=pending_only
+        )
+        if not events:
+            break
+
+        for event in events:
+            data = json.loads(event.payload)
+            data.setdefault("event_id", event.event_id)
+            yield event.id, data
+
+        after_id = events[-1].id
+
+
+def get_event_id(event: Dict) -> str:
+    """The events recorded before the deterministic ids use the hash of their content"""
+    if event.get("event_id"):
+        return event["event_id"]
+
+    return hashlib.sha1(json.dumps(event, sort_keys=True).encode()).hexdigest()
+
+
+class Replayer:
+    def __init__(
+        self,
+        jetstream: JetStreamContext,
+        batch_size: int,
+        rate: Optional[float] = None,
+        mark_as_delivered: bool = False,
+    ) -> None:
+        self.jetstream = jetstream
+        self.batch_size = batch_size
+        self.rate = rate
+        # Mark the replayed outbox events as delivered, the positions are the outbox ids
+        self.mark_as_delivered = mark_as_delivered
+        self.published = 0
+        self.start_time = time.monotonic()
+
+    async def publish_batch(self, batch: List[Dict], positions: List[int]):
+        results = await asyncio.gather(
+            *[
+                self.jetstream.publish(
+                    subject=NatsPublisher.get_subject(
+                        event.get("event_type"), NatsPublisher.get_partition_key(event)
+                    ),
+                    payload=NatsPublisher.encode_payload(event),
+                    headers=NatsPublisher.get_headers(get_event_id(event)),
+                )
+                for event in batch
+            ],
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            # The checkpoint is not moved, the batch is published again when resuming,
+            # the duplicated events are discarded by JetStream using the event ids
+            raise errors[0]
+
+        if self.mark_as_delivered:
+            await EventOutbox.mark_as_delivered(
+                ids=positions, delivered_date=datetime.now(timezone.utc)
+            )
+
+        self.published += len(batch)
+
+    async def wait_rate(self):
+        """It sleeps the time needed to not publish more than `rate` events per second"""
+        if not self.rate:
+            return
+
+        expected_time = self.published / self.rate
+        elapsed = time.monotonic() - self.start_time
+        if expected_time > elapsed:
+            await asyncio.sleep(expected_time - elapsed)
+
+    async def replay(self, events: AsyncIterator[ReplayEvent], checkpoint: Checkpoint) -> int:
+        batch: List[Dict] = []
+        positions: List[int] = []
+
+        async for position, event in events:
+            batch.append(event)
+            positions.append(position)
+            if len(batch) < self.batch_size:
+                continue
+
+            await self.publish_batch(batch, positions)
+            checkpoint.save(position)
+            batch, positions = [], []
+            await self.wait_rate()
+
+            if self.published % (self.batch_size * 100) == 0:
+                elapsed = time.monotonic() - self.start_time
+                log.info(
+                    f"{self.published} events replayed ({self.published / elapsed:.0f} events/s)"
+                )
+
+        if batch:
+            await self.publish_batch(batch, positions)
+            checkpoint.save(positions[-1])
+
+        return self.published
+
+
+def args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay the recorded ACD events into NATS")
+    parser.add_argument("-c", "--config", type=str, default="config.yaml", metavar="<path>")
+    parser.add_argument("--source", choices=["file", "outbox"], default="file")
+    parser.add_argument("--file", type=str, default="/data/room_events.txt", metavar="<path>")
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default="/data/replay_events.checkpoint",
+        metavar="<path>",
+        help="file where the position of the last published batch is saved",
+    )
+    parser.add_argument("--reset", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=None, help="max events per second")
+    parser.add_argument(
+        "--pending-only",
+        action="store_true",
+        help="replay only the outbox events that have not been delivered",
+    )
+    return parser
+
+
+async def main(args: argparse.Namespace):
+    config = Config(args.config, "registration.yaml", "pkg://acd_appservice/example-config.yaml")
+    config.load()
+    NatsPublisher.init_cls(config)
+
+    _, jetstream = await NatsPublisher.get_connection()
+    if not jetstream:
+        log.error("NATS is disabled or it is not reachable, check the nats section of the config")
+        return
+
+    checkpoint = Checkpoint(args.checkpoint, source=args.source)
+    position = 0 if args.reset else checkpoint.load()
+    log.info(f"Replaying events from {args.source}, starting at position {position}")
+
+    db: Database = None
+    if args.source == "outbox":
+        db = Database.create(
+            config["appservice.database"],
+            upgrade_table=upgrade_table,
+            db_args=config["appservice.database_opts"],
+        )
+        await db.start()
+        EventOutbox.db = db
+        events = read_outbox_events(position, args.batch_size, args.pending_only)
+    else:
+        events = read_file_events(args.file, position)
+
+    replayer = Replayer(
+        jetstream=jetstream,
+        batch_size=args.batch_size,
+        rate=args.rate,
+        mark_as_delivered=args.source == "outbox" and args.pending_only,
+    )
+    try:
+        published = await replayer.replay(events, checkpoint)
+        elapsed = time.monotonic() - replayer.start_time
+        log.info(f"Replay finished, {published} events published in {elapsed:.1f}s")
+    finally:
+        await NatsPublisher.close_connection()
+        if db:
+            await db.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
+    asyncio.run(main(args_parser().parse_args()))
@@ -3,7 +3,9 @@ from __future__ import annotations
 import asyncio
 import datetime
 import logging
-from typing import Any
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
 
 from mautrix.appservice import IntentAPI
 from mautrix.types import EventType, RoomID, StateEventContent, UserID
@@ -28,10 +30,27 @@ class Signaling:
     FOLLOWUP = "FOLLOWUP"
     RESOLVED = "RESOLVED"
 
+    # Last chat status (status, campaign_room_id and agent) of each room with the time
+    # its entry expires, it is primed with the state events we send and the ones we receive.
+    # The resolved chats are dropped, the oldest entries are dropped after `max_cached_chats`
+    CHAT_DATA: OrderedDict[RoomID, Tuple[Dict, float]] = OrderedDict()
+
+    # Latest content waiting to be sent for each room and state event type with the intent
+    # that sends it, a newer content replaces the pending one, so only the last value is sent
+    PENDING_STATE_EVENTS: Dict[Tuple[RoomID, EventType], Tuple[IntentAPI, Dict]] = {}
+    STATE_WRITERS: Dict[Tuple[RoomID, EventType], asyncio.Task] = {}
+    STATE_UPDATED: Dict[Tuple[RoomID, EventType], asyncio.Event] = {}
+    # Number of state event writes avoided because a newer content replaced them
+    state_writes_saved: int = 0
+
     def __init__(self, intent: IntentAPI, config: Config):
         self.intent = intent
         self.config = config
 
+    @classmethod
+    def init_cls(cls, config: Config):
+        cls.config = config
+
     async def set_chat_status(
         self,
         room_id: RoomID,
@@ -153,16 +172,69 @@ class Signaling:
             The content of the event.
 
         """
-        asyncio.create_task(
-            self.put_room_state(room_id=room_id, event_type=event_type, content=content)
+        if event_type == self.CHAT_STATUS_EVENT_TYPE:
+            self.cache_chat_data(room_id=room_id, content=content or {})
+
+        key = (room_id, event_type)
+        if key in self.PENDING_STATE_EVENTS:
+            self.count_write_saved(f"{event_type} in {room_id} replaced before being sent")
+
+        # The writer may belong to another Signaling, the content is sent with our intent
+        self.PENDING_STATE_EVENTS[key] = (self.intent, content)
+
+        if key in self.STATE_WRITERS:
+            # Wake up the writer if it is waiting to retry an old content
+            self.STATE_UPDATED[key].set()
+            return
+
+        self.STATE_UPDATED[key] = asyncio.Event()
+        self.STATE_WRITERS[key] = asyncio.create_task(
+            self.state_writer(room_id=room_id, event_type=event_type)
         )
 
+    async def state_writer(self, room_id: RoomID, event_type: EventType):
+        """It sends the pending contents of a state event in a room one by one,
+        there is only one writer per room and event type, so the events keep their order
+
+        Parameters
+        ----------
+        room_id : RoomID
+            The room ID of the room you want to send the state event to.
+        event_type : EventType
+            The type of event to send.
+
+        """
+        key = (room_id, event_type)
+        try:
+            while key in self.PENDING_STATE_EVENTS:
+                intent, content = self.PENDING_STATE_EVENTS.pop(key)
+                self.STATE_UPDATED[key].clear()
+                sent = await self.put_room_state(
+                    room_id=room_id,
+                    event_type=event_type,
+                    content=content,
+                    superseded=self.STATE_UPDATED[key],
+                    intent=intent,
+                )
+                if (
+                    not sent
+                    and event_type == self.CHAT_STATUS_EVENT_TYPE
+                    and key not in self.PENDING_STATE_EVENTS
+                ):
+                    # The cached chat status was never saved in the room
+                    self.CHAT_DATA.pop(room_id, None)
+        finally:
+            del self.STATE_WRITERS[key]
+            del self.STATE_UPDATED[key]
+
     async def put_room_state(
         self,
         room_id: RoomID,
         event_type: EventType,
         content: StateEventContent | dict[str, Any] = None,
-    ) -> None:
+        superseded: asyncio.Event | None = None,
+        intent: IntentAPI | None = None,
+    ) -> bool:
         """It tries to send a state event to the room, and if it fails,
         it waits 2 seconds and tries again
 
@@ -174,20 +246,125 @@ class Signaling:
             The type of event to send.
         content : StateEventContent | dict[str, Any]
             The content of the event.
+        superseded : asyncio.Event | None
+            It is set when a newer content is pending, then the retries are cancelled.
+        intent : IntentAPI | None
+            The intent that sends the event, by default the intent of this Signaling.
+
+        Returns
+        -------
+            True if the event was sent or a newer content replaced it, False if all
+            the attempts failed.
 
         """
+        intent = intent or self.intent
         for attempt in range(10):
             try:
-                await self.intent.send_state_event(
+                await intent.send_state_event(
                     room_id=room_id, event_type=event_type, content=content
                 )
-                break
+                return True
             except Exception as e:
                 self.log.warning(f"Failed to put state event attempt {attempt} to {room_id} : {e}")
+
+            if not superseded:
                 await asyncio.sleep(2)
+                continue
+
+            try:
+                await asyncio.wait_for(superseded.wait(), timeout=2)
+            except asyncio.TimeoutError:
+                continue
+
+            self.count_write_saved(f"Retries of {event_type} in {room_id} cancelled")
+            return True
+
+        self.log.error(f"Failed to put state event {event_type} to {room_id}")
+        return False
+
+    @classmethod
+    def count_write_saved(cls, reason: str):
+        cls.state_writes_saved += 1
+        cls.log.debug(f"{reason}, a newer content is pending")
+        if cls.state_writes_saved % 100 == 0:
+            cls.log.info(f"{cls.state_writes_saved} state event writes saved by coalescing")
 
-    async def get_chat_data(self, room_id: RoomID) -> StateEventContent:
-        """It gets the chat status for a given room
+    @classmethod
+    def has_chat_status(cls, room_id: RoomID, status: str, agent: UserID = None) -> bool:
+        """It checks in the cache if the room already has the chat status
+
+        Parameters
+        ----------
+        room_id : RoomID
+            The room ID of the chat.
+        status : str
+            The chat status to check.
+        agent : UserID
+            The agent to check, if it is None only the status is checked.
+
+        Returns
+        -------
+            True if the cached chat status is the same, False otherwise or if it is not cached.
+
+        """
+        chat_data = cls.get_cached_chat_data(room_id)
+        if not chat_data or chat_data.get("status") != status:
+            return False
+
+        return not agent or chat_data.get("agent") == agent
+
+    @staticmethod
+    def _chat_data(content: StateEventContent | Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": content.get("status"),
+            "campaign_room_id": content.get("campaign_room_id"),
+            "agent": content.get("agent"),
+        }
+
+    @classmethod
+    def get_cached_chat_data(cls, room_id: RoomID) -> Dict[str, Any] | None:
+        """It gets the chat status of a room from the cache, None if it is not cached
+        or its entry has expired"""
+        cached = cls.CHAT_DATA.get(room_id)
+        if not cached:
+            return None
+
+        chat_data, expires = cached
+        if expires <= time.monotonic():
+            del cls.CHAT_DATA[room_id]
+            return None
+
+        cls.CHAT_DATA.move_to_end(room_id)
+        return chat_data
+
+    @classmethod
+    def cache_chat_data(cls, room_id: RoomID, content: StateEventContent | Dict[str, Any]):
+        """It saves the chat status of a room in the cache,
+        the resolved chats are removed from the cache
+
+        Parameters
+        ----------
+        room_id : RoomID
+            The room ID of the chat.
+        content : StateEventContent | Dict[str, Any]
+            The content of the chat status event.
+
+        """
+        if content.get("status") == cls.RESOLVED:
+            cls.CHAT_DATA.pop(room_id, None)
+            return
+
+        cls.CHAT_DATA[room_id] = (
+            cls._chat_data(content),
+            time.monotonic() + cls.config["acd.signaling.chat_data_ttl"],
+        )
+        cls.CHAT_DATA.move_to_end(room_id)
+        while len(cls.CHAT_DATA) > cls.config["acd.signaling.max_cached_chats"]:
+            cls.CHAT_DATA.popitem(last=False)
+
+    async def get_chat_data(self, room_id: RoomID) -> Dict[str, Any]:
+        """It gets the chat status for a given room,
+        the homeserver is only requested if the room is not in the cache
 
         Parameters
         ----------
@@ -199,6 +376,10 @@ class Signaling:
             The chat status event content.
 
         """
+        chat_data = self.get_cached_chat_data(room_id)
+        if chat_data:
+            return chat_data
+
         chat_status = None
         try:
             chat_status = await self.intent.get_state_event(
@@ -207,4 +388,8 @@ class Signaling:
         except Exception as e:
             self.log.error(f"Failed to get chat status {room_id}")
 
+        if chat_status:
+            self.cache_chat_data(room_id=room_id, content=chat_status)
+            return self._chat_data(chat_status)
+
         return chat_status
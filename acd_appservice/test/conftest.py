@@ -16,6 +16,7 @@ from pytest_mock import MockerFixture
 from ..commands.handler import CommandEvent, CommandProcessor
 from ..config import Config
 from ..db import upgrade_table
+from ..events.nats_publisher import NatsPublisher
 from ..matrix_room import MatrixRoom
 from ..portal import Portal
 from ..puppet import Puppet
@@ -82,6 +83,24 @@ async def acd_init(config: Config, db: Database):
         table.az = None
 
 
+@pytest.fixture
+def nats_publisher(mocker: MockerFixture, config: Config) -> NatsPublisher:
+    """NatsPublisher initialized with the config, its settings are restored after the test"""
+    for attr in [
+        "config",
+        "subject",
+        "partitions_enabled",
+        "partitions_by",
+        "partitions_count",
+        "payload_encoding",
+        "_nats_conn",
+        "_jetstream_conn",
+    ]:
+        mocker.patch.object(NatsPublisher, attr, getattr(NatsPublisher, attr))
+    NatsPublisher.init_cls(config)
+    return NatsPublisher
+
+
 @pytest_asyncio.fixture
 async def util(config: Config):
     return Util(config=config)
@@ -0,0 +1,39 @@
+import nest_asyncio
+import pytest
+
+from ..db.portal import PortalState
+from ..events import ACDConversationEvents, ACDEventTypes, ResolveEvent
+
+nest_asyncio.apply()
+
+
+def resolve_event(**kwargs) -> ResolveEvent:
+    data = {
+        "event_type": ACDEventTypes.CONVERSATION,
+        "event": ACDConversationEvents.Resolve,
+        "state": PortalState.RESOLVED,
+        "prev_state": PortalState.FOLLOWUP,
+        "sender": "@supervisor1:dominio_cliente.com",
+        "room_id": "!qVKwlyUXOCrBfZJOdh:example.com",
+        "acd": "@acd1:example.com",
+        "customer_mxid": "@mxwa_3123456789:example.com",
+        "agent_mxid": "@agent1:example.com",
+        "timestamp": 1677170000.123456,
+    }
+    data.update(kwargs)
+    return ResolveEvent(**data)
+
+
+@pytest.mark.asyncio
+class TestBaseEvent:
+    async def test_event_id_is_deterministic(self):
+        """The same event always generates the same id"""
+        assert resolve_event().event_id == resolve_event().event_id
+        assert resolve_event().serialize()["event_id"] == resolve_event().event_id
+
+    async def test_event_id_changes(self):
+        """Events of other rooms, transitions or timestamps have different ids"""
+        event_id = resolve_event().event_id
+        assert resolve_event(room_id="!other:example.com").event_id != event_id
+        assert resolve_event(prev_state=PortalState.PENDING).event_id != event_id
+        assert resolve_event(timestamp=1677170000.654321).event_id != event_id
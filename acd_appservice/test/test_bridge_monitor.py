@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..bridge_monitor import BridgeMonitor
+from ..client import ProvisionBridge
+from ..config import Config
+from ..db.bridge_status import BridgeStatus
+from ..puppet import Puppet
+
+nest_asyncio.apply()
+
+CONNECTED = {"whatsapp": {"conn": {"is_connected": True}, "phone": "+573123456789"}}
+DISCONNECTED = {"whatsapp": {"conn": None}, "error": "not logged in"}
+
+
+def make_puppet(n: int) -> MagicMock:
+    puppet = MagicMock()
+    puppet.custom_mxid = f"@acd{n}:example.com"
+    puppet.control_room_id = f"!control{n}:example.com"
+    puppet.bridge = "mautrix"
+    puppet.intent = AsyncMock()
+    puppet.save = AsyncMock()
+    return puppet
+
+
+@pytest.fixture
+def monitor(mocker: MockerFixture, config: Config):
+    mocker.patch.object(BridgeMonitor, "config", config)
+    mocker.patch.object(BridgeStatus, "upsert")
+
+
+@pytest.mark.asyncio
+class TestBridgeMonitor:
+    async def test_notice_only_on_change(self, mocker: MockerFixture, monitor):
+        """The control room is notified when the status changes, not on every ping"""
+        mocker.patch.object(ProvisionBridge, "ping", return_value=(200, CONNECTED))
+        previous = BridgeStatus(
+            puppet_mxid="@acd1:example.com",
+            bridge="mautrix",
+            is_connected=True,
+            response="{}",
+            checked_date=datetime(2023, 1, 1),
+            changed_date=datetime(2023, 1, 1),
+        )
+        mocker.patch.object(BridgeStatus, "get_by_puppet_mxid", return_value=previous)
+        puppet = make_puppet(1)
+
+        status = await BridgeMonitor.check(puppet)
+
+        assert status.is_connected
+        assert status.changed_date == datetime(2023, 1, 1)
+        assert puppet.phone == "573123456789"
+        puppet.intent.send_notice.assert_not_called()
+
+        ProvisionBridge.ping.return_value = (200, DISCONNECTED)
+        status = await BridgeMonitor.check(puppet)
+
+        assert not status.is_connected
+        assert status.changed_date > datetime(2023, 1, 1)
+        assert puppet.phone is None
+        puppet.intent.send_notice.assert_called_once()
+
+    async def test_check_puppets_concurrency(self, mocker: MockerFixture, monitor, config: Config):
+        """The pings run concurrently up to the limit and a failure does not stop the others"""
+        config["acd.bridge_monitor.concurrency"] = 2
+        running = 0
+        max_running = 0
+
+        async def ping(self, user_id):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if user_id == "@acd3:example.com":
+                raise Exception("timeout")
+            return 200, CONNECTED
+
+        mocker.patch.object(ProvisionBridge, "ping", ping)
+        mocker.patch.object(BridgeStatus, "get_by_puppet_mxid", return_value=None)
+
+        statuses = await BridgeMonitor.check_puppets([make_puppet(n) for n in range(1, 6)])
+
+        assert max_running == 2
+        assert [status.puppet_mxid for status in statuses] == [
+            "@acd1:example.com",
+            "@acd2:example.com",
+            "@acd4:example.com",
+            "@acd5:example.com",
+        ]
+
+    async def test_check_all_bridges(self, mocker: MockerFixture, monitor):
+        """All the puppets are checked except the gupshup ones"""
+        puppets = [make_puppet(n) for n in range(1, 4)]
+        puppets[1].bridge = "instagram"
+        puppets[2].bridge = "gupshup"
+
+        async def all_with_custom_mxid():
+            for puppet in puppets:
+                yield puppet
+
+        mocker.patch.object(Puppet, "all_with_custom_mxid", all_with_custom_mxid)
+        check = mocker.patch.object(BridgeMonitor, "check_puppets", AsyncMock(return_value=[]))
+
+        await BridgeMonitor.check_all()
+
+        assert check.call_args.kwargs["puppets"] == puppets[:2]
+
+    async def test_status_age(self):
+        status = BridgeStatus(
+            puppet_mxid="@acd1:example.com",
+            bridge="instagram",
+            is_connected=True,
+            response="{}",
+            checked_date=datetime.now(timezone.utc) - timedelta(seconds=120),
+            changed_date=datetime(2023, 1, 1),
+        )
+
+        assert status.is_older_than(60)
+        assert not status.is_older_than(300)
@@ -0,0 +1,201 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..bulk_sender import BulkSender, RateLimiter
+from ..config import Config
+from ..db.job import Job, JobStatus
+from ..job_manager import JobManager
+from ..message import Message
+
+nest_asyncio.apply()
+
+
+@pytest.fixture
+def bulk_sender(mocker: MockerFixture, config: Config) -> BulkSender:
+    config["acd.bulk_send.rate_limits"] = {"default": 0}
+    config["acd.jobs.save_interval"] = 0
+    mocker.patch.object(BulkSender, "config", config)
+    mocker.patch.object(BulkSender, "RATE_LIMITERS", {})
+    mocker.patch.object(Message, "tracked_events", None)
+    mocker.patch.object(JobManager, "JOBS", {})
+    mocker.patch.object(JobManager, "TASKS", {})
+    mocker.patch.object(JobManager, "LAST_SAVES", {})
+    mocker.patch.object(JobManager, "config", None)
+    mocker.patch.object(JobManager, "semaphore", None)
+    mocker.patch.object(JobManager, "stopping", False)
+    mocker.patch.object(Job, "insert", AsyncMock())
+    mocker.patch.object(Job, "update", AsyncMock())
+    JobManager.init_cls(config)
+    return BulkSender
+
+
+@pytest.fixture
+def puppet() -> MagicMock:
+    return MagicMock(custom_mxid="@acd1:example.com", bridge="mautrix")
+
+
+def recipients(count: int) -> list:
+    return [{"phone": f"+57300000000{n}", "message": "Hello"} for n in range(count)]
+
+
+async def sent(puppet, phone: str, message: str, msg_type: str):
+    if phone.endswith("3"):
+        return 422, {"error": f"The server said {phone} is not on WhatsApp"}
+    return 201, {"event_id": f"$event{phone}", "room_id": f"!room{phone}:example.com"}
+
+
+@pytest.mark.asyncio
+class TestBulkSender:
+    async def test_run_job(self, mocker: MockerFixture, bulk_sender: BulkSender, puppet):
+        """The messages are sent and the sent ones are saved in batches"""
+        bulk_sender.config["acd.bulk_send.insert_batch_size"] = 2
+        mocker.patch.object(BulkSender, "send_message", side_effect=sent)
+        insert_many = mocker.patch.object(Message, "insert_many", AsyncMock())
+
+        job = await BulkSender.submit_job(
+            puppet=puppet,
+            recipients=recipients(5),
+            msg_type="text",
+            created_by="@supervisor:example.com",
+        )
+        assert await JobManager.get_job(job.id) is job
+        await JobManager.TASKS[job.id]
+
+        data = job.serialize()
+        assert (data["kind"], data["status"], data["created_by"]) == (
+            "bulk_send",
+            "finished",
+            "@supervisor:example.com",
+        )
+        assert (data["total"], data["done"], data["failed"], data["pending"]) == (5, 4, 1, 0)
+        assert data["result"] == {
+            "puppet_mxid": "@acd1:example.com",
+            "bridge": "mautrix",
+            "errors": [
+                {
+                    "phone": "+573000000003",
+                    "error": "The server said +573000000003 is not on WhatsApp",
+                }
+            ],
+        }
+        assert [len(call.args[0]) for call in insert_many.call_args_list] == [2, 2]
+        assert not JobManager.TASKS
+
+    async def test_concurrency(self, mocker: MockerFixture, bulk_sender: BulkSender, puppet):
+        """No more than `concurrency` recipients are processed at the same time"""
+        bulk_sender.config["acd.bulk_send.concurrency"] = 3
+        mocker.patch.object(Message, "insert_many", AsyncMock())
+        running = 0
+        max_running = 0
+
+        async def slow_send(**kwargs):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return await sent(**kwargs)
+
+        mocker.patch.object(BulkSender, "send_message", side_effect=slow_send)
+
+        job = await BulkSender.submit_job(
+            puppet=puppet, recipients=recipients(10), msg_type="text"
+        )
+        await JobManager.TASKS[job.id]
+
+        assert max_running == 3
+        assert job.done + job.failed == 10
+
+    async def test_cancel_saves_sent_messages(
+        self, mocker: MockerFixture, bulk_sender: BulkSender, puppet
+    ):
+        """The messages sent before cancelling the job are saved"""
+        insert_many = mocker.patch.object(Message, "insert_many", AsyncMock())
+
+        async def send(**kwargs):
+            if kwargs["phone"].endswith("2"):
+                await asyncio.sleep(10)
+            return await sent(**kwargs)
+
+        mocker.patch.object(BulkSender, "send_message", side_effect=send)
+        bulk_sender.config["acd.bulk_send.concurrency"] = 1
+
+        job = await BulkSender.submit_job(puppet=puppet, recipients=recipients(5), msg_type="text")
+        await asyncio.sleep(0.01)
+        await JobManager.cancel(job.id)
+
+        assert job.status == JobStatus.CANCELLED
+        assert job.done == 2
+        assert len(insert_many.call_args.args[0]) == 2
+
+    async def test_track_before_saving(
+        self, mocker: MockerFixture, bulk_sender: BulkSender, puppet
+    ):
+        """The sent messages are tracked at once and saved every `flush_interval`
+        seconds when the batch is not full"""
+        bulk_sender.config["acd.bulk_send.flush_interval"] = 0.01
+        mocker.patch.object(Message, "tracked_events", set())
+        insert_many = mocker.patch.object(Message, "insert_many", AsyncMock())
+        release = asyncio.Event()
+
+        async def send(**kwargs):
+            if kwargs["phone"].endswith("1"):
+                await release.wait()
+            return await sent(**kwargs)
+
+        mocker.patch.object(BulkSender, "send_message", side_effect=send)
+        bulk_sender.config["acd.bulk_send.concurrency"] = 1
+
+        job = await BulkSender.submit_job(puppet=puppet, recipients=recipients(2), msg_type="text")
+        await asyncio.sleep(0.05)
+
+        assert Message.tracked_events == {"$event+573000000000"}
+        assert [len(call.args[0]) for call in insert_many.call_args_list] == [1]
+
+        release.set()
+        await JobManager.TASKS[job.id]
+
+        assert [len(call.args[0]) for call in insert_many.call_args_list] == [1, 1]
+
+    async def test_retry_failed_batch(
+        self, mocker: MockerFixture, bulk_sender: BulkSender, puppet
+    ):
+        """A batch that can not be saved is saved again with the next one"""
+        bulk_sender.config["acd.bulk_send.insert_batch_size"] = 2
+        bulk_sender.config["acd.bulk_send.flush_interval"] = 60
+        mocker.patch.object(BulkSender, "send_message", side_effect=sent)
+        insert_many = mocker.patch.object(
+            Message, "insert_many", AsyncMock(side_effect=[Exception("timeout"), None, None])
+        )
+
+        job = await BulkSender.submit_job(puppet=puppet, recipients=recipients(3), msg_type="text")
+        await JobManager.TASKS[job.id]
+
+        assert [len(call.args[0]) for call in insert_many.call_args_list] == [2, 3]
+        assert job.done == 3
+
+
+@pytest.mark.asyncio
+class TestRateLimiter:
+    async def test_wait(self, mocker: MockerFixture):
+        """The calls are spaced by the interval of the rate"""
+        mocker.patch("acd_appservice.bulk_sender.time.monotonic", return_value=100.0)
+        sleep = mocker.patch("acd_appservice.bulk_sender.asyncio.sleep", AsyncMock())
+        rate_limiter = RateLimiter(rate=10)
+
+        for _ in range(3):
+            await rate_limiter.wait()
+
+        assert [call.args[0] for call in sleep.call_args_list] == pytest.approx([0.1, 0.2])
+
+    async def test_disabled(self, mocker: MockerFixture):
+        """A rate of 0 does not wait"""
+        sleep = mocker.patch("acd_appservice.bulk_sender.asyncio.sleep", AsyncMock())
+
+        await RateLimiter(rate=0).wait()
+
+        sleep.assert_not_called()
@@ -0,0 +1,96 @@
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..db.event_outbox import EventOutbox
+from ..db.portal import Portal, PortalState
+from ..db.puppet import Puppet
+from ..db.queue_membership import QueueMembership, QueueMembershipState
+
+nest_asyncio.apply()
+
+
+@pytest.fixture
+def db(mocker: MockerFixture) -> AsyncMock:
+    db = AsyncMock()
+    for table in [Portal, Puppet, QueueMembership]:
+        mocker.patch.object(table, "db", db, create=True)
+    return db
+
+
+def puppet_row() -> dict:
+    return {
+        "pk": 1,
+        "email": "acd1@example.com",
+        "phone": "573001234567",
+        "bridge": "mautrix",
+        "destination": None,
+        "photo_mxc": None,
+        "name_set": False,
+        "avatar_set": False,
+        "is_registered": True,
+        "custom_mxid": "@acd1:example.com",
+        "access_token": "token",
+        "next_batch": None,
+        "base_url": None,
+        "control_room_id": "!control:example.com",
+    }
+
+
+@pytest.mark.asyncio
+class TestDirtyFields:
+    async def test_update_changed_column(self, db: AsyncMock):
+        """Only the changed columns are updated"""
+        puppet = Puppet._from_row(puppet_row())
+        puppet.phone = "573007654321"
+
+        await puppet.update()
+
+        db.execute.assert_called_once_with(
+            "UPDATE puppet SET phone=$2 WHERE custom_mxid=$1",
+            "@acd1:example.com",
+            "573007654321",
+        )
+
+    async def test_update_without_changes(self, db: AsyncMock):
+        """A row without changes is not updated"""
+        puppet = Puppet._from_row(puppet_row())
+        puppet.phone = "573007654321"
+        await puppet.update()
+        await puppet.update()
+
+        assert db.execute.call_count == 1
+
+    async def test_update_unknown_row(self, db: AsyncMock):
+        """All the columns are updated if the saved values are unknown"""
+        membership = QueueMembership(
+            id=1, fk_user=2, fk_queue=3, creation_date=datetime.utcnow(), paused=True
+        )
+
+        await membership.update()
+
+        q, *args = db.execute.call_args.args
+        assert q.startswith(
+            "UPDATE queue_membership SET creation_date=$3, state_date=$4, pause_date=$5, "
+            "pause_reason=$6, state=$7, paused=$8"
+        )
+        assert args[:2] == [2, 3]
+        assert args[-2:] == [QueueMembershipState.OFFLINE.value, True]
+
+    async def test_update_outbox_only(self, db: AsyncMock):
+        """If the portal has not changed only the outbox events are inserted"""
+        portal = Portal(room_id="!room:example.com", state=PortalState.START)
+        portal._mark_as_saved()
+        event = EventOutbox(
+            subject="acd.CONVERSATION", payload="{}", creation_date=datetime.utcnow()
+        )
+
+        await portal.update(outbox=[event])
+
+        q, *args = db.execute.call_args.args
+        assert q.startswith("INSERT INTO event_outbox")
+        assert "$1::TEXT[]" in q
+        assert len(args) == 5
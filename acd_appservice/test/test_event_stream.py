@@ -0,0 +1,185 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import nest_asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..events import ACDConversationEvents, ACDEventTypes, ACDMemberEvents, EventStream
+from ..events.conversation_events import ConversationEvent
+from ..events.member_events import MemberLoginEvent
+from ..events.nats_publisher import NatsPublisher
+from ..events.outbox_flusher import OutboxFlusher
+from ..portal import Portal, PortalState
+from ..portal_writer import PortalWriter
+from ..web.api import misc
+
+nest_asyncio.apply()
+
+QUEUE = "!queue1:example.com"
+
+
+def member_event(mxid: str = "@agent1:example.com", queue: str = QUEUE) -> dict:
+    return {
+        "event_type": "MEMBER",
+        "event": "MemberLogin",
+        "queue": queue,
+        "member": {"mxid": mxid},
+        "event_id": "1a2b3c",
+    }
+
+
+@pytest.fixture
+def event_stream(mocker: MockerFixture, config: Config) -> EventStream:
+    mocker.patch.object(EventStream, "config", config)
+    mocker.patch.object(EventStream, "SUBSCRIBERS", set())
+    return EventStream
+
+
+@pytest.mark.asyncio
+class TestEventStream:
+    async def test_filters(self, event_stream: EventStream):
+        """The subscribers only get the events that match all their filters"""
+        by_queue = event_stream.subscribe(queues=[QUEUE], event_types=["MEMBER"])
+        by_member = event_stream.subscribe(members=["@agent2:example.com"])
+        by_room = event_stream.subscribe(room_ids=["!room1:example.com"])
+
+        event_stream.publish(member_event())
+        event_stream.publish(member_event(mxid="@agent2:example.com", queue="!queue2:a.com"))
+
+        assert by_queue.buffer.qsize() == 1
+        assert (await by_member.get())["queue"] == "!queue2:a.com"
+        assert by_room.buffer.empty()
+
+    async def test_drop_slow_subscriber(self, event_stream: EventStream, config: Config):
+        """A subscriber with a full buffer is dropped and its reader gets None"""
+        config["acd.event_stream.max_buffer"] = 2
+        slow = event_stream.subscribe()
+        fast = event_stream.subscribe()
+
+        for _ in range(2):
+            event_stream.publish(member_event())
+            await fast.get()
+        event_stream.publish(member_event())
+
+        assert slow.dropped
+        assert await slow.get() is None
+        assert event_stream.SUBSCRIBERS == {fast}
+        assert fast.buffer.qsize() == 1
+
+    async def test_max_subscribers(self, event_stream: EventStream, config: Config):
+        config["acd.event_stream.max_subscribers"] = 1
+        assert event_stream.subscribe()
+        assert event_stream.subscribe() is None
+
+    async def test_send_publishes_event(self, mocker: MockerFixture, event_stream: EventStream):
+        """The events sent to NATS are published to the stream too"""
+        mocker.patch.object(OutboxFlusher, "is_enabled", return_value=True)
+        mocker.patch.object(MemberLoginEvent, "send_to_outbox", AsyncMock())
+        subscriber = event_stream.subscribe(events=["MemberLogin"])
+
+        await MemberLoginEvent(
+            event_type=ACDEventTypes.MEMBER,
+            event=ACDMemberEvents.MemberLogin,
+            sender="@agent1:example.com",
+            queue=QUEUE,
+            member={"mxid": "@agent1:example.com"},
+            timestamp=1677170000.0,
+        ).send()
+
+        event = await subscriber.get()
+        assert event["event"] == "MemberLogin"
+        assert event["queue"] == QUEUE
+
+    async def test_portal_save_with_outbox(
+        self, mocker: MockerFixture, event_stream: EventStream, nats_publisher: NatsPublisher
+    ):
+        """The conversation events stored in the outbox with the portal are streamed
+        once the portal is saved"""
+        mocker.patch.object(OutboxFlusher, "is_enabled", return_value=True)
+        mocker.patch.object(PortalWriter, "is_enabled", return_value=False)
+        mocker.patch.object(Portal, "by_room_id", {})
+        mocker.patch.object(Portal, "by_id", {})
+        update = mocker.patch.object(Portal, "update")
+        mocker.patch.object(ConversationEvent, "save_to_file")
+        subscriber = event_stream.subscribe(event_types=["CONVERSATION"])
+        portal = Portal(room_id="!room1:example.com", state=PortalState.ENQUEUED)
+        event = ConversationEvent(
+            event_type=ACDEventTypes.CONVERSATION,
+            event=ACDConversationEvents.EnterQueue,
+            room_id=portal.room_id,
+            sender="@acd1:example.com",
+            acd="@acd1:example.com",
+            customer_mxid="@customer:example.com",
+            state=PortalState.ENQUEUED,
+            prev_state=PortalState.ON_DISTRIBUTION,
+            timestamp=1677170000.0,
+        )
+
+        await portal.save(events=[event])
+
+        assert len(update.call_args.kwargs["outbox"]) == 1
+        streamed = await subscriber.get()
+        assert streamed["room_id"] == "!room1:example.com"
+        assert streamed["event"] == "EnterQueue"
+
+    async def test_endpoint(
+        self, mocker: MockerFixture, event_stream: EventStream, config: Config
+    ):
+        """The endpoint writes the matching events as server-sent events"""
+        config["acd.event_stream.keepalive_interval"] = 0.1
+        mocker.patch.object(
+            misc,
+            "_resolve_user_identifier",
+            AsyncMock(return_value=MagicMock(is_admin=False, is_supervisor=True)),
+        )
+        app = web.Application()
+        app.router.add_get("/v1/events/stream", misc.events_stream)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get("/v1/events/stream", params={"queues": QUEUE})
+            assert response.headers["Content-Type"] == "text/event-stream"
+            while not event_stream.SUBSCRIBERS:
+                await asyncio.sleep(0)
+
+            event_stream.publish(member_event(queue="!queue2:example.com"))
+            event_stream.publish(member_event())
+            lines = [await response.content.readline() for _ in range(3)]
+            response.close()
+
+        assert lines[0] == b"id: 1a2b3c\n"
+        assert lines[1] == b"event: MEMBER\n"
+        assert json.loads(lines[2].decode().removeprefix("data: ")) == member_event()
+
+    async def test_endpoint_by_role(
+        self, mocker: MockerFixture, event_stream: EventStream, config: Config
+    ):
+        """The agents only get their own events and the other users are forbidden"""
+        config["acd.event_stream.keepalive_interval"] = 0.01
+        caller = MagicMock(
+            is_admin=False, is_supervisor=False, is_agent=True, mxid="@agent1:example.com"
+        )
+        mocker.patch.object(misc, "_resolve_user_identifier", AsyncMock(return_value=caller))
+        app = web.Application()
+        app.router.add_get("/v1/events/stream", misc.events_stream)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(
+                "/v1/events/stream", params={"members": "@agent2:example.com"}
+            )
+            while not event_stream.SUBSCRIBERS:
+                await asyncio.sleep(0)
+
+            (subscriber,) = event_stream.SUBSCRIBERS
+            assert subscriber.members == {"@agent1:example.com"}
+            response.close()
+            while event_stream.SUBSCRIBERS:
+                await asyncio.sleep(0.01)
+
+            caller.is_agent = False
+            response = await client.get("/v1/events/stream")
+            assert response.status == 403
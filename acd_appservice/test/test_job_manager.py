@@ -0,0 +1,187 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..commands.resolve import BulkResolve
+from ..config import Config
+from ..db.job import Job, JobStatus
+from ..job_manager import JobManager
+
+nest_asyncio.apply()
+
+
+@pytest.fixture
+def job_manager(mocker: MockerFixture, config: Config) -> JobManager:
+    config["acd.jobs.concurrency"] = 2
+    config["acd.jobs.save_interval"] = 0
+    mocker.patch.object(JobManager, "JOBS", {})
+    mocker.patch.object(JobManager, "TASKS", {})
+    mocker.patch.object(JobManager, "LAST_SAVES", {})
+    mocker.patch.object(JobManager, "config", None)
+    mocker.patch.object(JobManager, "semaphore", None)
+    mocker.patch.object(JobManager, "stopping", False)
+    mocker.patch.object(Job, "insert", AsyncMock())
+    mocker.patch.object(Job, "update", AsyncMock())
+    JobManager.init_cls(config)
+    return JobManager
+
+
+@pytest.mark.asyncio
+class TestJobManager:
+    async def test_run_job(self, job_manager: JobManager):
+        """The progress and the result of the job are saved"""
+
+        async def run(job: Job):
+            await JobManager.progress(job, done=2)
+            await JobManager.progress(job, failed=1)
+            return {"not_resolved": ["!room3:example.com"]}
+
+        job = await JobManager.submit(
+            kind="bulk_resolve", run=run, total=3, created_by="@supervisor:example.com"
+        )
+        assert job.status == JobStatus.PENDING
+        assert await JobManager.get_job(job.id) is job
+        Job.insert.assert_awaited_once()
+
+        await JobManager.TASKS[job.id]
+
+        data = job.serialize()
+        assert data["status"] == "finished"
+        assert (data["total"], data["done"], data["failed"], data["pending"]) == (3, 2, 1, 0)
+        assert data["result"] == {"not_resolved": ["!room3:example.com"]}
+        assert data["created_by"] == "@supervisor:example.com"
+        # Running, the two progress updates and finished
+        assert Job.update.await_count == 4
+        assert not JobManager.JOBS
+        assert not JobManager.TASKS
+
+    async def test_save_interval(self, job_manager: JobManager):
+        """The progress is not saved again until `save_interval` has passed"""
+        job_manager.config["acd.jobs.save_interval"] = 60
+
+        async def run(job: Job):
+            for _ in range(10):
+                await JobManager.progress(job, done=1)
+
+        job = await JobManager.submit(kind="bulk_resolve", run=run, total=10)
+        await JobManager.TASKS[job.id]
+
+        assert job.done == 10
+        # Running and finished
+        assert Job.update.await_count == 2
+
+    async def test_concurrency(self, job_manager: JobManager):
+        """No more than `concurrency` jobs run at the same time, the rest are pending"""
+        running = 0
+        max_running = 0
+        release = asyncio.Event()
+
+        async def run(job: Job):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await release.wait()
+            running -= 1
+
+        jobs = [await JobManager.submit(kind="queue_set", run=run, total=1) for _ in range(5)]
+        await asyncio.sleep(0.01)
+
+        statuses = [job.status for job in jobs]
+        assert statuses.count(JobStatus.RUNNING) == 2
+        assert statuses.count(JobStatus.PENDING) == 3
+
+        release.set()
+        await asyncio.gather(*JobManager.TASKS.values())
+
+        assert max_running == 2
+        assert all(job.status == JobStatus.FINISHED for job in jobs)
+
+    async def test_failed_job(self, job_manager: JobManager):
+        async def run(job: Job):
+            raise ValueError("The queue has not been found")
+
+        job = await JobManager.submit(kind="queue_delete", run=run, total=1)
+        await asyncio.gather(JobManager.TASKS[job.id])
+
+        assert job.status == JobStatus.FAILED
+        assert job.error == "The queue has not been found"
+
+    async def test_cancel(self, job_manager: JobManager):
+        """The cancelled jobs keep the progress made before the cancellation"""
+
+        async def run(job: Job):
+            await JobManager.progress(job, done=1)
+            await asyncio.sleep(60)
+
+        job = await JobManager.submit(kind="bulk_resolve", run=run, total=2)
+        await asyncio.sleep(0.01)
+
+        assert await JobManager.cancel(job.id) is job
+        assert job.status == JobStatus.CANCELLED
+        assert job.done == 1
+        assert not JobManager.JOBS
+        # The finished jobs can not be cancelled
+        assert await JobManager.cancel(job.id) is None
+
+    async def test_stop(self, job_manager: JobManager):
+        """The jobs cancelled by the stop of the ACD are interrupted"""
+        job = await JobManager.submit(kind="bulk_resolve", run=lambda _: asyncio.sleep(60))
+        await asyncio.sleep(0.01)
+
+        await JobManager.stop()
+
+        assert job.status == JobStatus.INTERRUPTED
+        Job.update.assert_awaited()
+
+    async def test_is_full(self, job_manager: JobManager):
+        job_manager.config["acd.jobs.max_jobs"] = 1
+        assert not JobManager.is_full()
+
+        job = await JobManager.submit(kind="bulk_resolve", run=lambda _: asyncio.sleep(60))
+        assert JobManager.is_full()
+
+        # It is cancelled before it starts
+        await JobManager.cancel(job.id)
+        assert job.status == JobStatus.CANCELLED
+        assert not JobManager.is_full()
+
+
+@pytest.mark.asyncio
+class TestBulkResolve:
+    async def test_resolve_progress(
+        self, mocker: MockerFixture, job_manager: JobManager, config: Config
+    ):
+        """The rooms are resolved in blocks and the job gets the progress of each block"""
+        config["acd.bulk_resolve.block_size"] = 2
+        bulk_resolve = BulkResolve(config=config, commands=MagicMock())
+        resolve_room = mocker.patch.object(
+            bulk_resolve,
+            "resolve_room",
+            AsyncMock(side_effect=lambda room_id, **kwargs: room_id != "!room3:example.com"),
+        )
+        progress = mocker.spy(JobManager, "progress")
+        room_ids = [f"!room{n}:example.com" for n in range(1, 6)]
+
+        async def run(job: Job):
+            return await bulk_resolve.resolve(
+                room_ids=room_ids + room_ids[:1],
+                user=MagicMock(),
+                user_id="@supervisor:example.com",
+                send_message="no",
+                job=job,
+            )
+
+        job = await JobManager.submit(kind="bulk_resolve", run=run, total=len(room_ids))
+        await JobManager.TASKS[job.id]
+
+        assert resolve_room.await_count == 5
+        assert [call.kwargs for call in progress.call_args_list] == [
+            {"done": 2, "failed": 0},
+            {"done": 1, "failed": 1},
+            {"done": 1, "failed": 0},
+        ]
+        assert job.serialize()["result"] == {"not_resolved": ["!room3:example.com"]}
+        assert (job.done, job.failed) == (4, 1)
@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock
+
+import nest_asyncio
+import pytest
+from mautrix.types import ReceiptEvent
+from pytest_mock import MockerFixture
+
+from .. import acd_program  # noqa: F401, it must be imported before the matrix handler
+from ..config import Config
+from ..matrix_handler import MatrixHandler
+from ..message import Message
+from ..util import BloomFilter
+
+nest_asyncio.apply()
+
+ROOM_ID = "!qVKwlyUXOCrBfZJOdh:example.com"
+CUSTOMER = "@mx_573123456789:example.com"
+OTHER_CUSTOMER = "@mx_573987654321:example.com"
+AGENT = "@agent1:example.com"
+
+
+@pytest.fixture
+def matrix_handler(config: Config) -> MatrixHandler:
+    acd_appservice = MagicMock()
+    acd_appservice.config = config
+    return MatrixHandler(acd_appservice=acd_appservice)
+
+
+def receipt_event(content: dict) -> ReceiptEvent:
+    return ReceiptEvent.deserialize({"type": "m.receipt", "room_id": ROOM_ID, "content": content})
+
+
+@pytest.mark.asyncio
+class TestReadReceipts:
+    async def test_latest_receipt_per_receiver(
+        self, matrix_handler: MatrixHandler, mocker: MockerFixture
+    ):
+        """Only the latest tracked receipt of each customer is saved, with a single update"""
+        get_tracked = mocker.patch.object(
+            Message, "get_tracked_event_ids", return_value={"$event1", "$event2", "$event3"}
+        )
+        mark_as_read = mocker.patch.object(Message, "mark_as_read_many")
+        evt = receipt_event(
+            {
+                "$event1": {"m.read": {CUSTOMER: {"ts": 1000}, AGENT: {"ts": 1000}}},
+                "$event2": {"m.read": {CUSTOMER: {"ts": 3000}}},
+                "$event3": {"m.read.private": {OTHER_CUSTOMER: {"ts": 2000}}},
+                "$untracked": {"m.read": {CUSTOMER: {"ts": 4000}}},
+            }
+        )
+
+        await matrix_handler.handle_ephemeral_event(evt)
+
+        assert get_tracked.call_count == 1
+        assert set(get_tracked.call_args.args[0]) == {
+            "$event1",
+            "$event2",
+            "$event3",
+            "$untracked",
+        }
+        assert mark_as_read.call_count == 1
+        assert mark_as_read.call_args.kwargs["room_id"] == ROOM_ID
+        assert sorted(mark_as_read.call_args.kwargs["receipts"]) == [
+            ("$event2", "+573123456789", 3),
+            ("$event3", "+573987654321", 2),
+        ]
+
+    async def test_receipts_without_customers(
+        self, matrix_handler: MatrixHandler, mocker: MockerFixture
+    ):
+        """The receipts of the agents do not query the database"""
+        get_tracked = mocker.patch.object(Message, "get_tracked_event_ids")
+        mark_as_read = mocker.patch.object(Message, "mark_as_read_many")
+
+        await matrix_handler.handle_ephemeral_event(
+            receipt_event({"$event1": {"m.read": {AGENT: {"ts": 1000}}}})
+        )
+
+        assert get_tracked.call_count == 0
+        assert mark_as_read.call_count == 0
+
+    async def test_untracked_receipts_skip_database(
+        self, matrix_handler: MatrixHandler, mocker: MockerFixture
+    ):
+        """The receipts of the messages that are not in the tracked filter do not query the db"""
+        tracked_events = BloomFilter(capacity=100)
+        tracked_events.add("$event1")
+        mocker.patch.object(Message, "tracked_events", tracked_events)
+        mocker.patch.object(Message, "tracked_events_loaded", True)
+        get_tracked = mocker.patch.object(Message, "get_tracked_event_ids")
+        mocker.patch.object(Message, "mark_as_read_many")
+
+        await matrix_handler.handle_ephemeral_event(
+            receipt_event({"$untracked": {"m.read": {CUSTOMER: {"ts": 1000}}}})
+        )
+
+        assert get_tracked.call_count == 0
@@ -0,0 +1,76 @@
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..message import Message
+from ..util import BloomFilter
+
+nest_asyncio.apply()
+
+ROOM_ID = "!qVKwlyUXOCrBfZJOdh:example.com"
+
+
+class TestBloomFilter:
+    def test_added_items_are_found(self):
+        """There are no false negatives"""
+        bloom_filter = BloomFilter(capacity=1000)
+        event_ids = [f"$event{n}" for n in range(1000)]
+        for event_id in event_ids:
+            bloom_filter.add(event_id)
+
+        assert all(event_id in bloom_filter for event_id in event_ids)
+        assert len(bloom_filter) == 1000
+        assert not bloom_filter.is_full
+
+    def test_error_rate(self):
+        """The false positives are close to the error rate while the capacity is not exceeded"""
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        for n in range(1000):
+            bloom_filter.add(f"$event{n}")
+
+        false_positives = sum(f"$other{n}" in bloom_filter for n in range(10000))
+
+        assert false_positives < 300
+
+
+@pytest.mark.asyncio
+class TestTrackedMessages:
+    async def test_filter_disabled(self, mocker: MockerFixture, config: Config):
+        """Without the filter every event may be tracked"""
+        config["acd.tracked_messages_filter.enabled"] = False
+        mocker.patch.object(Message, "config", None, create=True)
+        mocker.patch.object(Message, "tracked_events", None)
+        Message.init_cls(config)
+
+        await Message.load_tracked_events()
+
+        assert Message.tracked_events is None
+        assert Message.is_tracked("$event1")
+
+    async def test_load_and_insert(self, mocker: MockerFixture, config: Config):
+        """The saved messages and the new ones are tracked once the filter is loaded"""
+        mocker.patch.object(Message, "config", None, create=True)
+        mocker.patch.object(Message, "tracked_events", None)
+        mocker.patch.object(Message, "tracked_events_loaded", False)
+        get_event_ids = mocker.patch.object(
+            Message, "get_event_ids", side_effect=[["$event1", "$event2"], ["$event3"], []]
+        )
+        mocker.patch.object(Message, "insert")
+        Message.init_cls(config)
+
+        # Until the filter is loaded every event may be tracked
+        assert Message.is_tracked("$untracked")
+
+        await Message.load_tracked_events()
+        await Message.insert_msg(
+            event_id="$event4",
+            room_id=ROOM_ID,
+            sender="@acd1:example.com",
+            receiver="+573123456789",
+            timestamp_send=1000,
+        )
+
+        assert get_event_ids.call_args_list[1].kwargs == {"after": "$event2"}
+        assert all(Message.is_tracked(f"$event{n}") for n in range(1, 5))
+        assert not Message.is_tracked("$untracked")
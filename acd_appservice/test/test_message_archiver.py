@@ -0,0 +1,60 @@
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.message import Message as DBMessage
+from ..message_archiver import MessageArchiver
+
+nest_asyncio.apply()
+
+
+@pytest.fixture
+def archiver_config(mocker: MockerFixture, config: Config) -> Config:
+    config["acd.message_retention.enabled"] = True
+    config["acd.message_retention.batch_size"] = 10
+    mocker.patch.object(MessageArchiver, "config", config)
+    mocker.patch("acd_appservice.message_archiver.asyncio.sleep")
+    return config
+
+
+@pytest.mark.asyncio
+class TestMessageArchiver:
+    async def test_archive_in_batches(self, mocker: MockerFixture, archiver_config: Config):
+        """The old messages are archived until a batch is not full"""
+        archive = mocker.patch.object(DBMessage, "archive_sent_before", side_effect=[10, 10, 3])
+        delete = mocker.patch.object(DBMessage, "delete_sent_before", return_value=2)
+
+        assert await MessageArchiver.run() == (23, 2)
+
+        assert archive.call_count == 3
+        assert archive.call_args.kwargs["limit"] == 10
+        # The old archived messages are deleted from the archive only
+        delete.assert_called_once()
+        assert delete.call_args.kwargs["table"] == "message_archive"
+
+    async def test_delete_without_archive(self, mocker: MockerFixture, archiver_config: Config):
+        """Without archive the old messages are deleted and the archive is not touched"""
+        archiver_config["acd.message_retention.archive"] = False
+        archiver_config["acd.message_retention.archive_retention_days"] = 0
+        archive = mocker.patch.object(DBMessage, "archive_sent_before")
+        delete = mocker.patch.object(DBMessage, "delete_sent_before", side_effect=[10, 4])
+
+        assert await MessageArchiver.run() == (0, 14)
+
+        assert archive.call_count == 0
+        assert all("table" not in call.kwargs for call in delete.call_args_list)
+
+    async def test_archive_counts_moved_rows(self, mocker: MockerFixture):
+        """The archived rows replace the ones already in the archive
+        and the count is of the rows removed from message"""
+        db = mocker.patch.object(DBMessage, "db", AsyncMock(), create=True)
+        db.fetchval.return_value = 10
+
+        assert await DBMessage.archive_sent_before(timestamp=1000, limit=10) == 10
+
+        query = db.fetchval.call_args.args[0]
+        assert "ON CONFLICT (event_id) DO UPDATE SET" in query
+        assert query.endswith("SELECT count(*) FROM archived")
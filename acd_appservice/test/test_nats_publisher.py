@@ -0,0 +1,48 @@
+import msgpack
+import nest_asyncio
+import pytest
+
+from ..config import Config
+from ..events.nats_publisher import NatsPublisher
+
+nest_asyncio.apply()
+
+
+@pytest.mark.asyncio
+class TestNatsPublisher:
+    async def test_get_subject(self, nats_publisher: NatsPublisher):
+        """Without partitions the subject only has the event type"""
+        assert NatsPublisher.get_subject("CONVERSATION", "@acd1:example.com") == (
+            "acd.client.CONVERSATION"
+        )
+        assert NatsPublisher.get_stream_subjects() == ["acd.client.*"]
+
+    async def test_get_subject_with_partitions(
+        self, nats_publisher: NatsPublisher, config: Config
+    ):
+        """The events of the same puppet are always published in the same partition"""
+        config["nats.partitions.enabled"] = True
+        config["nats.partitions.count"] = 4
+        NatsPublisher.init_cls(config)
+
+        subject = NatsPublisher.get_subject("CONVERSATION", "@acd1:example.com")
+        prefix, partition = subject.rsplit(".", 1)
+
+        assert prefix == "acd.client.CONVERSATION"
+        assert 0 <= int(partition) < 4
+        assert NatsPublisher.get_subject("CONVERSATION", "@acd1:example.com") == subject
+        assert NatsPublisher.get_stream_subjects() == ["acd.client.*", "acd.client.*.*"]
+
+    async def test_encode_payload(self, nats_publisher: NatsPublisher, config: Config):
+        """The payload is encoded with the configured encoding"""
+        data = {"event": "Resolve", "timestamp": 1677170000.123456}
+        assert (
+            NatsPublisher.encode_payload(data)
+            == b'{"event": "Resolve", "timestamp": 1677170000.123456}'
+        )
+        assert NatsPublisher.get_headers("f0e1") == {"Nats-Msg-Id": "f0e1"}
+
+        config["nats.payload_encoding"] = NatsPublisher.MSGPACK
+        NatsPublisher.init_cls(config)
+        assert msgpack.unpackb(NatsPublisher.encode_payload(data)) == data
+        assert NatsPublisher.get_headers(None) == {"Content-Type": "application/msgpack"}
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.event_outbox import EventOutbox
+from ..events.nats_publisher import NatsPublisher
+from ..events.outbox_flusher import OutboxFlusher
+
+nest_asyncio.apply()
+
+
+@pytest.fixture(autouse=True)
+def outbox_flusher(mocker: MockerFixture, config: Config, nats_publisher: NatsPublisher):
+    """The flusher and the publisher initialized with the config, restored after the test"""
+    mocker.patch.object(OutboxFlusher, "config", None)
+    mocker.patch.object(EventOutbox, "release", AsyncMock())
+    OutboxFlusher.init_cls(config)
+
+
+def outbox_events(count: int, subjects: int = 1):
+    return [
+        EventOutbox(
+            id=id,
+            subject=f"acd.client.CONVERSATION.{id % subjects}",
+            payload='{"event": "Resolve"}',
+            creation_date=datetime.utcnow(),
+        )
+        for id in range(1, count + 1)
+    ]
+
+
+@pytest.mark.asyncio
+class TestOutboxFlusher:
+    async def test_flush(self, mocker: MockerFixture):
+        """All the published events are marked as delivered with a single query"""
+        jetstream = AsyncMock()
+        mocker.patch.object(EventOutbox, "claim_pending", return_value=outbox_events(3))
+        mark_as_delivered = mocker.patch.object(EventOutbox, "mark_as_delivered")
+        mocker.patch.object(NatsPublisher, "get_connection", return_value=(None, jetstream))
+
+        assert await OutboxFlusher.flush() == 3
+        assert jetstream.publish.call_count == 3
+        assert mark_as_delivered.call_count == 1
+        assert mark_as_delivered.call_args.kwargs["ids"] == [1, 2, 3]
+        # The events are leased by this flusher
+        assert EventOutbox.claim_pending.call_args.kwargs["claimed_by"] == (
+            OutboxFlusher.flusher_id
+        )
+
+    async def test_flush_with_publish_error(self, mocker: MockerFixture):
+        """Only the events before the first failure are marked as delivered"""
+        jetstream = AsyncMock()
+        jetstream.publish.side_effect = [None, TimeoutError(), None]
+        mocker.patch.object(EventOutbox, "claim_pending", return_value=outbox_events(3))
+        mark_as_delivered = mocker.patch.object(EventOutbox, "mark_as_delivered")
+        mocker.patch.object(NatsPublisher, "get_connection", return_value=(None, jetstream))
+
+        assert await OutboxFlusher.flush() == 1
+        assert mark_as_delivered.call_args.kwargs["ids"] == [1]
+        # The events after the failed one are not published, their lease ends
+        assert jetstream.publish.call_count == 2
+        EventOutbox.release.assert_awaited_once_with(
+            ids=[2, 3], claimed_by=OutboxFlusher.flusher_id
+        )
+
+    async def test_flush_order_by_subject(self, mocker: MockerFixture):
+        """The events of a subject are published in order, one at a time,
+        and a failure only stops the events of its subject"""
+        published = []
+        publishing = set()
+
+        async def publish(subject, payload, headers):
+            assert subject not in publishing
+            publishing.add(subject)
+            await asyncio.sleep(0.01)
+            publishing.discard(subject)
+            if subject.endswith(".0") and len(published) > 1:
+                raise TimeoutError()
+            published.append(subject)
+
+        jetstream = AsyncMock()
+        jetstream.publish.side_effect = publish
+        mocker.patch.object(EventOutbox, "claim_pending", return_value=outbox_events(6, 2))
+        mark_as_delivered = mocker.patch.object(EventOutbox, "mark_as_delivered")
+        mocker.patch.object(NatsPublisher, "get_connection", return_value=(None, jetstream))
+
+        await OutboxFlusher.flush()
+
+        # Subject 1: events 1, 3 and 5, subject 0: event 2 and the failed 4
+        assert mark_as_delivered.call_args.kwargs["ids"] == [1, 2, 3, 5]
+
+    async def test_flush_without_nats_connection(self, mocker: MockerFixture):
+        """The events stay pending while there is no NATS connection"""
+        mocker.patch.object(EventOutbox, "claim_pending", return_value=outbox_events(2))
+        mark_as_delivered = mocker.patch.object(EventOutbox, "mark_as_delivered")
+        mocker.patch.object(NatsPublisher, "get_connection", return_value=(None, None))
+
+        assert await OutboxFlusher.flush() == 0
+        assert mark_as_delivered.call_count == 0
+        # The events are not leased without a connection
+        assert EventOutbox.claim_pending.call_count == 0
+
+    async def test_flush_with_event_id(self, mocker: MockerFixture):
+        """The event id is sent in the JetStream deduplication header"""
+        jetstream = AsyncMock()
+        events = outbox_events(1)
+        events[0].event_id = "f0e1d2c3"
+        mocker.patch.object(EventOutbox, "claim_pending", return_value=events)
+        mocker.patch.object(EventOutbox, "mark_as_delivered")
+        mocker.patch.object(NatsPublisher, "get_connection", return_value=(None, jetstream))
+
+        await OutboxFlusher.flush()
+
+        assert jetstream.publish.call_args.kwargs["headers"] == {"Nats-Msg-Id": "f0e1d2c3"}
@@ -1,3 +1,6 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
 import nest_asyncio
 import pytest
 from mautrix.types import RoomID
@@ -5,7 +8,11 @@ from pytest_mock import MockerFixture
 
 from acd_appservice.user import User
 
+from ..agent_manager import AgentManager
 from ..commands.handler import CommandProcessor
+from ..config import Config
+from ..events import ACDConversationEvents
+from ..events.outbox_flusher import OutboxFlusher
 from ..matrix_room import MatrixRoom
 from ..portal import Portal, PortalState
 from ..queue import Queue
@@ -156,3 +163,189 @@ class TestPortal:
 
     async def test_is_not_portal(self):
         pass
+
+
+@pytest.mark.asyncio
+class TestPortalTransition:
+    @pytest.fixture
+    def portal(self, mocker: MockerFixture, config: Config) -> Portal:
+        mocker.patch.object(Portal, "by_room_id", {})
+        mocker.patch.object(Portal, "by_id", {})
+        mocker.patch.object(Portal, "update")
+        mocker.patch.object(OutboxFlusher, "config", config)
+        return Portal(room_id="!transition:example.com", state=PortalState.START)
+
+    async def test_transition_saves_once(self, portal: Portal):
+        """Several state changes in a transition are saved with a single update"""
+        async with portal.transition():
+            await portal.update_state(PortalState.ASSIGNED)
+            await portal.update_state(PortalState.PENDING)
+
+        assert portal.update.call_count == 1
+        assert portal.state == PortalState.PENDING
+        assert portal.prev_state == PortalState.ASSIGNED
+
+    async def test_transition_revert(self, portal: Portal):
+        """Going back to the previous state is always a valid transition"""
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+        assert await portal.update_state(portal.prev_state)
+
+        assert portal.state == PortalState.START
+        assert portal.update.call_count == 2
+
+    async def test_invalid_transition(self, portal: Portal):
+        """An invalid transition is rejected without saving the portal"""
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+
+        assert not await portal.update_state(PortalState.FOLLOWUP)
+        assert portal.state == PortalState.ON_DISTRIBUTION
+        assert portal.update.call_count == 1
+
+    async def test_transition_events(self, portal: Portal):
+        """The events are sent after the portal is saved"""
+        events = [AsyncMock(), AsyncMock()]
+        async with portal.transition():
+            await portal.update_state(PortalState.ENQUEUED)
+            for event in events:
+                await portal.send_event(event)
+            assert not events[0].send.called
+
+        assert portal.update.call_count == 1
+        assert all(event.send.call_count == 1 for event in events)
+
+    async def test_transition_events_with_outbox(self, portal: Portal, config: Config):
+        """With the outbox enabled the events are stored in the same query of the portal"""
+        config["nats.enabled"] = True
+        config["nats.outbox.enabled"] = True
+        events = [MagicMock(), MagicMock()]
+        async with portal.transition():
+            await portal.update_state(PortalState.ENQUEUED)
+            for event in events:
+                await portal.send_event(event)
+
+        assert portal.update.call_count == 1
+        assert len(portal.update.call_args.kwargs["outbox"]) == 2
+        assert not events[0].send.called
+
+    async def test_concurrent_transitions(self, portal: Portal):
+        """The changes of a coroutine are not saved or sent by the transition of another one"""
+        opened = asyncio.Event()
+        release = asyncio.Event()
+        first_events = [AsyncMock()]
+        second_events = [AsyncMock()]
+
+        async def distribute():
+            async with portal.transition():
+                await portal.update_state(PortalState.ON_DISTRIBUTION)
+                await portal.send_event(first_events[0])
+                opened.set()
+                await release.wait()
+
+        async def resolve():
+            await opened.wait()
+            async with portal.transition():
+                await portal.send_event(second_events[0])
+
+        task = asyncio.create_task(distribute())
+        await resolve()
+
+        # The second coroutine saves and sends its event while the first transition is open
+        assert portal.update.call_count == 1
+        assert second_events[0].send.call_count == 1
+        assert not first_events[0].send.called
+
+        release.set()
+        await task
+
+        assert portal.update.call_count == 2
+        assert first_events[0].send.call_count == 1
+        assert second_events[0].send.call_count == 1
+
+    async def test_invalid_state_response(self, portal: Portal):
+        """A rejected change is answered with a conflict"""
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+
+        response = portal.invalid_state_response(PortalState.FOLLOWUP)
+        assert response["status"] == 409
+        assert response["data"]["room_id"] == portal.room_id
+
+    @pytest.fixture
+    def agent_manager(self, mocker: MockerFixture, config: Config) -> AgentManager:
+        mocker.patch("acd_appservice.portal.send_conversation_event")
+        return AgentManager(
+            puppet_pk=1,
+            bridge="mautrix",
+            control_room_id="!control:example.com",
+            intent=MagicMock(mxid="@acd1:example.com"),
+            config=config,
+            room_manager=MagicMock(),
+        )
+
+    @pytest.fixture
+    def agent(self) -> MagicMock:
+        agent = MagicMock(mxid="@agent1:example.com")
+        agent.is_available = AsyncMock(return_value=True)
+        agent.get_displayname = AsyncMock(return_value="Agent 1")
+        return agent
+
+    async def test_distribute_to_agent(
+        self, mocker: MockerFixture, portal: Portal, agent_manager: AgentManager, agent
+    ):
+        """The agent joins before the change, the intermediate state is never visible"""
+        states = []
+        mocker.patch.object(
+            portal, "join_user", AsyncMock(side_effect=lambda *args: states.append(portal.state))
+        )
+        mocker.patch.object(portal, "send_formatted_message", AsyncMock())
+        mocker.patch.object(portal, "get_current_menubot", AsyncMock(return_value=None))
+        mocker.patch.object(portal, "remove_menubot", AsyncMock())
+
+        response = await agent_manager.distribute_to_agent(
+            portal=portal,
+            agent=agent,
+            joined_message="Hi, I am {agentname}",
+            cmd_sender="@supervisor:example.com",
+        )
+
+        assert response["status"] == 200
+        assert states == [PortalState.START]
+        portal.send_formatted_message.assert_awaited_once_with("Hi, I am Agent 1")
+        assert portal.state == PortalState.PENDING
+        assert portal.update.call_count == 1
+
+    async def test_distribute_to_unavailable_agent(
+        self, mocker: MockerFixture, portal: Portal, agent_manager: AgentManager, agent
+    ):
+        """An unavailable agent does not join and the chat is saved in its previous state"""
+        agent.is_available.return_value = False
+        mocker.patch.object(portal, "join_user", AsyncMock())
+        send_conversation_event = mocker.patch("acd_appservice.portal.send_conversation_event")
+
+        response = await agent_manager.distribute_to_agent(
+            portal=portal, agent=agent, joined_message=None, cmd_sender="@supervisor:example.com"
+        )
+
+        assert response["status"] == 409
+        assert not portal.join_user.called
+        assert portal.state == PortalState.START
+        assert portal.update.call_count == 1
+        assert [call.kwargs["event_type"] for call in send_conversation_event.call_args_list] == [
+            ACDConversationEvents.Assigned,
+            ACDConversationEvents.AssignFailed,
+        ]
+
+    async def test_distribute_to_agent_invalid_state(
+        self, mocker: MockerFixture, portal: Portal, agent_manager: AgentManager, agent
+    ):
+        """A chat that can not be assigned is not touched"""
+        await portal.update_state(PortalState.ON_TRANSIT)
+        mocker.patch.object(portal, "join_user", AsyncMock())
+
+        response = await agent_manager.distribute_to_agent(
+            portal=portal, agent=agent, joined_message=None, cmd_sender="@supervisor:example.com"
+        )
+
+        assert response["status"] == 409
+        assert not agent.is_available.called
+        assert not portal.join_user.called
+        assert portal.state == PortalState.ON_TRANSIT
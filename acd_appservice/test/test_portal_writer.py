@@ -0,0 +1,90 @@
+import asyncio
+
+import nest_asyncio
+import pytest
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.portal import Portal as DBPortal
+from ..portal import Portal, PortalState
+from ..portal_writer import PortalWriter
+
+nest_asyncio.apply()
+
+
+@pytest.fixture
+def portal(mocker: MockerFixture, config: Config) -> Portal:
+    config["acd.portal_write_behind.enabled"] = True
+    mocker.patch.object(PortalWriter, "config", config)
+    mocker.patch.object(PortalWriter, "DIRTY_PORTALS", {})
+    mocker.patch.object(PortalWriter, "_lock", None)
+    mocker.patch.object(Portal, "by_room_id", {})
+    mocker.patch.object(Portal, "by_id", {})
+    mocker.patch.object(Portal, "update")
+    return Portal(room_id="!writer:example.com", state=PortalState.START)
+
+
+@pytest.mark.asyncio
+class TestPortalWriter:
+    async def test_save_is_deferred(self, mocker: MockerFixture, portal: Portal):
+        """The changes to states that are not synced are saved in the next flush"""
+        update_many = mocker.patch.object(DBPortal, "update_many")
+
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+        await portal.update_state(PortalState.ASSIGNED)
+
+        assert portal.update.call_count == 0
+        assert await PortalWriter.flush() == 1
+        update_many.assert_called_once_with([portal])
+        assert not PortalWriter.DIRTY_PORTALS
+
+    async def test_sync_state_is_saved(self, portal: Portal):
+        """A sync state is saved immediately and the pending flush is discarded"""
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+        await portal.update_state(PortalState.ENQUEUED)
+
+        assert portal.update.call_count == 1
+        assert not PortalWriter.DIRTY_PORTALS
+
+    async def test_forced_save(self, portal: Portal):
+        """A forced save does not wait for the flush"""
+        portal.selected_option = "!queue:example.com"
+        await portal.save(force=True)
+
+        assert portal.update.call_count == 1
+        assert not PortalWriter.DIRTY_PORTALS
+
+    async def test_flush_error(self, mocker: MockerFixture, portal: Portal):
+        """The portals of a failed flush are kept for the next one"""
+        mocker.patch.object(DBPortal, "update_many", side_effect=ConnectionError())
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+
+        with pytest.raises(ConnectionError):
+            await PortalWriter.flush()
+
+        assert PortalWriter.DIRTY_PORTALS == {portal.room_id: portal}
+
+    async def test_sync_save_waits_for_flush(self, mocker: MockerFixture, portal: Portal):
+        """A sync state saved during a flush is written after the older batch"""
+        saves = []
+        flushing = asyncio.Event()
+        release = asyncio.Event()
+
+        async def update_many(portals):
+            flushing.set()
+            await release.wait()
+            saves.append("flush")
+
+        mocker.patch.object(DBPortal, "update_many", side_effect=update_many)
+        mocker.patch.object(portal, "update", side_effect=lambda **kwargs: saves.append("sync"))
+        await portal.update_state(PortalState.ON_DISTRIBUTION)
+
+        flush = asyncio.create_task(PortalWriter.flush())
+        await flushing.wait()
+        save = asyncio.create_task(portal.update_state(PortalState.ENQUEUED))
+        await asyncio.sleep(0)
+        assert not saves
+
+        release.set()
+        await asyncio.gather(flush, save)
+        assert saves == ["flush", "sync"]
@@ -1,5 +1,17 @@
+from unittest.mock import AsyncMock
+
 import nest_asyncio
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from pytest_mock import MockerFixture
+
+from ..commands.queue import _list
+from ..config import Config
+from ..db.queue import Queue as DBQueue
+from ..queue import Queue, QueueAvailability
+from ..user import User
+from ..web.base import get_pagination
 
 nest_asyncio.apply()
 
@@ -45,3 +57,98 @@ class TestQueue:
 
     async def test_get_membership(self):
         pass
+
+
+@pytest.mark.asyncio
+class TestQueueAvailability:
+    async def test_get_availability(self, mocker, config: Config, queue: Queue):
+        """`get_availability` requests the agents only once
+        and keeps the count of the available ones
+        """
+        mocker.patch.object(User, "config", config, create=True)
+        agent_user = User(mxid="@agent1:dominio_cliente.com", id=1)
+        paused_agent = User(mxid="@agent2:dominio_cliente.com", id=2)
+        get_agents = mocker.patch.object(
+            Queue, "get_agents", return_value=[agent_user, paused_agent]
+        )
+        mocker.patch.object(User, "is_online", return_value=True)
+        mocker.patch.object(
+            User,
+            "is_paused",
+            autospec=True,
+            side_effect=lambda user, queue_id: user.mxid == paused_agent.mxid,
+        )
+
+        availability = await queue.get_availability()
+
+        assert get_agents.call_count == 1
+        assert availability.agents_count == 2
+        assert availability.available_agents_count == 1
+        assert availability.available_agents == [agent_user]
+
+    async def test_get_availability_without_agents(self, mocker, queue: Queue):
+        """Without agents the snapshot is empty"""
+        mocker.patch.object(Queue, "get_agents", return_value=None)
+
+        availability = await queue.get_availability()
+
+        assert availability.agents_count == 0
+        assert availability.available_agents_count == 0
+
+    async def test_get_available_agents(self, mocker, config: Config, queue: Queue):
+        """The available agents are taken from the availability snapshot"""
+        mocker.patch.object(User, "config", config, create=True)
+        agent_user = User(mxid="@agent1:dominio_cliente.com", id=1)
+        get_availability = mocker.patch.object(
+            Queue,
+            "get_availability",
+            return_value=QueueAvailability(agents=[agent_user], available_agents=[agent_user]),
+        )
+
+        assert await queue.get_available_agents() == [agent_user]
+        assert await queue.get_available_agents_count() == 1
+        assert get_availability.call_count == 2
+
+        get_availability.return_value = QueueAvailability(agents=[agent_user])
+        assert await queue.get_available_agents() is None
+        assert await queue.get_available_agents_count() == 0
+
+
+@pytest.mark.asyncio
+class TestQueueList:
+    async def test_list_page(self, mocker: MockerFixture):
+        """A full page returns the cursor of the next one"""
+        queues = [Queue(id=n, room_id=f"!queue{n}:example.com", name=f"q{n}") for n in (1, 2)]
+        mocker.patch.object(Queue, "get_formatted_room_id", AsyncMock(return_value=""))
+        get_all = mocker.patch.object(DBQueue, "get_all", return_value=queues)
+
+        result = await _list(
+            evt=AsyncMock(), limit=2, after="!queue0:example.com", membership_state="online"
+        )
+
+        get_all.assert_called_once_with(
+            after="!queue0:example.com", limit=2, membership_state="online"
+        )
+        assert result["data"]["next_room_id"] == "!queue2:example.com"
+
+        get_all.return_value = queues[:1]
+        result = await _list(evt=AsyncMock(), limit=2, after="!queue2:example.com")
+
+        assert result["data"]["next_room_id"] is None
+
+    async def test_list_without_limit(self, mocker: MockerFixture):
+        """Without limit the response keeps the previous shape"""
+        mocker.patch.object(DBQueue, "get_all", return_value=None)
+
+        result = await _list(evt=AsyncMock())
+
+        assert result["data"] == {"queues": []}
+
+    async def test_invalid_limit(self):
+        with pytest.raises(web.HTTPBadRequest):
+            get_pagination(make_mocked_request("GET", "/v1/cmd/queue/list?limit=0"))
+
+        assert get_pagination(make_mocked_request("GET", "/v1/user/AGENT?limit=5&after=@a:b")) == (
+            5,
+            "@a:b",
+        )
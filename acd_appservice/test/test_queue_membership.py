@@ -1,9 +1,57 @@
+from __future__ import annotations
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
 import nest_asyncio
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..queue_membership import QueueMembership
+from ..web import base
+from ..web.api.cmd import get_memberships
 
 nest_asyncio.apply()
 
 
+def membership_row(mxid: str, room_id: str) -> dict:
+    return {
+        "mxid": mxid,
+        "room_id": room_id,
+        "name": "Queue",
+        "description": None,
+        "state_date": datetime(2023, 1, 2, 3, 4, 5),
+        "pause_date": None,
+        "pause_reason": None,
+        "state": "online",
+        "paused": False,
+    }
+
+
+ROWS = [
+    membership_row("@agent1:example.com", "!queue1:example.com"),
+    membership_row("@agent1:example.com", "!queue2:example.com"),
+    membership_row("@agent2:example.com", "!queue1:example.com"),
+]
+
+
+def patch_rows(mocker: MockerFixture, rows: list, read: list | None = None) -> MagicMock:
+    """It replaces the cursor of the memberships, the read rows are added to `read`"""
+
+    async def cursor(**kwargs):
+        for row in rows:
+            if read is not None:
+                read.append(row)
+            yield row
+
+    return mocker.patch.object(
+        QueueMembership, "iter_all_user_memberships", MagicMock(side_effect=cursor)
+    )
+
+
 @pytest.mark.asyncio
 @pytest.mark.skip
 class TestQueueMembership:
@@ -42,3 +90,80 @@ class TestQueueMembership:
 
     async def test_get_members(self):
         pass
+
+
+@pytest.mark.asyncio
+class TestMembershipsByUser:
+    async def test_grouped_by_user(self, mocker: MockerFixture):
+        """The memberships of all users are grouped from a single query,
+        each user is yielded as soon as the rows of the next one start"""
+        read = []
+        get_all = patch_rows(
+            mocker, ROWS + [membership_row("@agent3:example.com", "!queue1:example.com")], read
+        )
+
+        memberships_by_user = {}
+        async for mxid, memberships in QueueMembership.iter_serialized_memberships_by_user():
+            memberships_by_user[mxid] = memberships
+            if mxid == "@agent1:example.com":
+                assert len(read) == 3
+
+        get_all.assert_called_once_with(after=None, limit=None, state=None)
+        assert list(memberships_by_user) == [
+            "@agent1:example.com",
+            "@agent2:example.com",
+            "@agent3:example.com",
+        ]
+        assert [m["room_id"] for m in memberships_by_user["@agent1:example.com"]] == [
+            "!queue1:example.com",
+            "!queue2:example.com",
+        ]
+        assert memberships_by_user["@agent2:example.com"][0]["state_date"] == "2023-01-02 03:04:05"
+
+    async def test_streamed_page(self, mocker: MockerFixture, config: Config):
+        """The endpoint streams a page of users with the id of the next page"""
+        mocker.patch.object(base, "_config", config)
+        get_all = patch_rows(mocker, ROWS)
+        app = web.Application()
+        app.router.add_get("/v1/cmd/member/memberships", get_memberships)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(
+                "/v1/cmd/member/memberships", params={"limit": 2, "after": "@agent0:example.com"}
+            )
+            data = await response.json()
+
+        get_all.assert_called_once_with(after="@agent0:example.com", limit=2, state=None)
+        assert response.status == 200
+        assert data["next_user_id"] == "@agent2:example.com"
+        assert len(data["data"]["@agent1:example.com"]["memberships"]) == 2
+        assert data["data"]["@agent2:example.com"]["is_admin"] is False
+
+    async def test_last_page(self, mocker: MockerFixture, config: Config):
+        """A page with less users than the limit is the last one"""
+        mocker.patch.object(base, "_config", config)
+        patch_rows(mocker, ROWS[2:])
+        app = web.Application()
+        app.router.add_get("/v1/cmd/member/memberships", get_memberships)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(
+                "/v1/cmd/member/memberships", params={"limit": 2, "after": "@agent1:example.com"}
+            )
+            data = await response.json()
+
+        assert response.status == 200
+        assert data["next_user_id"] is None
+        assert list(data["data"]) == ["@agent2:example.com"]
+
+    async def test_without_members(self, mocker: MockerFixture, config: Config):
+        """Without users the response is a 404 before the stream starts"""
+        mocker.patch.object(base, "_config", config)
+        patch_rows(mocker, [])
+        app = web.Application()
+        app.router.add_get("/v1/cmd/member/memberships", get_memberships)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get("/v1/cmd/member/memberships")
+
+        assert response.status == 404
@@ -0,0 +1,79 @@
+import json
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+
+from ..events.nats_publisher import NatsPublisher
+from ..replay_events import CONVERSATION_BANNER, Checkpoint, Replayer, read_file_events
+
+nest_asyncio.apply()
+
+
+def write_events_file(path, events):
+    with open(path, "w") as file:
+        for event in events:
+            file.write(f"{json.dumps(event)}\n\n")
+            if event["event"] == "Resolve":
+                file.write(f"{CONVERSATION_BANNER}\n")
+
+
+EVENTS = [
+    {"event_type": "CONVERSATION", "event": "Create", "room_id": "!a:example.com"},
+    {"event_type": "CONVERSATION", "event": "Resolve", "room_id": "!a:example.com"},
+    {"event_type": "CONVERSATION", "event": "Create", "room_id": "!b:example.com"},
+]
+
+
+@pytest.mark.asyncio
+class TestReplayEvents:
+    async def test_read_file_events(self, tmp_path):
+        """The entries separated by blank lines and banners are read one by one"""
+        path = tmp_path / "room_events.txt"
+        write_events_file(path, EVENTS)
+
+        events = [event async for _, event in read_file_events(path, 0)]
+
+        assert events == EVENTS
+
+    async def test_read_file_events_from_offset(self, tmp_path):
+        """Reading from the position of an event continues with the next one"""
+        path = tmp_path / "room_events.txt"
+        write_events_file(path, EVENTS)
+
+        positions = [position async for position, _ in read_file_events(path, 0)]
+        events = [event async for _, event in read_file_events(path, positions[0])]
+
+        assert events == EVENTS[1:]
+
+    async def test_replay(self, tmp_path, nats_publisher: NatsPublisher):
+        """The events are published in batches and the checkpoint keeps the last position"""
+        path = tmp_path / "room_events.txt"
+        write_events_file(path, EVENTS)
+        checkpoint = Checkpoint(str(tmp_path / "replay.checkpoint"), source="file")
+        jetstream = AsyncMock()
+
+        replayer = Replayer(jetstream=jetstream, batch_size=2)
+        published = await replayer.replay(read_file_events(path, 0), checkpoint)
+
+        assert published == 3
+        assert jetstream.publish.call_count == 3
+        assert checkpoint.load() == path.stat().st_size
+        # The events without id are published with the hash of their content
+        headers = jetstream.publish.call_args.kwargs["headers"]
+        assert len(headers["Nats-Msg-Id"]) == 40
+
+    async def test_replay_with_publish_error(self, tmp_path, nats_publisher: NatsPublisher):
+        """If a batch fails the checkpoint stays in the last published batch"""
+        path = tmp_path / "room_events.txt"
+        write_events_file(path, EVENTS)
+        checkpoint = Checkpoint(str(tmp_path / "replay.checkpoint"), source="file")
+        jetstream = AsyncMock()
+        jetstream.publish.side_effect = [None, None, TimeoutError()]
+
+        replayer = Replayer(jetstream=jetstream, batch_size=2)
+        with pytest.raises(TimeoutError):
+            await replayer.replay(read_file_events(path, 0), checkpoint)
+
+        events = [event async for _, event in read_file_events(path, checkpoint.load())]
+        assert events == EVENTS[2:]
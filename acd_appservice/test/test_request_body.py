@@ -0,0 +1,119 @@
+import json
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp_swagger3 import SwaggerDocs
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..web import base
+from ..web.base import get_body
+from ..web.request_body import body_middleware, cached_json
+
+nest_asyncio.apply()
+
+
+async def send_message(request: web.Request) -> web.Response:
+    """
+    ---
+    summary: Send a message.
+
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              phone:
+                type: string
+              message:
+                type: string
+            required:
+              - phone
+              - message
+
+    responses:
+        '200':
+            description: The body
+    """
+    # The body is the same object every time, it is only decoded once
+    assert await get_body(request) is await get_body(request)
+    return web.json_response(data=await get_body(request))
+
+
+async def chunks(data: bytes):
+    """The body is sent without Content-Length"""
+    yield data
+
+
+@pytest.fixture
+def app(mocker: MockerFixture, config: Config) -> web.Application:
+    mocker.patch.object(base, "_config", config)
+    app = web.Application(middlewares=[body_middleware])
+    swagger = SwaggerDocs(app)
+    swagger.register_media_type_handler("application/json", cached_json)
+    swagger.add_post("/v1/mautrix/send_message", send_message)
+    return app
+
+
+@pytest.mark.asyncio
+class TestRequestBody:
+    async def test_decoded_once(self, mocker: MockerFixture, app: web.Application):
+        """The validation and the handler use the body decoded by the middleware"""
+        request_json = mocker.spy(web.Request, "json")
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                "/v1/mautrix/send_message", json={"phone": "573001234567", "message": "Hi"}
+            )
+            data = await response.json()
+
+        assert response.status == 200
+        assert data == {"phone": "573001234567", "message": "Hi"}
+        request_json.assert_not_called()
+
+    async def test_schema_validation(self, mocker: MockerFixture, app: web.Application):
+        """The bodies that do not match the schema of the docs do not reach the handler"""
+        handler = mocker.patch(f"{__name__}.get_body", AsyncMock())
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                "/v1/mautrix/send_message", json={"phone": "573001234567"}
+            )
+            text = await response.text()
+
+        assert response.status == 400
+        assert "message" in text
+        handler.assert_not_called()
+
+    async def test_malformed_body(self, app: web.Application):
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                "/v1/mautrix/send_message",
+                data='{"phone": "573001234567",',
+                headers={"Content-Type": "application/json"},
+            )
+            data = await response.json()
+
+        assert response.status == 400
+        assert data["error"].startswith("Malformed JSON body")
+
+    async def test_max_size(self, app: web.Application, config: Config):
+        """The bodies larger than `acd.api_body.max_size` are rejected"""
+        config["acd.api_body.max_size"] = 1
+        body = {"phone": "573001234567", "message": "x" * 1024}
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/v1/mautrix/send_message", json=body)
+            chunked = await client.post(
+                "/v1/mautrix/send_message",
+                data=chunks(json.dumps(body).encode()),
+                headers={"Content-Type": "application/json"},
+            )
+
+        assert response.status == 413
+        assert chunked.status == 413
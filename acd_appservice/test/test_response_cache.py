@@ -0,0 +1,118 @@
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.puppet import Puppet
+from ..db.versions import Versions
+from ..web import base
+from ..web.response_cache import ResponseCache
+from .test_dirty_fields import puppet_row
+
+nest_asyncio.apply()
+
+VERSIONS = [(Versions.QUEUE, None)]
+
+
+@pytest.fixture
+def build(mocker: MockerFixture, config: Config) -> AsyncMock:
+    mocker.patch.object(base, "_config", config)
+    mocker.patch.object(Versions, "counters", {})
+    mocker.patch.object(ResponseCache, "entries", ResponseCache.entries.__class__())
+    return AsyncMock(return_value={"data": {"queues": ["!queue1:example.com"]}, "status": 200})
+
+
+def get_app(build: AsyncMock) -> web.Application:
+    async def handler(request: web.Request) -> web.Response:
+        return await ResponseCache.respond(request=request, versions=VERSIONS, build=build)
+
+    app = web.Application()
+    app.router.add_get("/v1/cmd/queue/list", handler)
+    return app
+
+
+@pytest.mark.asyncio
+class TestResponseCache:
+    async def test_not_modified(self, build: AsyncMock):
+        """A request with the current ETag gets a 304 without building the response"""
+        async with TestClient(TestServer(get_app(build))) as client:
+            response = await client.get("/v1/cmd/queue/list")
+            etag = response.headers["ETag"]
+            assert await response.json() == {"queues": ["!queue1:example.com"]}
+
+            response = await client.get("/v1/cmd/queue/list", headers={"If-None-Match": etag})
+
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+        assert build.call_count == 1
+
+    async def test_cached_until_written(self, build: AsyncMock):
+        """The cached response is used until one of its tables is written"""
+        async with TestClient(TestServer(get_app(build))) as client:
+            first = await client.get("/v1/cmd/queue/list")
+            second = await client.get("/v1/cmd/queue/list")
+            assert build.call_count == 1
+            assert first.headers["ETag"] == second.headers["ETag"]
+
+            Versions.bump(Versions.QUEUE)
+            third = await client.get(
+                "/v1/cmd/queue/list", headers={"If-None-Match": first.headers["ETag"]}
+            )
+
+        assert third.status == 200
+        assert third.headers["ETag"] != first.headers["ETag"]
+        assert build.call_count == 2
+
+    async def test_errors_not_cached(self, build: AsyncMock):
+        """Only the successful responses are cached"""
+        build.return_value = {"data": {"error": "Queue does not exist"}, "status": 422}
+
+        async with TestClient(TestServer(get_app(build))) as client:
+            await client.get("/v1/cmd/queue/list")
+            response = await client.get("/v1/cmd/queue/list")
+
+        assert response.status == 422
+        assert "ETag" not in response.headers
+        assert build.call_count == 2
+
+    async def test_max_entries(self, build: AsyncMock, config: Config):
+        """The oldest responses are dropped when the cache is full"""
+        config["acd.response_cache.max_entries"] = 2
+
+        async with TestClient(TestServer(get_app(build))) as client:
+            for after in ["!a:example.com", "!b:example.com", "!c:example.com"]:
+                await client.get("/v1/cmd/queue/list", params={"after": after})
+
+        assert len(ResponseCache.entries) == 2
+        assert "!a:example.com" not in " ".join(ResponseCache.entries)
+
+    async def test_max_age(self, mocker: MockerFixture):
+        """The ETag changes after max_age even if the tables have not been written"""
+        key = "Mxid @supervisor:example.com /v1/cmd/queue/info"
+        mocker.patch("time.time", return_value=1000.0)
+        etag = ResponseCache.get_etag(key, VERSIONS, max_age=600)
+        assert ResponseCache.get_etag(key, VERSIONS) != etag
+
+        mocker.patch("time.time", return_value=1100.0)
+        assert ResponseCache.get_etag(key, VERSIONS, max_age=600) == etag
+
+        mocker.patch("time.time", return_value=1300.0)
+        assert ResponseCache.get_etag(key, VERSIONS, max_age=600) != etag
+
+    async def test_puppet_sync_token_not_bumped(self, mocker: MockerFixture):
+        """Saving only the sync token does not change the puppet info version"""
+        mocker.patch.object(Versions, "counters", {})
+        mocker.patch.object(Puppet, "db", AsyncMock(), create=True)
+        puppet = Puppet._from_row(puppet_row())
+
+        puppet.next_batch = "s123"
+        await puppet.update()
+        assert Versions.get(Versions.PUPPET, "@acd1:example.com") == 0
+
+        puppet.phone = "573009876543"
+        await puppet.update()
+        assert Versions.get(Versions.PUPPET, "@acd1:example.com") == 1
@@ -0,0 +1,187 @@
+import asyncio
+from collections import OrderedDict
+from unittest.mock import AsyncMock
+
+import nest_asyncio
+import pytest
+from mautrix.types import Obj
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..signaling import Signaling
+
+nest_asyncio.apply()
+
+ROOM_ID = "!qVKwlyUXOCrBfZJOdh:example.com"
+
+
+@pytest.fixture
+def signaling(mocker: MockerFixture, config: Config) -> Signaling:
+    mocker.patch.object(Signaling, "CHAT_DATA", OrderedDict())
+    mocker.patch.object(Signaling, "config", config, create=True)
+    mocker.patch.object(Signaling, "PENDING_STATE_EVENTS", {})
+    mocker.patch.object(Signaling, "STATE_WRITERS", {})
+    mocker.patch.object(Signaling, "STATE_UPDATED", {})
+    mocker.patch.object(Signaling, "state_writes_saved", 0)
+    intent = AsyncMock()
+    intent.get_state_event.return_value = Obj(
+        status=Signaling.PENDING, campaign_room_id="!campaign:example.com", agent=None
+    )
+    return Signaling(intent=intent, config=config)
+
+
+@pytest.mark.asyncio
+class TestSignaling:
+    async def test_set_chat_status_uses_cache(self, signaling: Signaling):
+        """The chat status is requested to the homeserver only the first time"""
+        await signaling.set_chat_status(
+            room_id=ROOM_ID, status=Signaling.FOLLOWUP, agent="@agent1:example.com"
+        )
+        await signaling.set_chat_status(room_id=ROOM_ID, status=Signaling.PENDING)
+        # Let the state writers run
+        await asyncio.sleep(0)
+
+        assert signaling.intent.get_state_event.call_count == 1
+        assert Signaling.get_cached_chat_data(ROOM_ID) == {
+            "status": Signaling.PENDING,
+            "campaign_room_id": "!campaign:example.com",
+            "agent": "@agent1:example.com",
+        }
+
+    async def test_set_chat_status_primed_cache(self, signaling: Signaling):
+        """A room with a known chat status does not request the homeserver"""
+        Signaling.cache_chat_data(
+            room_id=ROOM_ID,
+            content=Obj(status=Signaling.OPEN, campaign_room_id=None, agent="@agent2:example.com"),
+        )
+
+        await signaling.set_chat_status(room_id=ROOM_ID, status=Signaling.FOLLOWUP)
+        await asyncio.sleep(0)
+
+        assert signaling.intent.get_state_event.call_count == 0
+        assert Signaling.get_cached_chat_data(ROOM_ID)["agent"] == "@agent2:example.com"
+
+    async def test_resolved_chat_is_not_cached(self, signaling: Signaling):
+        Signaling.cache_chat_data(room_id=ROOM_ID, content={"status": Signaling.PENDING})
+
+        await signaling.set_chat_status(room_id=ROOM_ID, status=Signaling.RESOLVED)
+        await asyncio.sleep(0)
+
+        assert ROOM_ID not in Signaling.CHAT_DATA
+        assert signaling.intent.send_state_event.call_args.kwargs["content"]["status"] == (
+            Signaling.RESOLVED
+        )
+
+    async def test_chat_data_cache_is_bounded(self, signaling: Signaling, config: Config):
+        """The oldest rooms and the expired entries are dropped from the cache"""
+        config["acd.signaling.max_cached_chats"] = 2
+        for n in range(3):
+            Signaling.cache_chat_data(
+                room_id=f"!room{n}:example.com", content={"status": Signaling.PENDING}
+            )
+
+        assert list(Signaling.CHAT_DATA) == ["!room1:example.com", "!room2:example.com"]
+
+        config["acd.signaling.chat_data_ttl"] = 0
+        Signaling.cache_chat_data(room_id=ROOM_ID, content={"status": Signaling.PENDING})
+
+        assert not Signaling.get_cached_chat_data(ROOM_ID)
+        assert ROOM_ID not in Signaling.CHAT_DATA
+
+    async def test_failed_chat_status_is_not_cached(
+        self, mocker: MockerFixture, signaling: Signaling
+    ):
+        """The chat status is removed from the cache when it could not be sent"""
+
+        async def wait_for(aw, timeout):
+            # The retries do not wait
+            aw.close()
+            raise asyncio.TimeoutError()
+
+        mocker.patch("asyncio.wait_for", wait_for)
+        signaling.intent.send_state_event.side_effect = Exception("timeout")
+
+        await signaling.send_state_event(
+            room_id=ROOM_ID,
+            event_type=Signaling.CHAT_STATUS_EVENT_TYPE,
+            content={"status": Signaling.PENDING, "agent": "@agent1:a.com"},
+        )
+        assert Signaling.has_chat_status(room_id=ROOM_ID, status=Signaling.PENDING)
+
+        await Signaling.STATE_WRITERS[(ROOM_ID, Signaling.CHAT_STATUS_EVENT_TYPE)]
+
+        assert signaling.intent.send_state_event.call_count == 10
+        assert ROOM_ID not in Signaling.CHAT_DATA
+
+    async def test_send_state_event_latest_wins(self, signaling: Signaling):
+        """Only the newest content of a pending state event is sent"""
+        for agent in ["@agent1:example.com", "@agent2:example.com", "@agent3:example.com"]:
+            await signaling.send_state_event(
+                room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": agent}
+            )
+        await asyncio.sleep(0)
+
+        assert signaling.intent.send_state_event.call_count == 1
+        assert signaling.intent.send_state_event.call_args.kwargs["content"] == {
+            "agent": "@agent3:example.com"
+        }
+        assert Signaling.state_writes_saved == 2
+        assert not Signaling.STATE_WRITERS
+
+    async def test_send_state_event_cancels_superseded_retries(self, signaling: Signaling):
+        """A failed state event is not retried when there is a newer content"""
+        signaling.intent.send_state_event.side_effect = [Exception("timeout"), None]
+
+        await signaling.send_state_event(
+            room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": "@agent1:a.com"}
+        )
+        # The first attempt fails and the writer waits to retry
+        await asyncio.sleep(0)
+        await signaling.send_state_event(
+            room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": "@agent2:a.com"}
+        )
+        await asyncio.wait_for(Signaling.STATE_WRITERS[(ROOM_ID, Signaling.CHAT_CONNECT)], 1)
+
+        assert signaling.intent.send_state_event.call_count == 2
+        assert signaling.intent.send_state_event.call_args.kwargs["content"] == {
+            "agent": "@agent2:a.com"
+        }
+        assert Signaling.state_writes_saved == 1
+
+    async def test_send_state_event_with_latest_intent(self, signaling: Signaling, config: Config):
+        """The pending content is sent by the intent that set it,
+        not by the one that started the writer"""
+        signaling.intent.send_state_event.side_effect = [Exception("timeout"), None]
+        other_signaling = Signaling(intent=AsyncMock(), config=config)
+
+        await signaling.send_state_event(
+            room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": "@agent1:a.com"}
+        )
+        await asyncio.sleep(0)
+        await other_signaling.send_state_event(
+            room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": "@agent2:a.com"}
+        )
+        await asyncio.wait_for(Signaling.STATE_WRITERS[(ROOM_ID, Signaling.CHAT_CONNECT)], 1)
+
+        assert signaling.intent.send_state_event.call_count == 1
+        other_signaling.intent.send_state_event.assert_awaited_once_with(
+            room_id=ROOM_ID, event_type=Signaling.CHAT_CONNECT, content={"agent": "@agent2:a.com"}
+        )
+
+    async def test_has_chat_status(self, signaling: Signaling):
+        """The chat status is compared with the cache without requesting the homeserver"""
+        assert not Signaling.has_chat_status(room_id=ROOM_ID, status=Signaling.PENDING)
+
+        Signaling.cache_chat_data(
+            room_id=ROOM_ID, content={"status": Signaling.PENDING, "agent": "@agent1:a.com"}
+        )
+
+        assert Signaling.has_chat_status(room_id=ROOM_ID, status=Signaling.PENDING)
+        assert Signaling.has_chat_status(
+            room_id=ROOM_ID, status=Signaling.PENDING, agent="@agent1:a.com"
+        )
+        assert not Signaling.has_chat_status(
+            room_id=ROOM_ID, status=Signaling.PENDING, agent="@agent2:a.com"
+        )
+        assert not Signaling.has_chat_status(room_id=ROOM_ID, status=Signaling.FOLLOWUP)
+        assert signaling.intent.get_state_event.call_count == 0
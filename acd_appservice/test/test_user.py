@@ -1,5 +1,13 @@
+from collections import OrderedDict
+from unittest.mock import AsyncMock
+
 import nest_asyncio
 import pytest
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.user import User as DBUser
+from ..db.versions import Versions
 
 nest_asyncio.apply()
 from ..user import User
@@ -74,3 +82,77 @@ class TestUser:
 
     async def test_get_displayname(self, customer: User):
         assert "Mauricio Valderrama" == await customer.get_displayname()
+
+
+@pytest.fixture
+def users_cache(mocker: MockerFixture, config: Config):
+    mocker.patch.object(User, "config", config, create=True)
+    mocker.patch.object(User, "az", AsyncMock(), create=True)
+    mocker.patch.object(User, "by_id", {})
+    mocker.patch.object(User, "by_mxid", {})
+    mocker.patch.object(User, "displaynames", OrderedDict())
+
+
+@pytest.mark.asyncio
+class TestUsersInBulk:
+    async def test_get_by_ids(self, mocker: MockerFixture, users_cache):
+        """Only the users that are not cached are loaded, with a single query"""
+        cached_user = User("@agent1:example.com", id=1)
+        cached_user._add_to_cache()
+        get_by_ids = mocker.patch.object(
+            DBUser, "get_by_ids", return_value=[User("@agent2:example.com", id=2)]
+        )
+
+        users = await User.get_by_ids([1, 2, 3])
+
+        get_by_ids.assert_called_once_with([2, 3])
+        assert users[1] is cached_user
+        assert users[2] is User.by_id[2]
+        assert 3 not in users
+
+    async def test_get_displaynames(self, users_cache):
+        """The displaynames are fetched once, the errors do not fail the others"""
+        User.az.intent.get_displayname.side_effect = lambda user_id: {
+            "@agent1:example.com": "Agent 1",
+            "@agent2:example.com": "Agent 2",
+        }[user_id]
+        users = [User(f"@agent{n}:example.com", id=n) for n in range(1, 4)]
+
+        displaynames = await User.get_displaynames(users)
+        await User.get_displaynames(users[:2])
+
+        assert displaynames == {
+            "@agent1:example.com": "Agent 1",
+            "@agent2:example.com": "Agent 2",
+            "@agent3:example.com": None,
+        }
+        assert User.az.intent.get_displayname.call_count == 3
+
+    async def test_get_displaynames_cache(self, users_cache, config: Config):
+        """Only the listings use the cache, and it keeps the most recent displaynames"""
+        config["acd.displaynames.max_cached"] = 2
+        User.az.intent.get_displayname.side_effect = lambda user_id: user_id[1:7]
+        users = [User(f"@agent{n}:example.com", id=n) for n in range(1, 4)]
+
+        await User.get_displaynames(users)
+
+        assert list(User.displaynames) == ["@agent2:example.com", "@agent3:example.com"]
+
+        await users[1].get_displayname()
+        assert User.az.intent.get_displayname.call_count == 4
+
+    async def test_displayname_change_bumps_version(
+        self, mocker: MockerFixture, users_cache, config: Config
+    ):
+        """A displayname that changed when its cache expired changes the responses with it"""
+        mocker.patch.object(Versions, "counters", {})
+        config["acd.displaynames.cache_ttl"] = 0
+        User.az.intent.get_displayname.side_effect = ["Agent 1", "Agent 1", "Agent One"]
+        users = [User("@agent1:example.com", id=1)]
+
+        await User.get_displaynames(users)
+        await User.get_displaynames(users)
+        assert Versions.get(Versions.DISPLAYNAMES) == 0
+
+        await User.get_displaynames(users)
+        assert Versions.get(Versions.DISPLAYNAMES) == 1
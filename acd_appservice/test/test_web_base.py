@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from unittest.mock import AsyncMock, MagicMock
+
+import nest_asyncio
+import pytest
+from aiohttp import web
+from pytest_mock import MockerFixture
+
+from ..config import Config
+from ..db.user import User as DBUser
+from ..db.versions import Versions
+from ..user import User
+from ..web import base
+
+nest_asyncio.apply()
+
+
+def get_request(authorization: str | None) -> MagicMock:
+    request = MagicMock()
+    request.headers = {"Authorization": authorization} if authorization else {}
+    return request
+
+
+@pytest.fixture
+def get_by_mxid(mocker: MockerFixture, config: Config) -> AsyncMock:
+    mocker.patch.object(base, "_config", config)
+    mocker.patch.object(base, "_callers", OrderedDict())
+    mocker.patch.object(Versions, "counters", {})
+    user = MagicMock(mxid="@supervisor:example.com")
+
+    async def get_user(mxid: str, create: bool = True):
+        return user if mxid == user.mxid else None
+
+    return mocker.patch.object(User, "get_by_mxid", AsyncMock(side_effect=get_user))
+
+
+@pytest.mark.asyncio
+class TestResolveUserIdentifier:
+    async def test_cached_user(self, get_by_mxid: AsyncMock):
+        """An existing user is loaded once and it is never created"""
+        request = get_request("Mxid @supervisor:example.com")
+
+        first = await base._resolve_user_identifier(request)
+        second = await base._resolve_user_identifier(request)
+
+        assert first is second
+        get_by_mxid.assert_called_once_with("@supervisor:example.com", create=False)
+
+    async def test_unknown_user(self, get_by_mxid: AsyncMock):
+        """An unknown user is rejected, the result is cached too"""
+        request = get_request("Mxid @unknown:example.com")
+
+        for _ in range(2):
+            with pytest.raises(web.HTTPUnauthorized):
+                await base._resolve_user_identifier(request)
+
+        get_by_mxid.assert_called_once_with("@unknown:example.com", create=False)
+
+    async def test_expired_entry(self, get_by_mxid: AsyncMock, config: Config):
+        """The entries are loaded again after their TTL"""
+        config["acd.api_auth.negative_cache_ttl"] = 0
+        request = get_request("Mxid @unknown:example.com")
+
+        for _ in range(2):
+            with pytest.raises(web.HTTPUnauthorized):
+                await base._resolve_user_identifier(request)
+
+        assert get_by_mxid.call_count == 2
+
+    async def test_created_user(self, mocker: MockerFixture, get_by_mxid: AsyncMock):
+        """An unknown user is loaded again as soon as it is created"""
+        mocker.patch.object(DBUser, "db", MagicMock(execute=AsyncMock()))
+        request = get_request("Mxid @unknown:example.com")
+
+        with pytest.raises(web.HTTPUnauthorized):
+            await base._resolve_user_identifier(request)
+
+        await DBUser(mxid="@unknown:example.com").insert()
+        with pytest.raises(web.HTTPUnauthorized):
+            await base._resolve_user_identifier(request)
+
+        assert get_by_mxid.call_count == 2
+
+    async def test_invalid_header(self, get_by_mxid: AsyncMock):
+        """The invalid mxids and headers do not reach the database"""
+        for authorization in [None, "Mxid", "Mxid not-an-mxid"]:
+            with pytest.raises(web.HTTPUnauthorized):
+                await base._resolve_user_identifier(get_request(authorization))
+
+        get_by_mxid.assert_not_called()
+
+    async def test_max_cached_callers(self, get_by_mxid: AsyncMock, config: Config):
+        """The oldest callers are dropped when the cache is full"""
+        config["acd.api_auth.max_cached_callers"] = 2
+        for n in range(3):
+            with pytest.raises(web.HTTPUnauthorized):
+                await base._resolve_user_identifier(get_request(f"Mxid @user{n}:example.com"))
+
+        assert list(base._callers) == ["@user1:example.com", "@user2:example.com"]
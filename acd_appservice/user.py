@@ -3,7 +3,9 @@ from __future__ import annotations
 import asyncio
 import logging
 import re
-from typing import TYPE_CHECKING, Optional, cast
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, cast
 
 from mautrix.appservice import AppService
 from mautrix.bridge import BaseUser, async_getter_lock
@@ -13,6 +15,7 @@ from mautrix.util.logging import TraceLogger
 from .config import Config
 from .db.user import User as DBUser
 from .db.user import UserRoles
+from .db.versions import Versions
 from .queue_membership import QueueMembership, QueueMembershipState
 
 if TYPE_CHECKING:
@@ -31,6 +34,9 @@ class User(DBUser, BaseUser):
 
     by_mxid: dict[UserID, User] = {}
     by_id: dict[int, User] = {}
+    # Displayname of each user and the time it was fetched, only for the listings
+    # (see get_displaynames), the oldest ones are dropped after `acd.displaynames.max_cached`
+    displaynames: OrderedDict[UserID, Tuple[str, float]] = OrderedDict()
 
     def __init__(
         self,
@@ -238,11 +244,57 @@ class User(DBUser, BaseUser):
 
     async def get_formatted_displayname(self) -> str:
         displayname = await self.get_displayname()
-        return f"[{displayname}](https://matrix.to/#/{self.mxid})"
+        return self.format_displayname(mxid=self.mxid, displayname=displayname)
+
+    @staticmethod
+    def format_displayname(mxid: UserID, displayname: str | None) -> str:
+        return f"[{displayname or mxid}](https://matrix.to/#/{mxid})"
 
     async def get_displayname(self) -> str:
         return await self.az.intent.get_displayname(user_id=self.mxid)
 
+    @classmethod
+    async def get_displaynames(cls, users: List[User]) -> Dict[UserID, str | None]:
+        """It gets the displaynames of several users for the listings, they are cached
+        during `acd.displaynames.cache_ttl` seconds and the ones that are not cached
+        are fetched concurrently (at most `acd.displaynames.fetch_concurrency` at a time)
+
+        Parameters
+        ----------
+        users : List[User]
+            The users.
+
+        Returns
+        -------
+            A dict with the displayname of each user, None if it could not be fetched.
+
+        """
+        semaphore = asyncio.Semaphore(cls.config["acd.displaynames.fetch_concurrency"])
+
+        async def get_displayname(user: User) -> str | None:
+            cached = cls.displaynames.get(user.mxid)
+            if cached and time.monotonic() - cached[1] < cls.config["acd.displaynames.cache_ttl"]:
+                cls.displaynames.move_to_end(user.mxid)
+                return cached[0]
+
+            async with semaphore:
+                try:
+                    displayname = await user.get_displayname()
+                except Exception as e:
+                    cls.log.warning(f"Unable to get the displayname of {user.mxid}: {e}")
+                    return None
+
+            if cached and cached[0] != displayname:
+                Versions.bump(Versions.DISPLAYNAMES)
+            cls.displaynames[user.mxid] = (displayname, time.monotonic())
+            cls.displaynames.move_to_end(user.mxid)
+            while len(cls.displaynames) > cls.config["acd.displaynames.max_cached"]:
+                cls.displaynames.popitem(last=False)
+            return displayname
+
+        displaynames = await asyncio.gather(*[get_displayname(user) for user in users])
+        return {user.mxid: displayname for user, displayname in zip(users, displaynames)}
+
     async def get_presence(self) -> PresenceEventContent:
         """This function returns the presence state of the user
 
@@ -305,6 +357,34 @@ class User(DBUser, BaseUser):
 
         return None
 
+    @classmethod
+    async def get_by_ids(cls, ids: List[int]) -> Dict[int, User]:
+        """It gets several users, the ones that are not cached are loaded with a single query
+
+        Parameters
+        ----------
+        ids : List[int]
+            The ids of the users.
+
+        Returns
+        -------
+            A dict with the users found by id.
+
+        """
+        users = {id: cls.by_id[id] for id in ids if id in cls.by_id}
+        missing_ids = [id for id in ids if id not in users]
+        if missing_ids:
+            for user in await super().get_by_ids(missing_ids):
+                user = cast(cls, user)
+                # Keep the instance of the cache if it was loaded meanwhile
+                if user.id in cls.by_id:
+                    user = cls.by_id[user.id]
+                else:
+                    user._add_to_cache()
+                users[user.id] = user
+
+        return users
+
     async def set_room_tag(self, room_id: RoomID, tag: str, info: dict = {}) -> None:
         self.log.debug(f"Setting tag {tag} in room {room_id} for user {self.mxid}")
         result = await self.az.intent.api.session.put(
@@ -1,3 +1,4 @@
+from .bloom_filter import BloomFilter
 from .business_hours import BusinessHour
 from .color_log import ColorFormatter
 from .util import Util
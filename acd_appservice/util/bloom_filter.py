@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+    """A set that only answers if an item may be in it, it uses a fixed amount of memory.
+
+    There are no false negatives, an item that was added is always found,
+    but an item that was not added is found with a probability of `error_rate`
+    while the number of added items is below `capacity`.
+    Items cannot be removed.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Optimal number of bits and hash functions for the capacity and the error rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count = 0
+
+    def _positions(self, item: str) -> list[int]:
+        # Double hashing, the positions are derived from two 64 bits hashes
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item)
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def is_full(self) -> bool:
+        """When the capacity is exceeded the error rate grows"""
+        return self.count > self.capacity
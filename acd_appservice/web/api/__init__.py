@@ -19,4 +19,5 @@ from .cmd import (
     transfer_user,
 )
 from .cmd_v2 import transfer
+from .jobs import cancel_job, get_job, get_jobs
 from .misc import get_control_room, get_control_rooms
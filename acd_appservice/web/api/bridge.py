@@ -5,17 +5,27 @@ from logging import Logger, getLogger
 from typing import Dict, List
 
 from aiohttp import web
-from markdown import markdown
-from mautrix.types import Format, MessageType, TextMessageEventContent
+from mautrix.types import UserID
 
+from ...bridge_monitor import BridgeMonitor
+from ...bulk_sender import BulkSender
 from ...client import ProvisionBridge
+from ...db.bridge_status import BridgeStatus
+from ...job_manager import JobManager
 from ...message import Message
 from ...puppet import Puppet
 from .. import SUPPORTED_MESSAGE_TYPES
-from ..base import _resolve_puppet_identifier, _resolve_user_identifier, routes
+from ..base import (
+    _resolve_puppet_identifier,
+    _resolve_user_identifier,
+    get_body,
+    get_config,
+    routes,
+)
 from ..error_responses import (
     BRIDGE_INVALID,
     INVALID_PHONE,
+    JOB_DOESNOT_EXIST,
     MESSAGE_NOT_FOUND,
     MESSAGE_TYPE_NOT_SUPPORTED,
     NOT_DATA,
@@ -23,6 +33,8 @@ from ..error_responses import (
     NOT_USERNAME,
     REQUIRED_VARIABLES,
     SERVER_ERROR,
+    TOO_MANY_JOBS,
+    TOO_MANY_RECIPIENTS,
     USER_DOESNOT_EXIST,
 )
 
@@ -157,8 +169,7 @@ async def send_message(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
-    data = await request.json()
+    data: Dict = await get_body(request)
 
     if not (
         data.get("phone")
@@ -184,59 +195,20 @@ async def send_message(request: web.Request) -> web.Response:
     message = data.get("message")
     phone = phone if phone.startswith("+") else f"+{phone}"
 
-    # TODO WORKAROUND FOR NOT LINKING TO THE MENU IN A BIC
-    user_prefix = puppet.config[f"bridges.{puppet.bridge}.user_prefix"]
-    user_domain = puppet.config["homeserver.domain"]
-    portal_creator = f"@{user_prefix}_{phone.replace('+', '')}:{user_domain}"
-
-    log.debug(f"Putting portal with creator {portal_creator} in BIC rooms")
-    puppet.BIC_ROOMS.add(portal_creator)
-
-    # We create a connector with the bridge
-    bridge_connector = ProvisionBridge(
-        session=puppet.intent.api.session, config=puppet.config, bridge=bridge
-    )
-
-    status, response = await bridge_connector.pm(user_id=puppet.custom_mxid, phone=phone)
-
-    if response.get("error") or not response.get("room_id"):
-        return web.json_response(data=response, status=status)
-
-    customer_room_id = response.get("room_id")
-
-    if msg_type == "text":
-        content = TextMessageEventContent(
-            msgtype=MessageType.TEXT,
-            body=message,
-            format=Format.HTML,
-            formatted_body=markdown(message),
-        )
-
-    # Here you can have the other message types when you think about implementing them
-    # if msg_type == "image":
-    #     content = MediaMessageEventContent(
-    #         msgtype=MessageType.IMAGE,
-    #         body=message,
-    #         format=Format.HTML,
-    #         formatted_body=message,
-    #     )
-
     try:
-        if puppet.config[f"bridges.{bridge}.send_template_command"]:
-            # If another bridge must send templates, make this method (gupshup_template) generic.
-            status, data = await bridge_connector.gupshup_template(
-                room_id=customer_room_id, user_id=puppet.custom_mxid, template=message
-            )
-            if not status in [200, 201]:
-                return web.json_response(status=status, data=data)
-
-            event_id = data.get("event_id")
-        else:
-            event_id = await puppet.intent.send_message(room_id=customer_room_id, content=content)
+        status, data = await BulkSender.send_message(
+            puppet=puppet, phone=phone, message=message, msg_type=msg_type
+        )
     except Exception as e:
         puppet.log.exception(e)
         return web.json_response(**SERVER_ERROR)
 
+    if status not in [200, 201]:
+        return web.json_response(data=data, status=status)
+
+    event_id = data.get("event_id")
+    customer_room_id = data.get("room_id")
+
     try:
         # We register the message in the db
         await Message.insert_msg(
@@ -259,6 +231,188 @@ async def send_message(request: web.Request) -> web.Response:
     )
 
 
+@routes.post("/v1/mautrix/bulk_send_message")
+@routes.post("/v1/gupshup/bulk_send_message")
+async def bulk_send_message(request: web.Request) -> web.Response:
+    """
+    Send a message to many whatsapp numbers in a background job
+    ---
+    summary: Send messages from the user account to many WhatsApp phone numbers.
+    description: The messages are sent by a background job, the response has the `job_id`
+                 to follow its progress with `/v1/jobs/{job_id}`, the phones that could
+                 not be reached are in the `errors` of its result.
+    tags:
+        - Bridge
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+
+    requestBody:
+      required: false
+      description: A json with `recipients`, `message`, `msg_type`,
+                   `user_email` or `user_id` (You must use one of them)
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              recipients:
+                description: "Target phone numbers (use country code), each one can have
+                              its own `message`"
+                type: array
+                items:
+                  type: object
+                  properties:
+                    phone:
+                      type: string
+                    message:
+                      type: string
+                  required:
+                    - phone
+              message:
+                description: "Message sent to the recipients without their own message"
+                type: string
+              msg_type:
+                description: "Message type, (only supports [`text`])"
+                type: string
+              user_email:
+                description: "Puppet email"
+                type: string
+              user_id:
+                description: "Puppet user_id"
+                type: string
+            required:
+              - recipients
+              - msg_type
+            example:
+                recipients:
+                  - phone: "573123456789"
+                  - phone: "573123456780"
+                    message: Hello John!
+                message: Hello World!
+                msg_type: text
+                user_email: nobody@somewhere.com
+                user_id: '@acd1:somewhere.com'
+
+    responses:
+        '202':
+            $ref: '#/components/responses/Job'
+        '400':
+            $ref: '#/components/responses/BadRequest'
+        '404':
+            $ref: '#/components/responses/NotExist'
+        '413':
+            $ref: '#/components/responses/BadRequest'
+        '422':
+            $ref: '#/components/responses/ErrorData'
+        '503':
+            $ref: '#/components/responses/ServiceUnavailable'
+    """
+    user = await _resolve_user_identifier(request=request)
+
+    url_sections: List[str] = request.path.split("/")
+    bridge = url_sections[3]
+
+    if not request.body_exists:
+        return web.json_response(**NOT_DATA)
+
+    data: Dict = await get_body(request)
+
+    recipients: List[Dict] = data.get("recipients")
+    if not (
+        recipients
+        and isinstance(recipients, list)
+        and data.get("msg_type")
+        and (data.get("user_email") or data.get("user_id"))
+    ):
+        return web.json_response(**REQUIRED_VARIABLES)
+
+    if not data.get("msg_type") in SUPPORTED_MESSAGE_TYPES:
+        return web.json_response(**MESSAGE_TYPE_NOT_SUPPORTED)
+
+    if len(recipients) > get_config()["acd.bulk_send.max_recipients"]:
+        return web.json_response(**TOO_MANY_RECIPIENTS)
+
+    if JobManager.is_full():
+        return web.json_response(**TOO_MANY_JOBS)
+
+    puppet = await _resolve_puppet_identifier(request=request)
+
+    if puppet.bridge != bridge:
+        return web.json_response(**BRIDGE_INVALID)
+
+    # All the recipients are validated before starting the job
+    valid_recipients = []
+    for recipient in recipients:
+        recipient = recipient if isinstance(recipient, dict) else {}
+        phone = str(recipient.get("phone", ""))
+        message = recipient.get("message") or data.get("message")
+        if not message:
+            return web.json_response(**REQUIRED_VARIABLES)
+
+        if not (phone.isdigit() and 5 <= len(phone) <= 15):
+            return web.json_response(
+                data={"error": f"Not a valid phone {phone}"}, status=INVALID_PHONE["status"]
+            )
+
+        valid_recipients.append({"phone": f"+{phone}", "message": message})
+
+    job = await BulkSender.submit_job(
+        puppet=puppet,
+        recipients=valid_recipients,
+        msg_type=data.get("msg_type"),
+        created_by=user.mxid,
+    )
+
+    return web.json_response(data=job.serialize(), status=202)
+
+
+@routes.get("/v1/bulk_send_message/{job_id}", allow_head=False)
+async def get_bulk_send_job(request: web.Request) -> web.Response:
+    """
+    ---
+    summary: Get the progress of a bulk send job.
+    description: Alias of `/v1/jobs/{job_id}` for the bulk send jobs, use that one instead.
+    deprecated: true
+    tags:
+        - Bridge
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+    - in: path
+      name: job_id
+      description: The `job_id` returned by bulk_send_message
+      required: true
+      schema:
+        type: string
+
+    responses:
+        '200':
+            $ref: '#/components/responses/Job'
+        '404':
+            $ref: '#/components/responses/NotFound'
+    """
+    await _resolve_user_identifier(request=request)
+
+    job = await JobManager.get_job(request.match_info.get("job_id", ""))
+    if not job or job.kind != "bulk_send":
+        return web.json_response(**JOB_DOESNOT_EXIST)
+
+    return web.json_response(data=job.serialize())
+
+
 @routes.get("/v1/mautrix/link_phone")
 async def link_phone(request: web.Request) -> web.Response:
     """
@@ -402,7 +556,7 @@ async def metainc_login(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data = await request.json()
+    data = await get_body(request)
     auth = data.get("auth")
     email = auth.get("email")
     username = auth.get("username")
@@ -557,7 +711,7 @@ async def metainc_challenge(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data = await request.json()
+    data = await get_body(request)
     challenge = data.get("challenge")
     username = challenge.get("username")
     email = challenge.get("email")
@@ -675,7 +829,7 @@ async def gupshup_register(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    gupshup_data = await request.json()
+    gupshup_data = await get_body(request)
 
     gs_app_data = {
         "gs_app_name": gupshup_data.get("gs_app_name"),
@@ -764,7 +918,7 @@ async def gupshup_update(request: web.Request) -> web.Response:
             {"detail": {"data": None, "message": "Bridge invalid"}}, status=400
         )
 
-    gupshup_data = await request.json()
+    gupshup_data = await get_body(request)
 
     if not gupshup_data.get("api_key"):
         return web.json_response(
@@ -851,6 +1005,9 @@ async def get_bridges_status(request: web.Request) -> web.Response:
                             type: array
                             items:
                                 type: string
+                        refresh:
+                            type: boolean
+                            description: Ping the bridges instead of using the last status
                     example:
                         puppet_list: ["@acd1:localhost", "@acd2:localhost"]
 
@@ -865,21 +1022,37 @@ async def get_bridges_status(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data = await request.json()
-
-    bridges_status = []
-
-    for puppet_mxid in data.get("puppet_list"):
-        puppet: Puppet = await Puppet.get_by_custom_mxid(puppet_mxid)
-
-        if not puppet or puppet.bridge == "gupshup":
-            continue
-
-        bridge_conector = ProvisionBridge(
-            config=puppet.config, session=puppet.intent.api.session, bridge=puppet.bridge
+    data = await get_body(request)
+
+    puppets: List[Puppet] = [
+        puppet
+        for puppet in await Puppet.get_by_custom_mxids(data.get("puppet_list"))
+        if puppet.bridge != "gupshup"
+    ]
+
+    # The status saved by the bridge monitor, the puppets without it
+    # or with a status older than `max_age` are pinged now
+    statuses: Dict[UserID, BridgeStatus] = {}
+    if not data.get("refresh"):
+        max_age = get_config()["acd.bridge_monitor.max_age"]
+        saved_statuses = await BridgeStatus.get_by_puppet_mxids(
+            [puppet.custom_mxid for puppet in puppets]
         )
-        status, response = await bridge_conector.ping(puppet.mxid)
-        bridges_status.append(response)
+        statuses = {
+            puppet_mxid: status
+            for puppet_mxid, status in saved_statuses.items()
+            if not status.is_older_than(max_age)
+        }
+
+    missing_puppets = [puppet for puppet in puppets if puppet.custom_mxid not in statuses]
+    for status in await BridgeMonitor.check_puppets(puppets=missing_puppets):
+        statuses[status.puppet_mxid] = status
+
+    bridges_status = [
+        statuses[puppet.custom_mxid].response_data
+        for puppet in puppets
+        if puppet.custom_mxid in statuses
+    ]
 
     return web.json_response(data={"bridges_status": bridges_status})
 
@@ -1016,7 +1189,7 @@ async def meta_register(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    meta_data = await request.json()
+    meta_data = await get_body(request)
 
     meta_app_data = {
         "meta_app_name": meta_data.get("meta_app_name"),
@@ -1117,7 +1290,7 @@ async def meta_update(request: web.Request) -> web.Response:
             {"detail": {"data": None, "message": "Bridge invalid"}}, status=400
         )
 
-    meta_data = await request.json()
+    meta_data = await get_body(request)
 
     if not meta_data.get("app_name") and not meta_data.get("page_access_token"):
         return web.json_response(
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-import asyncio
 import json
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Tuple
 
 from aiohttp import web
 from mautrix.types import RoomID, UserID
 
+from ...db.job import Job
+from ...db.versions import Versions
+from ...job_manager import JobManager
 from ...portal import Portal
 from ...puppet import Puppet
 from ...queue import Queue
@@ -16,8 +18,12 @@ from ...util import Util
 from ..base import (
     _resolve_puppet_identifier,
     _resolve_user_identifier,
+    get_body,
     get_bulk_resolve,
     get_commands,
+    get_config,
+    get_membership_state_filter,
+    get_pagination,
     routes,
 )
 from ..error_responses import (
@@ -31,9 +37,26 @@ from ..error_responses import (
     QUEUE_MEMBERSHIP_DOESNOT_EXIST,
     REQUIRED_VARIABLES,
     SERVER_ERROR,
+    TOO_MANY_JOBS,
     UNABLE_TO_FIND_PUPPET,
     USER_DOESNOT_EXIST,
 )
+from ..response_cache import ResponseCache
+
+# The queue responses depend on the queues, their memberships and the members
+QUEUE_VERSIONS = [
+    (Versions.QUEUE, None),
+    (Versions.QUEUE_MEMBERSHIP, None),
+    (Versions.USER, None),
+]
+# The queue info and list responses also have the displaynames of the members
+QUEUE_INFO_VERSIONS = QUEUE_VERSIONS + [(Versions.DISPLAYNAMES, None)]
+
+
+def get_displaynames_max_age() -> int:
+    """The displaynames are not written in the tables, the responses that have them are
+    built again when the displaynames cache expires, so the changes are noticed"""
+    return get_config()["acd.displaynames.cache_ttl"]
 
 
 @routes.post("/v1/cmd/create")
@@ -98,7 +121,7 @@ async def create(request: web.Request) -> web.Response:
     args = []
 
     if request.body_exists:
-        data = await request.json()
+        data = await get_body(request)
         if data.get("bridge"):
             args = args + ["-b", data.get("bridge")]
 
@@ -189,7 +212,7 @@ async def pm(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     phone = data.get("customer_phone")
     message = data.get("template_message")
@@ -270,7 +293,7 @@ async def resolve(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not (data.get("room_id") and data.get("user_id")):
         return web.json_response(**REQUIRED_VARIABLES)
@@ -309,6 +332,8 @@ async def bulk_resolve(request: web.Request) -> web.Response:
     """
     ---
     summary: Command to bulk resolve chats, kicking the supervisor and the agent.
+    description: The rooms are resolved by a background job, the response has the `job_id`
+                 to follow its progress with `/v1/jobs/{job_id}`.
     tags:
         - Commands
 
@@ -352,32 +377,42 @@ async def bulk_resolve(request: web.Request) -> web.Response:
 
 
     responses:
+        '202':
+            $ref: '#/components/responses/Job'
         '400':
             $ref: '#/components/responses/BadRequest'
         '404':
             $ref: '#/components/responses/NotExist'
+        '503':
+            $ref: '#/components/responses/ServiceUnavailable'
     """
     user = await _resolve_user_identifier(request=request)
 
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not (data.get("room_ids") and data.get("user_id")):
         return web.json_response(**REQUIRED_VARIABLES)
 
-    room_ids: List[RoomID] = data.get("room_ids")
+    if JobManager.is_full():
+        return web.json_response(**TOO_MANY_JOBS)
+
+    room_ids: List[RoomID] = list(dict.fromkeys(data.get("room_ids")))
     user_id = data.get("user_id")
     send_message = data.get("send_message")
 
-    asyncio.create_task(
-        get_bulk_resolve().resolve(
-            new_room_ids=room_ids, user=user, user_id=user_id, send_message=send_message
-        )
+    job = await JobManager.submit(
+        kind="bulk_resolve",
+        total=len(room_ids),
+        created_by=user.mxid,
+        run=lambda job: get_bulk_resolve().resolve(
+            room_ids=room_ids, user=user, user_id=user_id, send_message=send_message, job=job
+        ),
     )
 
-    return web.json_response(text="ok")
+    return web.json_response(data=job.serialize(), status=202)
 
 
 @routes.post("/v1/cmd/state_event")
@@ -432,7 +467,7 @@ async def state_event(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     room_id = data.get("room_id")
     event_type = data.get("event_type")
@@ -506,7 +541,7 @@ async def template(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
     room_id = data.get("room_id")
     template_message = data.get("template_message")
 
@@ -584,7 +619,7 @@ async def transfer(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not (data.get("customer_room_id") and data.get("campaign_room_id")):
         return web.json_response(**REQUIRED_VARIABLES)
@@ -672,7 +707,7 @@ async def transfer_user(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not (data.get("customer_room_id") and data.get("target_agent_id")):
         return web.json_response(**REQUIRED_VARIABLES)
@@ -756,7 +791,7 @@ async def queue(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
     invitees = ",".join(data.get("invitees", "")) if data.get("invitees", "") else ""
 
     args = [
@@ -831,7 +866,7 @@ async def queue(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     queue: Queue = await Queue.get_by_room_id(data.get("room_id"), create=False)
 
@@ -925,7 +960,7 @@ async def queue(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     args = ["add", "-m", data.get("member", ""), "-q", data.get("queue_id", "")]
 
@@ -988,7 +1023,7 @@ async def queue(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     args = ["remove", "-m", data.get("member", ""), "-q", data.get("queue_id", "")]
 
@@ -1032,6 +1067,8 @@ async def queue(request: web.Request) -> web.Response:
     responses:
         '200':
             $ref: '#/components/responses/QueueInfoSuccessful'
+        '304':
+            $ref: '#/components/responses/NotModified'
         '400':
             $ref: '#/components/responses/BadRequest'
         '422':
@@ -1043,16 +1080,22 @@ async def queue(request: web.Request) -> web.Response:
 
     args = ["info", "-q", room_id]
 
-    result: Dict = await get_commands().handle(
-        sender=user,
-        command="queue",
-        args_list=args,
-        intent=user.az.intent,
-        is_management=True,
-        mute_reply=True,
-    )
+    async def build() -> Dict:
+        return await get_commands().handle(
+            sender=user,
+            command="queue",
+            args_list=args,
+            intent=user.az.intent,
+            is_management=True,
+            mute_reply=True,
+        )
 
-    return web.json_response(**result)
+    return await ResponseCache.respond(
+        request=request,
+        versions=QUEUE_INFO_VERSIONS,
+        build=build,
+        max_age=get_displaynames_max_age(),
+    )
 
 
 @routes.get("/v1/cmd/queue/list", allow_head=False)
@@ -1072,29 +1115,66 @@ async def queue(request: web.Request) -> web.Response:
         type: string
       example: Mxid @user:example.com
 
+    - in: query
+      name: limit
+      schema:
+        type: integer
+        minimum: 1
+      required: false
+      description: Max number of queues of the page, all queues if it is not given
+    - in: query
+      name: after
+      schema:
+        type: string
+      required: false
+      description: The `next_room_id` of the previous page, to get the next one
+    - in: query
+      name: membership_state
+      schema:
+        type: string
+        enum: [online, offline]
+      required: false
+      description: Only the queues with at least one membership in this state
+
     responses:
         '200':
             $ref: '#/components/responses/QueueListSuccessful'
+        '304':
+            $ref: '#/components/responses/NotModified'
         '400':
             $ref: '#/components/responses/BadRequest'
         '422':
             $ref: '#/components/responses/NotExist'
     """
     user = await _resolve_user_identifier(request=request)
+    limit, after = get_pagination(request)
+    membership_state = get_membership_state_filter(request)
 
     args = ["list"]
+    if limit:
+        args += ["--limit", str(limit)]
+    if after:
+        args += ["--after", after]
+    if membership_state:
+        args += ["--membership-state", membership_state.value]
+
+    async def build() -> Dict:
+        return await get_commands().handle(
+            sender=user,
+            command="queue",
+            args_list=args,
+            intent=user.az.intent,
+            is_management=True,
+            mute_reply=True,
+        )
 
-    result: Dict = await get_commands().handle(
-        sender=user,
-        command="queue",
-        args_list=args,
-        intent=user.az.intent,
-        is_management=True,
-        mute_reply=True,
+    return await ResponseCache.respond(
+        request=request,
+        versions=QUEUE_INFO_VERSIONS,
+        build=build,
+        max_age=get_displaynames_max_age(),
     )
 
-    return web.json_response(**result)
-
 
 @routes.patch("/v1/cmd/queue/update")
 async def queue(request: web.Request) -> web.Response:
@@ -1150,7 +1230,7 @@ async def queue(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     args = [
         "update",
@@ -1206,6 +1286,11 @@ async def queue(request: web.Request) -> web.Response:
                             description: "This queue has assigned agents.
                                           Are you sure you want to force delete the queue?"
                             type: string
+                        background:
+                            description: "Delete the queue in a background job,
+                                          the response has the `job_id` to follow it"
+                            type: boolean
+                            default: false
                     example:
                         room_id: "!foo:foo.com"
                         force: "yes | no"
@@ -1213,20 +1298,27 @@ async def queue(request: web.Request) -> web.Response:
     responses:
         '200':
             $ref: '#/components/responses/QueueDeleteSuccessful'
+        '202':
+            $ref: '#/components/responses/Job'
         '400':
             $ref: '#/components/responses/BadRequest'
         '422':
             $ref: '#/components/responses/NotExist'
+        '503':
+            $ref: '#/components/responses/ServiceUnavailable'
     """
     user = await _resolve_user_identifier(request=request)
 
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     args = ["delete", "-q", data.get("room_id", ""), "-f", data.get("force", "")]
 
+    if data.get("background"):
+        return await _submit_queue_command(kind="queue_delete", user=user, args=args)
+
     result: Dict = await get_commands().handle(
         sender=user,
         command="queue",
@@ -1239,6 +1331,81 @@ async def queue(request: web.Request) -> web.Response:
     return web.json_response(**result)
 
 
+@routes.post("/v1/cmd/queue/set")
+async def queue_set(request: web.Request) -> web.Response:
+    """
+    ---
+    summary:    Command that adds a queue room to the ACD and synchronizes its members.
+    description: The queue is synchronized by a background job, the response has the `job_id`
+                 to follow it with `/v1/jobs/{job_id}`.
+    tags:
+        - Commands
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+
+    requestBody:
+        required: true
+        description: A json with the `room_id` of the queue
+        content:
+            application/json:
+                schema:
+                    type: object
+                    properties:
+                        room_id:
+                            description: "Queue room id"
+                            type: string
+                    required:
+                        - room_id
+                    example:
+                        room_id: "!foo:foo.com"
+
+    responses:
+        '202':
+            $ref: '#/components/responses/Job'
+        '400':
+            $ref: '#/components/responses/BadRequest'
+        '503':
+            $ref: '#/components/responses/ServiceUnavailable'
+    """
+    user = await _resolve_user_identifier(request=request)
+
+    data: Dict = await get_body(request)
+
+    return await _submit_queue_command(
+        kind="queue_set", user=user, args=["set", "-q", data["room_id"]]
+    )
+
+
+async def _submit_queue_command(kind: str, user: User, args: List[str]) -> web.Response:
+    """It runs a queue command in a background job, the result of the command
+    is the result of the job"""
+    if JobManager.is_full():
+        return web.json_response(**TOO_MANY_JOBS)
+
+    async def run(job: Job) -> Dict:
+        result: Dict = await get_commands().handle(
+            sender=user,
+            command="queue",
+            args_list=args,
+            intent=user.az.intent,
+            is_management=True,
+            mute_reply=True,
+        )
+        failed = result.get("status", 200) >= 400
+        await JobManager.progress(job, done=int(not failed), failed=int(failed))
+        return result
+
+    job = await JobManager.submit(kind=kind, total=1, created_by=user.mxid, run=run)
+    return web.json_response(data=job.serialize(), status=202)
+
+
 @routes.post("/v1/cmd/acd")
 async def acd(request: web.Request) -> web.Response:
     """
@@ -1312,7 +1479,7 @@ async def acd(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not data.get("customer_room_id"):
         return web.json_response(**REQUIRED_VARIABLES)
@@ -1408,7 +1575,7 @@ async def member(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if (
         not data.get("action")
@@ -1496,10 +1663,32 @@ async def get_memberships(request: web.Request) -> web.Response:
             value: ""
       required: false
       description: user_id to get memberships by user, leave empty to filter all users
+    - in: query
+      name: limit
+      schema:
+          type: integer
+          minimum: 1
+      required: false
+      description: Max number of users of the page, all users if it is not given
+    - in: query
+      name: after
+      schema:
+          type: string
+      required: false
+      description: The `next_user_id` of the previous page, to get the next one
+    - in: query
+      name: membership_state
+      schema:
+          type: string
+          enum: [online, offline]
+      required: false
+      description: Only the memberships in this state, when `user_id` is not given
 
     responses:
         '200':
             $ref: '#/components/responses/GetUserMembershipsSuccess'
+        '304':
+            $ref: '#/components/responses/NotModified'
         '404':
             $ref: '#/components/responses/NotFound'
     """
@@ -1514,25 +1703,118 @@ async def get_memberships(request: web.Request) -> web.Response:
         target_user = await User.get_by_mxid(user_id, create=False)
         if not target_user:
             return web.json_response(**USER_DOESNOT_EXIST)
-        user_memberships = await QueueMembership.get_serialized_memberships(fk_user=target_user.id)
-        if not user_memberships:
-            return web.json_response(data={"detail": "Agent has no queue memberships"}, status=404)
+
+        async def build() -> Dict:
+            memberships = await QueueMembership.get_serialized_memberships(fk_user=target_user.id)
+            if not memberships:
+                return {"data": {"detail": "Agent has no queue memberships"}, "status": 404}
+            return {"data": {"data": memberships}, "status": 200}
+
+        return await ResponseCache.respond(request=request, versions=QUEUE_VERSIONS, build=build)
     else:
-        users = await QueueMembership.get_members()
-        if not users:
-            return web.json_response(
-                data={"detail": "Queues do not have member users."}, status=404
+        limit, after = get_pagination(request)
+        membership_state = get_membership_state_filter(request)
+
+        # The memberships of all users are streamed, they are not kept in the cache
+        etag = None
+        if ResponseCache.is_enabled():
+            etag = ResponseCache.get_etag(ResponseCache.get_key(request), QUEUE_VERSIONS)
+            if ResponseCache.is_not_modified(request, etag):
+                return ResponseCache.not_modified(etag)
+
+        memberships_by_user = QueueMembership.iter_serialized_memberships_by_user(
+            after=after, limit=limit, state=membership_state
+        )
+        try:
+            # The first user is read before the response starts, to answer 404 without users
+            try:
+                first_user = await memberships_by_user.__anext__()
+            except StopAsyncIteration:
+                first_user = None
+
+            if not first_user and not after and not membership_state:
+                return web.json_response(
+                    data={"detail": "Queues do not have member users."}, status=404
+                )
+
+            return await _stream_memberships_by_user(
+                request=request,
+                first_user=first_user,
+                memberships_by_user=memberships_by_user,
+                limit=limit,
+                etag=etag,
             )
-        user_memberships = {}
-        for user in users:
-            member: User = await User.get_by_id(user.get("id"))
-            memberships = await QueueMembership.get_serialized_memberships(fk_user=user.get("id"))
-            user_memberships[user.get("user_id")] = {
-                "is_admin": member.is_admin,
-                "memberships": memberships,
-            }
+        finally:
+            # It releases the cursor if the client went away before the last user
+            await memberships_by_user.aclose()
+
+
+async def _stream_memberships_by_user(
+    request: web.Request,
+    first_user: Tuple[UserID, List[Dict]] | None,
+    memberships_by_user: AsyncIterator[Tuple[UserID, List[Dict]]],
+    limit: int | None,
+    etag: str | None = None,
+) -> web.StreamResponse:
+    """It writes the memberships of the users in chunks as they are read from the database,
+    without building the whole body
+
+    Parameters
+    ----------
+    request : web.Request
+        The request to respond.
+    first_user : Tuple[UserID, List[Dict]] | None
+        The mxid and the memberships of the first user, already read from the iterator.
+    memberships_by_user : AsyncIterator[Tuple[UserID, List[Dict]]]
+        The serialized memberships of the rest of the users, ordered by mxid.
+    limit : int | None
+        The size of the page, the response includes the `next_user_id` if it is given.
+    etag : str | None
+        The ETag of the response, if any.
+
+    Returns
+    -------
+        The streamed response.
 
-    return web.json_response(data={"data": user_memberships}, status=200)
+    """
+    response = web.StreamResponse(status=200)
+    response.content_type = "application/json"
+    if etag:
+        response.headers["ETag"] = etag
+    await response.prepare(request)
+
+    config = get_config()
+    chunk: List[str] = []
+    users = 0
+    mxid = None
+
+    async def write_user(mxid: UserID, memberships: List[Dict]):
+        nonlocal chunk, users
+        # The admins are defined in the config, there is no need to load the users
+        _, is_admin, _ = config.get_permissions(mxid)
+        user_memberships = json.dumps({"is_admin": is_admin, "memberships": memberships})
+        chunk.append(f"{', ' if users else ''}{json.dumps(mxid)}: {user_memberships}")
+        users += 1
+        if len(chunk) == 100:
+            await response.write("".join(chunk).encode())
+            chunk = []
+
+    await response.write(b'{"data": {')
+    if first_user:
+        mxid, memberships = first_user
+        await write_user(mxid, memberships)
+        async for mxid, memberships in memberships_by_user:
+            await write_user(mxid, memberships)
+
+    chunk.append("}")
+    if limit:
+        # The `after` of the next page, None if it is the last one
+        next_user_id = mxid if users == limit else None
+        chunk.append(f', "next_user_id": {json.dumps(next_user_id)}')
+    chunk.append("}")
+    await response.write("".join(chunk).encode())
+    await response.write_eof()
+    return response
 
 
 @routes.post("/v1/cmd/bic")
@@ -1618,7 +1900,7 @@ async def bic(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not data.get("customer_phone") or not data.get("company_phone"):
         return web.json_response(**REQUIRED_VARIABLES)
@@ -8,7 +8,7 @@ from acd_appservice.user import User
 from acd_appservice.util.util import Util
 
 from ...puppet import Puppet
-from ..base import _resolve_user_identifier, get_commands, routes
+from ..base import _resolve_user_identifier, get_body, get_commands, routes
 from ..error_responses import (
     NO_PUPPET_IN_PORTAL,
     NOT_DATA,
@@ -83,7 +83,7 @@ async def transfer(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
     customer_room_id = data.get("customer_room_id")
     destination = data.get("destination")
 
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from aiohttp import web
+
+from ...db.job import Job
+from ...job_manager import JobManager
+from ..base import _resolve_user_identifier, routes
+from ..error_responses import JOB_ALREADY_FINISHED, JOB_DOESNOT_EXIST
+
+
+@routes.get("/v1/jobs", allow_head=False)
+async def get_jobs(request: web.Request) -> web.Response:
+    """
+    ---
+    summary: Get the last background jobs, the most recent first.
+    tags:
+        - Jobs
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+    - in: query
+      name: kind
+      schema:
+        type: string
+        enum: [bulk_resolve, bulk_send, queue_set, queue_delete]
+      required: false
+      description: Only the jobs of this operation
+    - in: query
+      name: status
+      schema:
+        type: string
+        enum: [pending, running, finished, failed, cancelled, interrupted]
+      required: false
+      description: Only the jobs in this status
+    - in: query
+      name: limit
+      schema:
+        type: integer
+        minimum: 1
+        maximum: 500
+        default: 50
+      required: false
+      description: Max number of jobs
+
+    responses:
+        '200':
+            $ref: '#/components/responses/Jobs'
+        '400':
+            $ref: '#/components/responses/BadRequest'
+    """
+    await _resolve_user_identifier(request=request)
+
+    jobs = await Job.get_recent(
+        limit=int(request.query.get("limit", 50)),
+        kind=request.query.get("kind"),
+        status=request.query.get("status"),
+    )
+    # The progress of the unfinished jobs in memory is more recent than the saved one
+    jobs = [JobManager.JOBS.get(job.id, job) for job in jobs]
+
+    return web.json_response(data={"jobs": [job.serialize() for job in jobs]})
+
+
+@routes.get("/v1/jobs/{job_id}", allow_head=False)
+async def get_job(request: web.Request) -> web.Response:
+    """
+    ---
+    summary: Get the status and the progress of a background job.
+    tags:
+        - Jobs
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+    - in: path
+      name: job_id
+      description: The `job_id` returned by the endpoint that started the job
+      required: true
+      schema:
+        type: string
+
+    responses:
+        '200':
+            $ref: '#/components/responses/Job'
+        '404':
+            $ref: '#/components/responses/NotFound'
+    """
+    await _resolve_user_identifier(request=request)
+
+    job = await JobManager.get_job(request.match_info.get("job_id", ""))
+    if not job:
+        return web.json_response(**JOB_DOESNOT_EXIST)
+
+    return web.json_response(data=job.serialize())
+
+
+@routes.delete("/v1/jobs/{job_id}")
+async def cancel_job(request: web.Request) -> web.Response:
+    """
+    ---
+    summary: Cancel a pending or running background job.
+    description: The items processed before the cancellation are not reverted.
+    tags:
+        - Jobs
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+    - in: path
+      name: job_id
+      description: The `job_id` returned by the endpoint that started the job
+      required: true
+      schema:
+        type: string
+
+    responses:
+        '200':
+            $ref: '#/components/responses/Job'
+        '404':
+            $ref: '#/components/responses/NotFound'
+        '409':
+            $ref: '#/components/responses/JobAlreadyFinished'
+    """
+    await _resolve_user_identifier(request=request)
+
+    job_id = request.match_info.get("job_id", "")
+    job = await JobManager.cancel(job_id)
+    if job:
+        return web.json_response(data=job.serialize())
+
+    if not await JobManager.get_job(job_id):
+        return web.json_response(**JOB_DOESNOT_EXIST)
+
+    return web.json_response(**JOB_ALREADY_FINISHED)
@@ -1,17 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
 from typing import Dict, List
 
 from aiohttp import web
 from mautrix.types import RoomID
 
+from ...db.versions import Versions
+from ...events import EventStream
 from ...portal import Portal
 from ...puppet import Puppet
 from ...user import User, UserRoles
 from ...util import Util
-from ..base import _resolve_user_identifier, routes
+from ..base import (
+    _resolve_user_identifier,
+    get_body,
+    get_membership_state_filter,
+    get_pagination,
+    routes,
+)
 from ..error_responses import (
+    EVENT_STREAM_DISABLED,
+    FORBIDDEN_OPERATION,
     INVALID_DESTINATION,
     INVALID_EMAIL,
     INVALID_USER_ID,
@@ -21,8 +33,10 @@ from ..error_responses import (
     PUPPET_DOESNOT_EXIST,
     REQUIRED_VARIABLES,
     ROOM_NAME_NOT_UPDATED,
+    TOO_MANY_SUBSCRIBERS,
     USER_DOESNOT_EXIST,
 )
+from ..response_cache import ResponseCache
 
 logger = logging.getLogger()
 
@@ -84,13 +98,28 @@ async def get_control_room(request: web.Request) -> web.Response:
 
 
 @routes.get("/v1/get_control_rooms", allow_head=False)
-async def get_control_rooms() -> web.Response:
+async def get_control_rooms(request: web.Request) -> web.Response:
     """
     ---
     summary:        Get the acd control rooms.
     tags:
         - Mis
 
+    parameters:
+    - in: query
+      name: limit
+      schema:
+        type: integer
+        minimum: 1
+      required: false
+      description: Max number of control rooms of the page, all of them if it is not given
+    - in: query
+      name: after
+      schema:
+        type: string
+      required: false
+      description: The `next_room_id` of the previous page, to get the next one
+
     responses:
         '200':
             $ref: '#/components/responses/ControlRooms'
@@ -100,12 +129,20 @@ async def get_control_rooms() -> web.Response:
             $ref: '#/components/responses/NotFound'
     """
 
-    control_room_ids = await Puppet.get_control_room_ids()
+    limit, after = get_pagination(request)
 
-    if not control_room_ids:
-        return web.json_response(**NOT_DATA)
+    if not limit:
+        control_room_ids = await Puppet.get_control_room_ids()
+        if not control_room_ids:
+            return web.json_response(**NOT_DATA)
+
+        return web.json_response(data={"control_room_ids": control_room_ids})
 
-    return web.json_response(data={"control_room_ids": control_room_ids})
+    control_room_ids = await Puppet.get_control_room_ids_page(after=after, limit=limit)
+    next_room_id = control_room_ids[-1] if len(control_room_ids) == limit else None
+    return web.json_response(
+        data={"control_room_ids": control_room_ids, "next_room_id": next_room_id}
+    )
 
 
 @routes.get("/v1/user/{role}", allow_head=False)
@@ -116,6 +153,28 @@ async def get_users_by_role(request: web.Request) -> web.Response:
     tags:
         - Mis
 
+    parameters:
+    - in: query
+      name: limit
+      schema:
+        type: integer
+        minimum: 1
+      required: false
+      description: Max number of users of the page, all users if it is not given
+    - in: query
+      name: after
+      schema:
+        type: string
+      required: false
+      description: The `next_user_id` of the previous page, to get the next one
+    - in: query
+      name: membership_state
+      schema:
+        type: string
+        enum: [online, offline]
+      required: false
+      description: Only the users with at least one membership in this state
+
     responses:
         '200':
             $ref: '#/components/responses/UsersByRole'
@@ -129,8 +188,20 @@ async def get_users_by_role(request: web.Request) -> web.Response:
     if not role in UserRoles.__members__:
         return web.json_response(**INVALID_USER_ROLE)
 
-    users = await User.get_users_by_role(role=role)
-    return web.json_response(data={"users": users})
+    limit, after = get_pagination(request)
+    membership_state = get_membership_state_filter(request)
+
+    users = await User.get_users_by_role(
+        role=role,
+        after=after,
+        limit=limit,
+        membership_state=membership_state.value if membership_state else None,
+    )
+    if not limit:
+        return web.json_response(data={"users": users})
+
+    next_user_id = users[-1]["mxid"] if users and len(users) == limit else None
+    return web.json_response(data={"users": users or [], "next_user_id": next_user_id})
 
 
 @routes.get("/v1/puppet/{puppet_mxid}", allow_head=False)
@@ -144,17 +215,24 @@ async def get_puppet(request: web.Request) -> web.Response:
     responses:
         '200':
             $ref: '#/components/responses/GetPuppetInfoSuccess'
+        '304':
+            $ref: '#/components/responses/NotModified'
         '404':
             $ref: '#/components/responses/NotFound'
     """
     await _resolve_user_identifier(request=request)
 
     puppet_mxid = request.match_info.get("puppet_mxid", "")
-    puppet: Dict = await Puppet.get_info_by_custom_mxid(puppet_mxid)
-    if not puppet:
-        return web.json_response(**PUPPET_DOESNOT_EXIST)
 
-    return web.json_response(data=puppet)
+    async def build() -> Dict:
+        puppet: Dict = await Puppet.get_info_by_custom_mxid(puppet_mxid)
+        if not puppet:
+            return PUPPET_DOESNOT_EXIST
+        return {"data": puppet, "status": 200}
+
+    return await ResponseCache.respond(
+        request=request, versions=[(Versions.PUPPET, puppet_mxid)], build=build
+    )
 
 
 @routes.patch("/v1/puppet/{puppet_mxid}")
@@ -197,7 +275,7 @@ async def update_puppet(request: web.Request) -> web.Response:
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
 
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     if not Util.is_room_id(data.get("destination")) and not Util.is_user_id(
         data.get("destination")
@@ -279,7 +357,7 @@ async def update_room_name(request: web.Request) -> web.Response:
 
     if not request.body_exists:
         return web.json_response(**NOT_DATA)
-    data: Dict = await request.json()
+    data: Dict = await get_body(request)
 
     room_id_list: List[RoomID] = data.get("room_id_list")
 
@@ -304,3 +382,117 @@ async def update_room_name(request: web.Request) -> web.Response:
             return web.json_response(**ROOM_NAME_NOT_UPDATED)
 
     return web.json_response(data={"detail": "Room name updated successfully"}, status=200)
+
+
+@routes.get("/v1/events/stream", allow_head=False)
+async def events_stream(request: web.Request) -> web.StreamResponse:
+    """
+    ---
+    summary:        Stream of the ACD events.
+    description:    It sends the conversation, member, membership and room events as
+                    server-sent events while the connection is open, the same events that
+                    are published to NATS. Each filter takes a comma separated list, the
+                    events must match all the given filters. A client that does not read
+                    the events fast enough is disconnected with a `dropped` event.
+                    The supervisors and the admins get all the events, the agents only
+                    get the events about themselves, the rest of the users are forbidden.
+    tags:
+        - Mis
+
+    parameters:
+    - in: header
+      name: Authorization
+      description: User that makes the request
+      required: true
+      schema:
+        type: string
+      example: Mxid @user:example.com
+    - in: query
+      name: event_types
+      schema:
+          type: string
+      required: false
+      description: Only these event types, e.g. `CONVERSATION,MEMBER`
+    - in: query
+      name: events
+      schema:
+          type: string
+      required: false
+      description: Only these events, e.g. `MemberLogin,MemberPause`
+    - in: query
+      name: room_ids
+      schema:
+          type: string
+      required: false
+      description: Only the events of these portals
+    - in: query
+      name: queues
+      schema:
+          type: string
+      required: false
+      description: Only the events of these queues
+    - in: query
+      name: members
+      schema:
+          type: string
+      required: false
+      description: Only the events of these agents
+
+    responses:
+        '200':
+            $ref: '#/components/responses/EventsStream'
+        '403':
+            $ref: '#/components/responses/Forbidden'
+        '404':
+            $ref: '#/components/responses/NotFound'
+        '503':
+            $ref: '#/components/responses/ServiceUnavailable'
+    """
+    user = await _resolve_user_identifier(request=request)
+
+    if not EventStream.is_enabled():
+        return web.json_response(**EVENT_STREAM_DISABLED)
+
+    filters = {}
+    for name in ["event_types", "events", "room_ids", "queues", "members"]:
+        values = request.query.get(name)
+        filters[name] = [value.strip() for value in values.split(",")] if values else None
+
+    if not (user.is_admin or user.is_supervisor):
+        if not user.is_agent:
+            return web.json_response(**FORBIDDEN_OPERATION)
+        # The agents only see their own events
+        filters["members"] = [user.mxid]
+
+    subscriber = EventStream.subscribe(**filters)
+    if not subscriber:
+        return web.json_response(**TOO_MANY_SUBSCRIBERS)
+
+    response = web.StreamResponse(
+        status=200, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.content_type = "text/event-stream"
+    keepalive_interval = EventStream.config["acd.event_stream.keepalive_interval"]
+    try:
+        await response.prepare(request)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.get(), timeout=keepalive_interval)
+            except asyncio.TimeoutError:
+                await response.write(b": keepalive\n\n")
+                continue
+
+            if event is None:
+                await response.write(b'event: dropped\ndata: {"reason": "slow consumer"}\n\n')
+                break
+
+            await response.write(
+                f"id: {event.get('event_id')}\nevent: {event.get('event_type')}\n"
+                f"data: {json.dumps(event)}\n\n".encode()
+            )
+    except ConnectionResetError:
+        pass
+    finally:
+        EventStream.unsubscribe(subscriber)
+
+    return response
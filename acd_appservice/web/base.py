@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Tuple
+
 from aiohttp import web
 
 from ..commands.handler import CommandProcessor
 from ..commands.resolve import BulkResolve
 from ..config import Config
+from ..db.queue_membership import QueueMembershipState
+from ..db.versions import Versions
 from ..puppet import Puppet
 from ..user import User
 from ..util import Util
@@ -14,6 +21,13 @@ _util: Util | None = None
 _commands: CommandProcessor | None = None
 _bulk_resolve: BulkResolve | None = None
 
+# The callers of the API that have been resolved, with the time their entry expires and
+# the version of their user row, the user is None if it does not exist
+_callers: OrderedDict[str, Tuple[User | None, float, int]] = OrderedDict()
+
+# Key of the decoded JSON body in the request, see request_body.body_middleware
+BODY_KEY = "acd.body"
+
 routes: web.RouteTableDef = web.RouteTableDef()
 
 
@@ -42,6 +56,26 @@ def get_config() -> Config:
     return _config
 
 
+async def get_body(request: web.Request) -> Any:
+    """It gets the decoded JSON body of the request
+
+    Parameters
+    ----------
+    request : web.Request
+        web.Request
+
+    Returns
+    -------
+        The body, None if the request has no body.
+
+    """
+    if BODY_KEY not in request:
+        # The request did not go through the middleware, e.g. a handler that is called directly
+        request[BODY_KEY] = await request.json() if request.body_exists else None
+
+    return request[BODY_KEY]
+
+
 async def _resolve_user_identifier(request: web.Request) -> User | None:
     """This function takes a request object, and returns a user object if the user_id is valid,
     otherwise it returns None
@@ -60,21 +94,57 @@ async def _resolve_user_identifier(request: web.Request) -> User | None:
     try:
         authorization: str = request.headers["Authorization"]
         user_request = authorization.split(" ")[1]
-    except KeyError:
+    except (KeyError, IndexError):
         raise web.HTTPUnauthorized(
             text='{"error": "You must specify the mxid of the user making the request in headers"}'
         )
 
-    user: User = await User.get_by_mxid(user_request)
+    user: User = await _get_caller(user_request)
 
     if not user:
         raise web.HTTPUnauthorized(
-            body='{"detail": "Invalid authentication"}', content_type="application/json"
+            text='{"detail": "Invalid authentication"}', content_type="application/json"
         )
 
     return user
 
 
+async def _get_caller(mxid: str) -> User | None:
+    """It gets the user that makes a request, the users are never created here
+
+    The result is cached for `acd.api_auth.cache_ttl` seconds if the user exists
+    and for `acd.api_auth.negative_cache_ttl` seconds if it does not exist,
+    the entry is discarded before if the user is created, updated or deleted.
+
+    Parameters
+    ----------
+    mxid : str
+        The mxid of the Authorization header.
+
+    Returns
+    -------
+        The user, None if it does not exist.
+
+    """
+    now = time.monotonic()
+    version = Versions.get(Versions.USER, key=mxid)
+    cached = _callers.get(mxid)
+    if cached and cached[1] > now and cached[2] == version:
+        return cached[0]
+
+    user = None
+    if Util.is_user_id(mxid):
+        user = await User.get_by_mxid(mxid, create=False)
+
+    ttl = _config["acd.api_auth.cache_ttl" if user else "acd.api_auth.negative_cache_ttl"]
+    _callers[mxid] = (user, now + ttl, version)
+    _callers.move_to_end(mxid)
+    while len(_callers) > _config["acd.api_auth.max_cached_callers"]:
+        _callers.popitem(last=False)
+
+    return user
+
+
 async def _resolve_puppet_identifier(request: web.Request) -> Puppet | None:
     """It takes a request, and returns a puppet if the request is valid
 
@@ -93,7 +163,7 @@ async def _resolve_puppet_identifier(request: web.Request) -> Puppet | None:
     puppet = None
 
     if request.body_exists:
-        data = await request.json()
+        data = await get_body(request) or {}
 
     if data.get("company_phone"):
         puppet = await Puppet.get_by_phone(data.get("company_phone"))
@@ -117,3 +187,57 @@ async def _resolve_puppet_identifier(request: web.Request) -> Puppet | None:
         )
 
     return puppet
+
+
+def get_pagination(request: web.Request) -> Tuple[int | None, str | None]:
+    """It gets the `limit` and `after` query params of the paginated endpoints
+
+    Parameters
+    ----------
+    request : web.Request
+        web.Request
+
+    Returns
+    -------
+        The page size, None to get all items, and the cursor of the page.
+
+    """
+    limit = request.query.get("limit")
+    try:
+        limit = int(limit) if limit else None
+    except ValueError:
+        limit = 0
+
+    if limit is not None and limit < 1:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": "limit must be a positive integer"}),
+            content_type="application/json",
+        )
+
+    return limit, request.query.get("after") or None
+
+
+def get_membership_state_filter(request: web.Request) -> QueueMembershipState | None:
+    """It gets the `membership_state` query param used to filter the lists
+
+    Parameters
+    ----------
+    request : web.Request
+        web.Request
+
+    Returns
+    -------
+        The membership state, None if the lists are not filtered.
+
+    """
+    membership_state = request.query.get("membership_state")
+    if not membership_state:
+        return None
+
+    try:
+        return QueueMembershipState(membership_state)
+    except ValueError:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": f"Invalid membership_state {membership_state}"}),
+            content_type="application/json",
+        )
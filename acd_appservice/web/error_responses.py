@@ -25,6 +25,36 @@ INVALID_PHONE = {
     "status": 400,
 }
 
+TOO_MANY_RECIPIENTS = {
+    "data": {"error": "Too many recipients in a single request"},
+    "status": 413,
+}
+
+JOB_DOESNOT_EXIST = {
+    "data": {"error": "Job with given id was not found."},
+    "status": 404,
+}
+
+JOB_ALREADY_FINISHED = {
+    "data": {"error": "The job is not pending or running"},
+    "status": 409,
+}
+
+TOO_MANY_JOBS = {
+    "data": {"error": "There are too many pending jobs, try again later"},
+    "status": 503,
+}
+
+EVENT_STREAM_DISABLED = {
+    "data": {"error": "The events stream is disabled"},
+    "status": 404,
+}
+
+TOO_MANY_SUBSCRIBERS = {
+    "data": {"error": "Too many clients connected to the events stream, try again later"},
+    "status": 503,
+}
+
 INVALID_USER_ID = {
     "data": {"error": "Not a valid user ID"},
     "status": 400,
@@ -13,6 +13,7 @@ from ..config import Config
 from ..version import version
 from . import api
 from .base import routes, set_config
+from .request_body import body_middleware, cached_json
 
 
 class ProvisioningAPI:
@@ -24,7 +25,7 @@ class ProvisioningAPI:
     def __init__(
         self, config: Config, loop: asyncio.AbstractEventLoop, bulk_resolve: BulkResolve
     ) -> None:
-        self.app = web.Application()
+        self.app = web.Application(middlewares=[body_middleware])
         self.loop = loop
         set_config(config=config, bulk_resolve=bulk_resolve)
 
@@ -45,6 +46,8 @@ class ProvisioningAPI:
             ),
         )
 
+        # The swagger validation uses the body decoded by the middleware
+        swagger.register_media_type_handler("application/json", cached_json)
         swagger.add_routes(routes)
 
         cors = aiohttp_cors.setup(
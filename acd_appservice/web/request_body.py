@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Awaitable, Callable, Tuple
+
+from aiohttp import web
+from aiohttp_swagger3.validators import ValidatorError
+
+from .base import BODY_KEY, get_body, get_config
+
+JSON_METHODS = ["POST", "PUT", "PATCH", "DELETE"]
+
+
+def _error(status: int, error: str) -> web.Response:
+    return web.json_response(data={"error": error}, status=status)
+
+
+@web.middleware
+async def body_middleware(
+    request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+) -> web.StreamResponse:
+    """It decodes the JSON body of the request once, before the validation and the handler
+
+    The bodies larger than `acd.api_body.max_size` kilobytes are rejected with a 413
+    and the malformed ones with a 400, without running the handler.
+    """
+    if (
+        request.method not in JSON_METHODS
+        or not request.body_exists
+        or request.content_type != "application/json"
+    ):
+        return await handler(request)
+
+    max_size = get_config()["acd.api_body.max_size"] * 1024
+    if request.content_length and request.content_length > max_size:
+        return _error(413, f"The body is larger than {max_size} bytes")
+
+    try:
+        raw = await request.read()
+    except web.HTTPRequestEntityTooLarge:
+        return _error(413, f"The body is larger than {max_size} bytes")
+
+    # The bodies sent without Content-Length are only known after reading them
+    if len(raw) > max_size:
+        return _error(413, f"The body is larger than {max_size} bytes")
+
+    try:
+        request[BODY_KEY] = json.loads(raw.decode(request.charset or "utf-8"))
+    except ValueError as e:
+        return _error(400, f"Malformed JSON body: {e}")
+
+    return await handler(request)
+
+
+async def cached_json(request: web.Request) -> Tuple[Any, bool]:
+    """JSON media type handler of the swagger validation, it uses the decoded body"""
+    try:
+        return await get_body(request), False
+    except ValueError as e:
+        raise ValidatorError(str(e))
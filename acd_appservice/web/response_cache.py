@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+from uuid import uuid4
+
+from aiohttp import web
+
+from ..db.versions import Versions
+from .base import get_config
+
+
+class ResponseCache:
+    """ETags and an in-process cache of the responses of the read-heavy GET endpoints
+
+    The ETag is built from the request and the versions of the tables that the response
+    depends on, so it changes as soon as one of them is written. A request with a matching
+    `If-None-Match` gets a 304 without building the response, and a request without it
+    gets the cached response while the ETag is the same.
+    """
+
+    # It changes on every start, the versions begin from zero again
+    NONCE: str = uuid4().hex[:8]
+
+    entries: OrderedDict[str, Tuple[str, Dict]] = OrderedDict()
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        config = get_config()
+        return bool(config and config["acd.response_cache.enabled"])
+
+    @staticmethod
+    def get_key(request: web.Request) -> str:
+        """The path, the query and the requester, some responses depend on their permissions"""
+        return f"{request.headers.get('Authorization', '')} {request.path_qs}"
+
+    @classmethod
+    def get_etag(
+        cls, key: str, versions: Iterable[Tuple[str, str | None]], max_age: int | None = None
+    ) -> str:
+        """It builds a weak ETag from the key and the versions of the given tables
+
+        Parameters
+        ----------
+        key : str
+            The key of the response.
+        versions : Iterable[Tuple[str, str | None]]
+            The tables, and optionally the rows, that the response depends on.
+        max_age : int | None
+            Seconds after which the ETag changes even if the tables have not been written,
+            for the responses with data that is not saved in the tables (e.g. displaynames).
+
+        Returns
+        -------
+            The ETag, in the format of the header.
+
+        """
+        counters = ",".join(f"{table}:{row}={Versions.get(table, row)}" for table, row in versions)
+        if max_age:
+            counters += f",age={int(time.time() // max_age)}"
+        digest = hashlib.sha1(f"{key}|{counters}".encode()).hexdigest()[:16]
+        return f'W/"{cls.NONCE}-{digest}"'
+
+    @staticmethod
+    def is_not_modified(request: web.Request, etag: str) -> bool:
+        if_none_match = request.headers.get("If-None-Match", "")
+        return etag in [value.strip() for value in if_none_match.split(",")] or (
+            if_none_match.strip() == "*"
+        )
+
+    @staticmethod
+    def not_modified(etag: str) -> web.Response:
+        return web.Response(status=304, headers={"ETag": etag})
+
+    @classmethod
+    async def respond(
+        cls,
+        request: web.Request,
+        versions: Iterable[Tuple[str, str | None]],
+        build: Callable[[], Awaitable[Dict]],
+        max_age: int | None = None,
+    ) -> web.Response:
+        """It answers with a 304, the cached response or a new one
+
+        Parameters
+        ----------
+        request : web.Request
+            The request to respond.
+        versions : Iterable[Tuple[str, str | None]]
+            The tables, and optionally the rows, that the response depends on.
+        build : Callable[[], Awaitable[Dict]]
+            It builds the response, a dict with the `data` and the `status`.
+        max_age : int | None
+            Seconds that the response is cached at most, see `get_etag`.
+
+        Returns
+        -------
+            The response, only the successful ones are cached.
+
+        """
+        if not cls.is_enabled():
+            return web.json_response(**await build())
+
+        key = cls.get_key(request)
+        etag = cls.get_etag(key, versions, max_age)
+        if cls.is_not_modified(request, etag):
+            return cls.not_modified(etag)
+
+        cached = cls.entries.get(key)
+        if cached and cached[0] == etag:
+            cls.entries.move_to_end(key)
+            return cls.json_response(cached[1], etag)
+
+        result = await build()
+        if result.get("status", 200) != 200:
+            return web.json_response(**result)
+
+        # The versions may have changed while the response was built,
+        # it is cached with the previous ETag so the next request builds it again
+        cls.entries[key] = (etag, result)
+        cls.entries.move_to_end(key)
+        while len(cls.entries) > get_config()["acd.response_cache.max_entries"]:
+            cls.entries.popitem(last=False)
+
+        return cls.json_response(result, etag)
+
+    @staticmethod
+    def json_response(result: Dict, etag: str) -> web.Response:
+        response = web.Response(
+            text=json.dumps(result.get("data")),
+            status=result.get("status", 200),
+            content_type="application/json",
+        )
+        response.headers["ETag"] = etag
+        return response
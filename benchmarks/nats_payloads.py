@@ -0,0 +1,136 @@
+"""Benchmark of the payload encodings and subject layouts used to publish the ACD events.
+
+It compares the size and the encoding throughput of JSON and msgpack payloads,
+if a NATS address is given it also measures the publish throughput of each encoding
+with the flat and the partitioned subject layouts.
+
+    python -m benchmarks.nats_payloads --events 100000
+    python -m benchmarks.nats_payloads --events 100000 --address nats://localhost:4222
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+from zlib import crc32
+
+import msgpack
+
+SUBJECT = "acd.benchmark"
+STATES = ["INIT", "START", "PENDING", "FOLLOWUP", "RESOLVED", "ENQUEUED", "ASSIGNED"]
+EVENTS = ["Create", "EnterQueue", "Connect", "PortalMessage", "Resolve", "Assigned"]
+
+
+def generate_events(count: int, puppets: int, queues: int) -> List[Dict]:
+    events = []
+    for number in range(count):
+        prev_state, state = random.sample(STATES, 2)
+        events.append(
+            {
+                "event_type": "CONVERSATION",
+                "event": random.choice(EVENTS),
+                "timestamp": time.time(),
+                "sender": f"@acd{number % puppets}:example.com",
+                "event_id": f"{random.getrandbits(160):040x}",
+                "room_id": f"!{random.getrandbits(64):016x}:example.com",
+                "acd": f"@acd{number % puppets}:example.com",
+                "customer_mxid": f"@mxwa_57{random.randint(3000000000, 3999999999)}:example.com",
+                "state": state,
+                "prev_state": prev_state,
+                "queue_room_id": f"!queue{number % queues}:example.com",
+            }
+        )
+    return events
+
+
+def measure_encoding(events: List[Dict]) -> Dict[str, Dict]:
+    encoders = {
+        "json": lambda event: json.dumps(event).encode(),
+        "msgpack": msgpack.packb,
+    }
+    results = {}
+    for name, encoder in encoders.items():
+        start = time.perf_counter()
+        payloads = [encoder(event) for event in events]
+        elapsed = time.perf_counter() - start
+        size = sum(len(payload) for payload in payloads)
+        results[name] = {
+            "payloads": payloads,
+            "avg_size": size / len(payloads),
+            "events_per_second": len(payloads) / elapsed,
+        }
+    return results
+
+
+async def measure_publish(
+    address: str, events: List[Dict], encodings: Dict[str, Dict], partitions: int, batch: int
+):
+    from nats import connect as nats_connect
+
+    nc = await nats_connect(address)
+    js = nc.jetstream()
+    await js.add_stream(name="acd_benchmark", subjects=[f"{SUBJECT}.*", f"{SUBJECT}.*.*"])
+
+    layouts = {
+        "flat": lambda event: f"{SUBJECT}.{event['event_type']}",
+        "partitioned": lambda event: (
+            f"{SUBJECT}.{event['event_type']}.{crc32(event['acd'].encode()) % partitions}"
+        ),
+    }
+
+    try:
+        for encoding, result in encodings.items():
+            for layout, get_subject in layouts.items():
+                messages = [
+                    (get_subject(event), payload)
+                    for event, payload in zip(events, result["payloads"])
+                ]
+                start = time.perf_counter()
+                for position in range(0, len(messages), batch):
+                    await asyncio.gather(
+                        *[
+                            js.publish(subject=subject, payload=payload)
+                            for subject, payload in messages[position : position + batch]
+                        ]
+                    )
+                elapsed = time.perf_counter() - start
+                print(
+                    f"publish {encoding:<8} {layout:<12} "
+                    f"{len(messages) / elapsed:>12.0f} events/s"
+                )
+    finally:
+        await js.delete_stream("acd_benchmark")
+        await nc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ACD events payload benchmark")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--puppets", type=int, default=20)
+    parser.add_argument("--queues", type=int, default=50)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--address", type=str, default=None, help="NATS server address")
+    args = parser.parse_args()
+
+    events = generate_events(args.events, args.puppets, args.queues)
+    encodings = measure_encoding(events)
+
+    json_size = encodings["json"]["avg_size"]
+    for name, result in encodings.items():
+        print(
+            f"encode  {name:<8} {result['events_per_second']:>12.0f} events/s "
+            f"{result['avg_size']:>8.1f} bytes/event "
+            f"({result['avg_size'] / json_size:.0%} of json)"
+        )
+
+    if args.address:
+        asyncio.run(measure_publish(args.address, events, encodings, args.partitions, args.batch))
+
+
+if __name__ == "__main__":
+    main()